@@ -28,7 +28,7 @@ CREATE TABLE `t_order` (
   `product` varchar(255) DEFAULT NULL COMMENT '购买的商品或服务名称',
   `product_type` varchar(50) DEFAULT NULL COMMENT '适用商品类型（如：美妆、数码、课程）',
   `contact` varchar(255) DEFAULT NULL COMMENT '用户联系方式（根据contact_type存储对应值，建议加密）',
-  `contact_type` varchar(20) DEFAULT NULL COMMENT '联系方式类型：mobile-手机号, wechat_openid-微信OpenID, wechat_unionid-微信UnionID, alipay_userid-支付宝用户ID, email-邮箱, other-其他',
+  `contact_type` varchar(20) DEFAULT NULL COMMENT '联系方式类型：mobile-手机号, qywechat-企业微信客户external_userid, wechat_openid-微信OpenID, wechat_unionid-微信UnionID, alipay_userid-支付宝用户ID, email-邮箱, other-其他',
   `amount` decimal(10,2) NOT NULL DEFAULT '0.00' COMMENT '订单金额',
   `create_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '记录创建时间',
   `update_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '记录最后更新时间',
@@ -44,10 +44,10 @@ CREATE TABLE `t_recall` (
   `id` int(11) NOT NULL AUTO_INCREMENT COMMENT '召回记录主键ID',
   `merchant_id` int(11) NOT NULL COMMENT '关联的商家ID',
   `user_name` varchar(256) NOT NULL DEFAULT '' COMMENT '被召回的用户名称',
-  `token` varchar(128) NOT NULL DEFAULT '' COMMENT '唯一访问令牌，用于生成召回链接',
+  `token` varchar(64) CHARACTER SET ascii COLLATE ascii_bin NOT NULL DEFAULT '' COMMENT '唯一访问令牌，用于生成召回链接（签名令牌 44 个字符）',
   `token_expired` datetime NOT NULL COMMENT '令牌过期时间',
   `contact` varchar(255) DEFAULT NULL COMMENT '用户联系方式（根据contact_type存储对应值，建议加密）',
-  `contact_type` varchar(20) DEFAULT NULL COMMENT '联系方式类型：mobile-手机号, wechat_openid-微信OpenID, wechat_unionid-微信UnionID, alipay_userid-支付宝用户ID, email-邮箱, other-其他',
+  `contact_type` varchar(20) DEFAULT NULL COMMENT '联系方式类型：mobile-手机号, qywechat-企业微信客户external_userid, wechat_openid-微信OpenID, wechat_unionid-微信UnionID, alipay_userid-支付宝用户ID, email-邮箱, other-其他',
   `product` varchar(255) DEFAULT NULL COMMENT '购买的商品或服务名称',
   `product_type` varchar(50) DEFAULT NULL COMMENT '产品偏好,适用商品类型（如：美妆、数码、课程）',
   `coupon_type` varchar(20) NOT NULL COMMENT '优惠券类型：full_minus(满减)、no_threshold(无门槛)、free_trial(免费体验)',
@@ -65,11 +65,156 @@ CREATE TABLE `t_recall` (
   UNIQUE KEY `uk_token` (`token`),
   -- 为token有效期查询添加索引，便于定时清理过期任务
   KEY `idx_token_expired` (`token_expired`), 
-  KEY `idx_merchant_user` (`merchant_id`) COMMENT '用于查询商家对某用户的召回历史',
+  KEY `idx_merchant_contact` (`merchant_id`, `contact_type`, `contact`, `create_time`) COMMENT '用于查询商家对某用户的召回历史和召回频控',
   KEY `idx_create_time` (`create_time`) COMMENT '用于分析召回活动效果', 
   KEY `idx_writeoff` (`writeoff`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='用户召回结果记录表';
 
+-- 4. 召回消息发件箱 (t_recall_outbox)，与 t_recall 在同一事务中写入，发送 worker 批量认领发送
+-- 认领使用 SELECT ... FOR UPDATE SKIP LOCKED，需要 MySQL 8.0+
+CREATE TABLE `t_recall_outbox` (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT COMMENT '主键ID',
+  `job_id` varchar(32) NOT NULL DEFAULT '' COMMENT '召回任务ID，一次 /recalls/create 对应一个任务',
+  `merchant_id` int(11) NOT NULL COMMENT '关联的商家ID',
+  `recall_token` varchar(64) CHARACTER SET ascii COLLATE ascii_bin NOT NULL DEFAULT '' COMMENT '关联的召回记录token',
+  `channel` varchar(20) NOT NULL DEFAULT 'sms' COMMENT '发送渠道（按联系方式类型确定）：sms-短信, qywechat-企业微信；无发送渠道的联系方式类型写入时即为发送失败',
+  `status` tinyint(1) NOT NULL DEFAULT '0' COMMENT '发送状态：0-待发送，1-发送中，2-已发送，3-发送失败',
+  `attempts` int(11) NOT NULL DEFAULT '0' COMMENT '已尝试发送次数',
+  `next_retry_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '下次可发送时间（失败重试退避）',
+  `locked_by` varchar(64) DEFAULT NULL COMMENT '认领该消息的 worker',
+  `locked_until` datetime DEFAULT NULL COMMENT '认领租约到期时间，到期未完成视为 worker 崩溃，重新放回待发送',
+  `error` varchar(255) DEFAULT NULL COMMENT '最近一次发送失败原因',
+  `sent_time` datetime DEFAULT NULL COMMENT '发送成功时间',
+  `create_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '记录创建时间',
+  `update_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '记录最后更新时间',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_recall_channel` (`recall_token`, `channel`) COMMENT '同一召回记录同一渠道只发送一次',
+  KEY `idx_status_retry` (`status`, `next_retry_time`) COMMENT '用于 worker 认领待发送消息',
+  KEY `idx_status_locked` (`status`, `locked_until`) COMMENT '用于回收租约过期的消息',
+  KEY `idx_job_status` (`job_id`, `status`) COMMENT '用于统计任务发送进度'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='召回消息发件箱';
+
+-- 5. 用户订单汇总表 (t_user_summary)，写入订单时在同一事务中增量更新，用于快速筛选不活跃用户
+-- 历史数据回填: python -m jobs.rebuild_user_summary --merchant-id 1
+CREATE TABLE `t_user_summary` (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT COMMENT '主键ID',
+  `merchant_id` int(11) NOT NULL COMMENT '关联的商家ID',
+  `user_id` varchar(64) NOT NULL DEFAULT '' COMMENT '用户唯一标识，与 t_order.user_id 一致',
+  `name` varchar(100) DEFAULT NULL COMMENT '最近一笔订单的用户姓名',
+  `contact` varchar(255) DEFAULT NULL COMMENT '最近一笔订单的联系方式',
+  `contact_type` varchar(20) DEFAULT NULL COMMENT '最近一笔订单的联系方式类型',
+  `first_order_time` datetime NOT NULL COMMENT '首次下单时间',
+  `last_order_time` datetime NOT NULL COMMENT '最近下单时间',
+  `total_orders` int(11) NOT NULL DEFAULT '0' COMMENT '累计订单数',
+  `total_amount` decimal(14,2) NOT NULL DEFAULT '0.00' COMMENT '累计消费金额',
+  `create_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '记录创建时间',
+  `update_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '记录最后更新时间',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_merchant_user` (`merchant_id`, `user_id`) COMMENT '每个商家的每个用户一行',
+  KEY `idx_merchant_last_order` (`merchant_id`, `last_order_time`) COMMENT '用于按最近下单时间范围筛选不活跃用户'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='用户订单汇总表';
+
+-- 6. 商家每日销售汇总 (t_order_daily)，写入订单时在同一事务中增量更新，用于销售报表
+-- 历史数据回填: python -m jobs.rebuild_daily_rollups --start 2024-01-01 --end 2024-12-31
+CREATE TABLE `t_order_daily` (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT COMMENT '主键ID',
+  `merchant_id` int(11) NOT NULL COMMENT '关联的商家ID',
+  `order_date` date NOT NULL COMMENT '下单日期',
+  `order_count` int(11) NOT NULL DEFAULT '0' COMMENT '订单数',
+  `user_count` int(11) NOT NULL DEFAULT '0' COMMENT '下单用户数（去重）',
+  `total_amount` decimal(14,2) NOT NULL DEFAULT '0.00' COMMENT '订单总金额',
+  `min_amount` decimal(10,2) NOT NULL DEFAULT '0.00' COMMENT '最小订单金额',
+  `max_amount` decimal(10,2) NOT NULL DEFAULT '0.00' COMMENT '最大订单金额',
+  `first_order_time` datetime NOT NULL COMMENT '当天最早下单时间',
+  `last_order_time` datetime NOT NULL COMMENT '当天最晚下单时间',
+  `update_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '记录最后更新时间',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_merchant_date` (`merchant_id`, `order_date`) COMMENT '每个商家每天一行'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='商家每日销售汇总表';
+
+-- 7. 每日下单用户 (t_order_daily_user)，用于增量计算每日去重用户数和区间去重用户数
+CREATE TABLE `t_order_daily_user` (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT COMMENT '主键ID',
+  `merchant_id` int(11) NOT NULL COMMENT '关联的商家ID',
+  `order_date` date NOT NULL COMMENT '下单日期',
+  `user_id` varchar(64) NOT NULL DEFAULT '' COMMENT '用户唯一标识',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_merchant_date_user` (`merchant_id`, `order_date`, `user_id`) COMMENT '每个用户每天一行'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='每日下单用户表';
+
+-- 8. 商家每日召回漏斗汇总 (t_recall_daily)，创建召回和点击/领取/核销时在同一事务中增量更新
+CREATE TABLE `t_recall_daily` (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT COMMENT '主键ID',
+  `merchant_id` int(11) NOT NULL COMMENT '关联的商家ID',
+  `recall_date` date NOT NULL COMMENT '发起召回的日期',
+  `total_recalls` int(11) NOT NULL DEFAULT '0' COMMENT '召回数',
+  `clicked_count` int(11) NOT NULL DEFAULT '0' COMMENT '已点击数',
+  `claimed_count` int(11) NOT NULL DEFAULT '0' COMMENT '已领取数',
+  `writeoff_count` int(11) NOT NULL DEFAULT '0' COMMENT '已核销数',
+  `min_token_expired` datetime NOT NULL COMMENT '当天令牌最早过期时间，用于判断过期数',
+  `max_token_expired` datetime NOT NULL COMMENT '当天令牌最晚过期时间，用于判断过期数',
+  `first_recall_time` datetime NOT NULL COMMENT '当天最早召回时间',
+  `last_recall_time` datetime NOT NULL COMMENT '当天最晚召回时间',
+  `update_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '记录最后更新时间',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_merchant_date` (`merchant_id`, `recall_date`) COMMENT '每个商家每天一行'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='商家每日召回漏斗汇总表';
+
+-- 9. 过期召回记录归档表 (t_recall_archive)，令牌过期且未点击的召回记录由 jobs/recall_retention.py 分批移入
+CREATE TABLE `t_recall_archive` (
+  `id` int(11) NOT NULL COMMENT '原召回记录主键ID',
+  `merchant_id` int(11) NOT NULL COMMENT '关联的商家ID',
+  `user_name` varchar(256) NOT NULL DEFAULT '' COMMENT '被召回的用户名称',
+  `token` varchar(64) CHARACTER SET ascii COLLATE ascii_bin NOT NULL DEFAULT '' COMMENT '唯一访问令牌，用于生成召回链接（签名令牌 44 个字符）',
+  `token_expired` datetime NOT NULL COMMENT '令牌过期时间',
+  `contact` varchar(255) DEFAULT NULL COMMENT '用户联系方式（根据contact_type存储对应值，建议加密）',
+  `contact_type` varchar(20) DEFAULT NULL COMMENT '联系方式类型：mobile-手机号, qywechat-企业微信客户external_userid, wechat_openid-微信OpenID, wechat_unionid-微信UnionID, alipay_userid-支付宝用户ID, email-邮箱, other-其他',
+  `product` varchar(255) DEFAULT NULL COMMENT '购买的商品或服务名称',
+  `product_type` varchar(50) DEFAULT NULL COMMENT '产品偏好,适用商品类型（如：美妆、数码、课程）',
+  `coupon_type` varchar(20) NOT NULL COMMENT '优惠券类型：full_minus(满减)、no_threshold(无门槛)、free_trial(免费体验)',
+  `coupon_value` varchar(100) NOT NULL DEFAULT '' COMMENT '优惠券具体值，如“399-60”或“10”',
+  `click` tinyint(1) NOT NULL DEFAULT '0' COMMENT '是否点击召回链接：0-否，1-是',
+  `claim` tinyint(1) NOT NULL DEFAULT '0' COMMENT '是否领取优惠券：0-否，1-是',
+  `writeoff` tinyint(1) NOT NULL DEFAULT '0' COMMENT '是否已核销：0-否，1-是（手动或自动）',
+  `click_time` datetime DEFAULT NULL COMMENT '点击召回链接的时间',
+  `claim_time` datetime DEFAULT NULL COMMENT '点击领取的时间',
+  `writeoff_time` datetime DEFAULT NULL COMMENT '优惠券核销时间',
+  `create_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '记录创建时间，即发起召回的时间',
+  `update_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '原记录最后更新时间',
+  `archive_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '归档时间',
+  PRIMARY KEY (`id`),
+  KEY `idx_merchant_time` (`merchant_id`, `create_time`) COMMENT '用于按商家和日期重建每日召回汇总'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='过期召回记录归档表';
+
+-- 10. 召回记录清理进度 (t_recall_retention_progress)，每个清理任务一行，中断后从 last_id 之后继续
+CREATE TABLE `t_recall_retention_progress` (
+  `job_name` varchar(64) NOT NULL COMMENT '清理任务名：recall_archive-归档，recall_delete-删除',
+  `last_id` int(11) NOT NULL DEFAULT '0' COMMENT '已处理到的 t_recall 主键',
+  `processed` bigint(20) NOT NULL DEFAULT '0' COMMENT '累计归档/删除的记录数',
+  `update_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '记录最后更新时间',
+  PRIMARY KEY (`job_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='召回记录清理进度表';
+
+-- 11. 主键号段 (t_id_sequence)，召回令牌中包含召回ID，写入前先从这里批量分配 t_recall 的主键
+CREATE TABLE `t_id_sequence` (
+  `name` varchar(64) NOT NULL COMMENT '号段名，通常为表名',
+  `next_id` bigint(20) NOT NULL COMMENT '下一个可分配的主键',
+  `update_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '记录最后更新时间',
+  PRIMARY KEY (`name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='主键号段分配表';
+
+-- 12. 商家登录会话 (t_merchant_session)，SESSION_BACKEND=mysql 时使用，多进程/多机共享登录状态
+CREATE TABLE `t_merchant_session` (
+  `token_hash` char(64) CHARACTER SET ascii COLLATE ascii_bin NOT NULL COMMENT '登录令牌的 SHA-256 摘要（不保存明文令牌）',
+  `merchant_id` int(11) NOT NULL COMMENT '关联的商家ID',
+  `data` text NOT NULL COMMENT '会话内容（JSON，含去掉敏感字段的商家记录）',
+  `expire_time` datetime NOT NULL COMMENT '会话过期时间',
+  `create_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '记录创建时间',
+  PRIMARY KEY (`token_hash`),
+  KEY `idx_merchant_id` (`merchant_id`) COMMENT '用于踢下线商家的全部会话',
+  KEY `idx_expire_time` (`expire_time`) COMMENT '用于清理过期会话'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='商家登录会话表';
+
 -- 1. 插入商家测试数据
 INSERT INTO `t_merchant` (
   `username`, `password`, `name`, `industry`, `address`, 
@@ -103,6 +248,26 @@ INSERT INTO `t_order` (
   8999.00
 );
 
+-- 同步测试订单的用户汇总
+INSERT INTO `t_user_summary` (
+  `merchant_id`, `user_id`, `name`, `contact`, `contact_type`,
+  `first_order_time`, `last_order_time`, `total_orders`, `total_amount`
+)
+SELECT `merchant_id`, `user_id`, `name`, `contact`, `contact_type`, `create_time`, `create_time`, 1, `amount`
+FROM `t_order`
+WHERE `merchant_id` = 1 AND `order_id` = 'ORDER_20240115001';
+
+-- 同步测试订单的每日销售汇总
+INSERT INTO `t_order_daily_user` (`merchant_id`, `order_date`, `user_id`)
+SELECT `merchant_id`, DATE(`create_time`), `user_id` FROM `t_order` WHERE `merchant_id` = 1 AND `order_id` = 'ORDER_20240115001';
+INSERT INTO `t_order_daily` (
+  `merchant_id`, `order_date`, `order_count`, `user_count`, `total_amount`,
+  `min_amount`, `max_amount`, `first_order_time`, `last_order_time`
+)
+SELECT `merchant_id`, DATE(`create_time`), 1, 1, `amount`, `amount`, `amount`, `create_time`, `create_time`
+FROM `t_order`
+WHERE `merchant_id` = 1 AND `order_id` = 'ORDER_20240115001';
+
 -- 3. 插入召回记录测试数据
 INSERT INTO `t_recall` (
   `merchant_id`, `user_name`, `token`, `token_expired`, 
@@ -121,4 +286,17 @@ INSERT INTO `t_recall` (
   0,  -- 未点击
   0,  -- 未领取
   0   -- 未核销
-);
\ No newline at end of file
+);
+
+-- 同步测试召回记录的每日召回汇总
+INSERT INTO `t_recall_daily` (
+  `merchant_id`, `recall_date`, `total_recalls`, `min_token_expired`, `max_token_expired`,
+  `first_recall_time`, `last_recall_time`
+)
+SELECT `merchant_id`, DATE(`create_time`), 1, `token_expired`, `token_expired`, `create_time`, `create_time`
+FROM `t_recall`
+WHERE `token` = '08202fad-d0df-e0b1-0864-141c598c00ecabc123xyz789';
+
+-- 初始化 t_recall 的主键号段（从现有最大主键之后开始分配）
+INSERT INTO `t_id_sequence` (`name`, `next_id`)
+SELECT 't_recall', COALESCE(MAX(`id`), 0) + 1 FROM `t_recall`;
@@ -0,0 +1,50 @@
+-- t_order / t_recall 按 create_time 月度分区改造（可选，数据量大时执行）
+--
+-- 分区后按时间范围查询（create_time >= ... AND create_time < ...）只读取涉及的月份，
+-- 超过保留期的月份可以直接删除分区，不必执行大批量 DELETE。分区维护：python -m jobs.partition_manager
+--
+-- 注意事项：
+-- 1. MySQL 要求分区表的主键和唯一索引包含分区字段，改造后：
+--    - 主键变为 (id, create_time)，id 仍然自增、唯一
+--    - t_order 的 uk_merchant_order_id 变为 (merchant_id, order_id, create_time)：同一订单重复推送时 create_time 必须不变，
+--      否则幂等写入会新增一行而不是更新。幂等写入对已存在的订单使用库中保存的 create_time（推送数据中没有 create_time
+--      或 create_time 不在更新字段中时），只有明确要求更新 create_time 时才使用推送的值
+--    - t_recall 的 uk_token 变为 (token, create_time)：token 为随机生成，不影响唯一性
+-- 2. 只按 token、订单号等非时间条件的查询会在每个分区各查一次索引，分区数量不宜过多（保留期内按月约 12~36 个）
+-- 3. 改造会重建整张表，期间阻塞写入，应在低峰期执行，或使用 gh-ost / pt-online-schema-change
+-- 4. p_history 存放改造前的历史数据，起始月份按实际数据调整；之后的月份由 partition_manager 自动创建
+
+-- 1. 订单表
+ALTER TABLE `t_order`
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (`id`, `create_time`),
+  DROP INDEX `uk_merchant_order_id`,
+  ADD UNIQUE KEY `uk_merchant_order_id` (`merchant_id`, `order_id`, `create_time`) COMMENT '同一商家下的订单号必须唯一（分区表需包含分区字段）';
+
+ALTER TABLE `t_order`
+PARTITION BY RANGE COLUMNS (`create_time`) (
+  PARTITION p_history VALUES LESS THAN ('2025-01-01'),
+  PARTITION p202501 VALUES LESS THAN ('2025-02-01'),
+  PARTITION p202502 VALUES LESS THAN ('2025-03-01'),
+  PARTITION p202503 VALUES LESS THAN ('2025-04-01'),
+  PARTITION p_max VALUES LESS THAN (MAXVALUE)
+);
+
+-- 2. 召回记录表
+ALTER TABLE `t_recall`
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (`id`, `create_time`),
+  DROP INDEX `uk_token`,
+  ADD UNIQUE KEY `uk_token` (`token`, `create_time`);
+
+ALTER TABLE `t_recall`
+PARTITION BY RANGE COLUMNS (`create_time`) (
+  PARTITION p_history VALUES LESS THAN ('2025-01-01'),
+  PARTITION p202501 VALUES LESS THAN ('2025-02-01'),
+  PARTITION p202502 VALUES LESS THAN ('2025-03-01'),
+  PARTITION p202503 VALUES LESS THAN ('2025-04-01'),
+  PARTITION p_max VALUES LESS THAN (MAXVALUE)
+);
+
+-- 3. 补齐到当前月份之后 3 个月的分区
+-- python -m jobs.partition_manager --months-ahead 3 --execute
@@ -0,0 +1,157 @@
+"""
+QueryBuilder SQL 模板缓存微基准
+
+对比逐次拼接 SQL 的旧实现与按查询结构缓存模板的现实现，覆盖 DAO 中最热的几类调用，
+并校验两者生成的 SQL 和参数一致（IN 列表按长度分档补齐的情况除外）。
+
+用法:
+    python -m benchmarks.query_builder_bench [--number 200000]
+"""
+import argparse
+import timeit
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from services.dao.query_builder import QueryBuilder
+
+
+def legacy_where_clause(conditions: Optional[Dict[str, Any]] = None) -> Tuple[str, List[Any]]:
+    """旧实现：每次遍历条件并拼接 WHERE 子句"""
+    if not conditions:
+        return "", []
+    where_conditions = []
+    params = []
+    for field, value in conditions.items():
+        if value is None:
+            continue
+        if isinstance(value, dict):
+            for op, op_value in value.items():
+                if op == "$gt":
+                    where_conditions.append(f"{field} > %s")
+                    params.append(op_value)
+                elif op == "$gte":
+                    where_conditions.append(f"{field} >= %s")
+                    params.append(op_value)
+                elif op == "$lt":
+                    where_conditions.append(f"{field} < %s")
+                    params.append(op_value)
+                elif op == "$lte":
+                    where_conditions.append(f"{field} <= %s")
+                    params.append(op_value)
+                elif op == "$ne":
+                    where_conditions.append(f"{field} != %s")
+                    params.append(op_value)
+                elif op == "$like":
+                    where_conditions.append(f"{field} LIKE %s")
+                    params.append(f"%{op_value}%")
+                elif op == "$in":
+                    if not op_value:
+                        continue
+                    placeholders = ', '.join(['%s'] * len(op_value))
+                    where_conditions.append(f"{field} IN ({placeholders})")
+                    params.extend(op_value)
+                elif op == "$between":
+                    if len(op_value) == 2:
+                        where_conditions.append(f"{field} BETWEEN %s AND %s")
+                        params.extend(op_value)
+        elif isinstance(value, list):
+            if not value:
+                continue
+            placeholders = ', '.join(['%s'] * len(value))
+            where_conditions.append(f"{field} IN ({placeholders})")
+            params.extend(value)
+        elif isinstance(value, str) and '%' in value:
+            where_conditions.append(f"{field} LIKE %s")
+            params.append(value)
+        elif isinstance(value, bool):
+            where_conditions.append(f"{field} = %s")
+            params.append(1 if value else 0)
+        else:
+            where_conditions.append(f"{field} = %s")
+            params.append(value)
+    if where_conditions:
+        return "WHERE " + " AND ".join(where_conditions), params
+    return "", params
+
+
+def legacy_select_query(table, fields=None, conditions=None, order_by=None, limit=None, offset=None, group_by=None):
+    """旧实现：逐段拼接 SELECT 语句"""
+    select_clause = f"SELECT {', '.join(fields)}" if fields else "SELECT *"
+    where_clause, params = legacy_where_clause(conditions)
+    group_clause = f"GROUP BY {', '.join(group_by)}" if group_by else ""
+    order_clause = f"ORDER BY {', '.join(order_by)}" if order_by else ""
+    limit_clause = ""
+    if limit is not None:
+        limit_clause = "LIMIT %s"
+        params.append(limit)
+        if offset is not None:
+            limit_clause += " OFFSET %s"
+            params.append(offset)
+    sql_parts = [select_clause, f"FROM {table}", where_clause, group_clause, order_clause, limit_clause]
+    return " ".join(filter(None, sql_parts)), params
+
+
+def legacy_update_query(table, data, conditions=None):
+    """旧实现：逐段拼接 UPDATE 语句"""
+    set_clause = []
+    params = []
+    for column, value in data.items():
+        if value is not None:
+            set_clause.append(f"{column} = %s")
+            params.append(value)
+    sql = f"UPDATE {table} SET {', '.join(set_clause)}"
+    if conditions:
+        where_clause, where_params = legacy_where_clause(conditions)
+        if where_clause:
+            sql += " " + where_clause
+            params.extend(where_params)
+    return sql, params
+
+
+def cases() -> Dict[str, Tuple]:
+    """DAO 中的典型调用：(旧实现, 新实现, 参数)"""
+    now = datetime.now()
+    tokens = [f"token{index}" for index in range(64)]
+    return {
+        "get_recall_by_token": (
+            legacy_select_query, QueryBuilder.build_select_query,
+            ("t_recall",), {"conditions": {"token": "0f6c2b8e4d1a4c3b9e7f5a6d8c2b1e0f"}}
+        ),
+        "mark_recall_clicked": (
+            legacy_update_query, QueryBuilder.build_update_query,
+            ("t_recall", {"click": 1, "click_time": now}, {"token": "0f6c2b8e4d1a4c3b9e7f5a6d8c2b1e0f", "click": 0}), {}
+        ),
+        "mark_recalls_clicked_batch(64)": (
+            legacy_update_query, QueryBuilder.build_update_query,
+            ("t_recall", {"click": 1, "click_time": now}, {"token": {"$in": tokens}, "click": 0}), {}
+        ),
+        "query_orders(range+page)": (
+            legacy_select_query, QueryBuilder.build_select_query,
+            ("t_order",), {
+                "fields": ["order_id", "user_id", "amount", "create_time"],
+                "conditions": {"merchant_id": 1, "create_time": {"$between": ["2024-01-01", "2024-01-31"]},
+                               "product_type": "数码"},
+                "order_by": ["create_time DESC"], "limit": 20, "offset": 40
+            }
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="QueryBuilder SQL 模板缓存微基准")
+    parser.add_argument("--number", type=int, default=200000, help="每个用例的调用次数")
+    args = parser.parse_args()
+
+    print(f"{'用例':<32}{'旧实现(us)':>12}{'缓存(us)':>12}{'节省':>8}")
+    for name, (legacy, cached, call_args, call_kwargs) in cases().items():
+        # 结果一致性校验
+        assert legacy(*call_args, **call_kwargs) == cached(*call_args, **call_kwargs), name
+        legacy_time = min(timeit.repeat(lambda: legacy(*call_args, **call_kwargs), number=args.number, repeat=3))
+        cached_time = min(timeit.repeat(lambda: cached(*call_args, **call_kwargs), number=args.number, repeat=3))
+        legacy_us = legacy_time / args.number * 1e6
+        cached_us = cached_time / args.number * 1e6
+        print(f"{name:<32}{legacy_us:>12.2f}{cached_us:>12.2f}{1 - cached_us / legacy_us:>8.0%}")
+    print(QueryBuilder.shape_cache_info())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+RFM 用户分群基准
+
+生成随机订单明细，对比逐条遍历 dict 的实现与 segmentation_service 的列运算实现（抽样校验两者结果一致），
+并单独测量列运算实现在大数据量下的耗时。
+
+用法:
+    python -m benchmarks.segmentation_bench [--orders 10000000] [--users 1000000] [--legacy-orders 200000]
+"""
+import argparse
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, List
+import numpy as np
+import pandas as pd
+from services.segmentation_service import (
+    SEGMENT_ACTIVE_DAYS, SEGMENT_CHURN_DAYS, SEGMENT_SILENT_DAYS, USER_VALUE_LABELS, segment_orders
+)
+
+AS_OF = datetime(2025, 6, 30)
+PRODUCT_TYPES = np.array(["服装", "数码", "食品", "美妆", "家居"], dtype=object)
+INDUSTRIES = np.array(["零售", "餐饮", "教育"], dtype=object)
+
+
+def synthetic_orders(order_count: int, user_count: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    seconds = rng.integers(0, 365 * 86400, order_count)
+    return pd.DataFrame({
+        "user_id": rng.integers(0, user_count, order_count).astype(str),
+        "create_time": np.datetime64(AS_OF, "s") - seconds.astype("timedelta64[s]"),
+        "amount": rng.gamma(2.0, 80.0, order_count).round(2),
+        "product_type": PRODUCT_TYPES[rng.integers(0, len(PRODUCT_TYPES), order_count)],
+        "industry": INDUSTRIES[rng.integers(0, len(INDUSTRIES), order_count)]
+    })
+
+
+def legacy_segment(orders: List[Dict[str, Any]]) -> Dict[str, str]:
+    """旧式实现：逐条累加到 dict，再逐个用户判断价值分群"""
+    users: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"last": None, "frequency": 0, "monetary": 0.0})
+    for order in orders:
+        user = users[order["user_id"]]
+        if user["last"] is None or order["create_time"] > user["last"]:
+            user["last"] = order["create_time"]
+        user["frequency"] += 1
+        user["monetary"] += order["amount"]
+    for user in users.values():
+        user["recency"] = (AS_OF - user["last"]).days
+    count = len(users)
+    mean_r = sum(user["recency"] for user in users.values()) / count
+    mean_f = sum(user["frequency"] for user in users.values()) / count
+    mean_m = sum(user["monetary"] for user in users.values()) / count
+    result = {}
+    for user_id, user in users.items():
+        code = (user["recency"] < mean_r) * 4 + (user["frequency"] > mean_f) * 2 + (user["monetary"] > mean_m)
+        result[user_id] = USER_VALUE_LABELS[code]
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="RFM 用户分群基准")
+    parser.add_argument("--orders", type=int, default=10_000_000, help="列运算实现的订单数")
+    parser.add_argument("--users", type=int, default=1_000_000, help="用户数")
+    parser.add_argument("--legacy-orders", type=int, default=200_000, help="对比旧实现使用的订单数")
+    args = parser.parse_args()
+
+    small = synthetic_orders(args.legacy_orders, max(args.legacy_orders // 10, 1))
+    records = small.assign(create_time=small["create_time"].dt.to_pydatetime()).to_dict("records")
+    start = time.perf_counter()
+    legacy = legacy_segment(records)
+    legacy_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    vectorized = segment_orders(small, AS_OF)["assignments"]["user_value"]
+    vectorized_seconds = time.perf_counter() - start
+    mismatched = sum(legacy[user_id] != value for user_id, value in vectorized.items())
+    print(f"{args.legacy_orders} 笔订单: 逐条遍历 {legacy_seconds:.2f}s, 列运算 {vectorized_seconds:.2f}s, "
+          f"user_value 不一致 {mismatched} 个")
+
+    orders = synthetic_orders(args.orders, args.users)
+    start = time.perf_counter()
+    result = segment_orders(orders, AS_OF)
+    seconds = time.perf_counter() - start
+    assignments = result["assignments"]
+    print(f"{args.orders} 笔订单 / {len(assignments)} 个用户: 列运算 {seconds:.2f}s, "
+          f"{len(result['portraits'])} 个画像分段")
+    print(f"用户状态阈值（天）: {SEGMENT_ACTIVE_DAYS}/{SEGMENT_SILENT_DAYS}/{SEGMENT_CHURN_DAYS}")
+    for label, count in Counter(assignments["user_value"]).most_common():
+        print(f"  {label:<8}{count:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,21 @@ class DBConfig:
     PASSWORD = os.getenv("DB_PASSWORD", "654321")
     DATABASE = os.getenv("DB_NAME", "aiops")
     CHARSET = os.getenv("CHARSET", "UTF8MB4")
+
+    # 连接池（每个进程独立，多 worker 部署时总连接数 = 每进程上限 × worker 数）
+    POOL_MAX_CONNECTIONS = int(os.getenv("DB_POOL_MAX_CONNECTIONS", "10"))
+    POOL_MIN_CACHED = int(os.getenv("DB_POOL_MIN_CACHED", "2"))
+    POOL_MAX_CACHED = int(os.getenv("DB_POOL_MAX_CACHED", "5"))
+    ASYNC_POOL_MIN_SIZE = int(os.getenv("DB_ASYNC_POOL_MIN_SIZE", "2"))
+    ASYNC_POOL_MAX_SIZE = int(os.getenv("DB_ASYNC_POOL_MAX_SIZE", "10"))
+    # 连接池耗尽时等待空闲连接的最长秒数，超时抛出 PoolTimeoutError
+    POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+    # 同步池的 DBUtils ping 策略：0 不检查，1 取出时检查（默认），7 每次使用都检查
+    POOL_PING = int(os.getenv("DB_POOL_PING", "1"))
+    # 异步池连接空闲超过该秒数后，取出时先 ping 一次，断开的连接自动重连
+    POOL_PING_IDLE = float(os.getenv("DB_POOL_PING_IDLE", "30"))
+    # 异步池连接最长使用秒数，超过后关闭重建，应小于 MySQL 的 wait_timeout
+    POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
     
     @classmethod
     def to_dict(cls):
@@ -1,26 +1,234 @@
 # db/connection.py
+from contextlib import asynccontextmanager
 from dbutils.pooled_db import PooledDB
+from typing import Dict, Optional
+import asyncio
+import threading
+import time
+import weakref
+import aiomysql
 import pymysql
 from db.config import DBConfig
 
-# 创建连接池（全局单例）
-pool = PooledDB(
-    creator=pymysql,
-    maxconnections=10,          # 最大连接数
-    mincached=2,                # 初始化时缓存的连接数
-    maxcached=5,                # 最大缓存连接数
-    maxshared=0,                # 共享连接数（PyMySQL 不支持，设为0）
-    blocking=True,              # 连接数满时是否等待
-    host=DBConfig.HOST,
-    port=DBConfig.PORT,
-    user=DBConfig.USER,
-    password=DBConfig.PASSWORD,
-    database=DBConfig.DATABASE,
-    charset=DBConfig.CHARSET,
-    cursorclass=pymysql.cursors.DictCursor,
-    autocommit=True
-)
+# 等待连接耗时直方图的分桶上限（毫秒）
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+class PoolTimeoutError(Exception):
+    """连接池耗尽且在 DBConfig.POOL_TIMEOUT 秒内没有连接归还"""
+
+class PoolMetrics:
+    """连接池取用统计：使用中、等待中的数量和等待耗时分布"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.waiters = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def wait_started(self) -> None:
+        with self._lock:
+            self.waiters += 1
+
+    def wait_finished(self, waited: float, acquired: bool) -> None:
+        waited_ms = waited * 1000
+        index = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if waited_ms <= bound), len(WAIT_BUCKETS_MS))
+        with self._lock:
+            self.waiters -= 1
+            self.wait_seconds += waited
+            self.wait_buckets[index] += 1
+            if acquired:
+                self.in_use += 1
+                self.checkouts += 1
+            else:
+                self.timeouts += 1
+
+    def released(self) -> None:
+        with self._lock:
+            self.in_use -= 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            histogram = {}
+            cumulative = 0
+            for bound, count in zip(WAIT_BUCKETS_MS, self.wait_buckets):
+                cumulative += count
+                histogram[f"le_{bound}ms"] = cumulative
+            histogram["+Inf"] = cumulative + self.wait_buckets[-1]
+            waits = histogram["+Inf"]
+            return {
+                "in_use": self.in_use,
+                "waiters": self.waiters,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.wait_seconds / waits * 1000, 3) if waits else 0.0,
+                "wait_histogram": histogram
+            }
+
+class _CheckedOutConnection:
+    """同步池取出的连接，close() 时归还连接池并释放占用的名额，其余属性透传给底层连接"""
+
+    _conn = None
+
+    def __init__(self, conn, release):
+        self._conn = conn
+        self._release = release
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._conn.close()
+        finally:
+            self._conn = None
+            self._release()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __del__(self):
+        self.close()
+
+# 同步连接池（全局单例，首次使用时创建，导入时不再连接数据库）
+_pool: Optional[PooledDB] = None
+_pool_lock = threading.Lock()
+# 连接池容量对应的名额：DBUtils 的 blocking=True 会无限等待，改为限时获取名额
+_pool_slots = threading.BoundedSemaphore(DBConfig.POOL_MAX_CONNECTIONS)
+_pool_metrics = PoolMetrics()
+
+# 异步连接池（需要事件循环，首次使用时创建）
+_async_pool = None
+_async_pool_lock = asyncio.Lock()
+_async_pool_slots: Optional[asyncio.Semaphore] = None
+_async_pool_metrics = PoolMetrics()
+# 异步连接最近一次归还的时间，用于判断取出时是否需要 ping
+_async_last_used: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def _pool_timeout() -> Optional[float]:
+    """小于等于 0 表示不限时等待"""
+    return DBConfig.POOL_TIMEOUT if DBConfig.POOL_TIMEOUT > 0 else None
+
+def _get_pool() -> PooledDB:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PooledDB(
+                    creator=pymysql,
+                    maxconnections=DBConfig.POOL_MAX_CONNECTIONS,  # 最大连接数
+                    mincached=DBConfig.POOL_MIN_CACHED,             # 初始化时缓存的连接数
+                    maxcached=DBConfig.POOL_MAX_CACHED,             # 最大缓存连接数
+                    maxshared=0,                # 共享连接数（PyMySQL 不支持，设为0）
+                    blocking=True,              # 名额已限制并发取用，不会真正阻塞
+                    ping=DBConfig.POOL_PING,    # 取出空闲连接时检查连通性，断开则重连
+                    host=DBConfig.HOST,
+                    port=DBConfig.PORT,
+                    user=DBConfig.USER,
+                    password=DBConfig.PASSWORD,
+                    database=DBConfig.DATABASE,
+                    charset=DBConfig.CHARSET,
+                    cursorclass=pymysql.cursors.DictCursor,
+                    autocommit=True
+                )
+    return _pool
+
+def _release_connection() -> None:
+    _pool_slots.release()
+    _pool_metrics.released()
 
 def get_db_connection():
-    """从连接池获取连接"""
-    return pool.connection()
\ No newline at end of file
+    """从连接池获取连接，连接池耗尽时最多等待 DBConfig.POOL_TIMEOUT 秒"""
+    pool = _get_pool()
+    started = time.monotonic()
+    _pool_metrics.wait_started()
+    acquired = _pool_slots.acquire(timeout=_pool_timeout())
+    _pool_metrics.wait_finished(time.monotonic() - started, acquired)
+    if not acquired:
+        raise PoolTimeoutError(
+            f"获取数据库连接超时: 等待 {DBConfig.POOL_TIMEOUT} 秒，"
+            f"连接池上限 {DBConfig.POOL_MAX_CONNECTIONS}，使用中 {_pool_metrics.in_use}"
+        )
+    try:
+        conn = pool.connection()
+    except Exception:
+        _release_connection()
+        raise
+    return _CheckedOutConnection(conn, _release_connection)
+
+async def get_async_pool():
+    """获取异步连接池，首次调用时创建"""
+    global _async_pool, _async_pool_slots
+    if _async_pool is None:
+        async with _async_pool_lock:
+            if _async_pool is None:
+                _async_pool_slots = asyncio.Semaphore(DBConfig.ASYNC_POOL_MAX_SIZE)
+                _async_pool = await aiomysql.create_pool(
+                    minsize=DBConfig.ASYNC_POOL_MIN_SIZE,
+                    maxsize=DBConfig.ASYNC_POOL_MAX_SIZE,
+                    pool_recycle=DBConfig.POOL_RECYCLE,
+                    host=DBConfig.HOST,
+                    port=DBConfig.PORT,
+                    user=DBConfig.USER,
+                    password=DBConfig.PASSWORD,
+                    db=DBConfig.DATABASE,
+                    charset=DBConfig.CHARSET,
+                    cursorclass=aiomysql.DictCursor,
+                    autocommit=True
+                )
+    return _async_pool
+
+@asynccontextmanager
+async def acquire_async_connection():
+    """从异步连接池取出连接，连接池耗尽时最多等待 DBConfig.POOL_TIMEOUT 秒，退出时归还"""
+    pool = await get_async_pool()
+    slots = _async_pool_slots
+    started = time.monotonic()
+    _async_pool_metrics.wait_started()
+    try:
+        await asyncio.wait_for(slots.acquire(), _pool_timeout())
+    except asyncio.TimeoutError:
+        _async_pool_metrics.wait_finished(time.monotonic() - started, False)
+        raise PoolTimeoutError(
+            f"获取数据库连接超时: 等待 {DBConfig.POOL_TIMEOUT} 秒，"
+            f"连接池上限 {DBConfig.ASYNC_POOL_MAX_SIZE}，使用中 {_async_pool_metrics.in_use}"
+        ) from None
+    except BaseException:
+        _async_pool_metrics.wait_finished(time.monotonic() - started, False)
+        raise
+    _async_pool_metrics.wait_finished(time.monotonic() - started, True)
+
+    try:
+        async with pool.acquire() as conn:
+            try:
+                # 空闲较久的连接可能已被服务端断开，先 ping，必要时重连
+                if time.monotonic() - _async_last_used.get(conn, 0) > DBConfig.POOL_PING_IDLE:
+                    await conn.ping(reconnect=True)
+                yield conn
+            finally:
+                _async_last_used[conn] = time.monotonic()
+    finally:
+        slots.release()
+        _async_pool_metrics.released()
+
+async def close_async_pool():
+    """关闭异步连接池（应用退出时调用）"""
+    global _async_pool, _async_pool_slots
+    if _async_pool is not None:
+        _async_pool.close()
+        await _async_pool.wait_closed()
+        _async_pool = None
+        _async_pool_slots = None
+
+def pool_stats() -> Dict:
+    """同步/异步连接池的实时统计（本进程）"""
+    sync_stats = _pool_metrics.snapshot()
+    sync_stats["max_connections"] = DBConfig.POOL_MAX_CONNECTIONS
+    sync_stats["idle"] = len(getattr(_pool, "_idle_cache", ())) if _pool is not None else 0
+
+    async_stats = _async_pool_metrics.snapshot()
+    async_stats["max_connections"] = DBConfig.ASYNC_POOL_MAX_SIZE
+    async_stats["size"] = _async_pool.size if _async_pool is not None else 0
+    async_stats["idle"] = _async_pool.freesize if _async_pool is not None else 0
+    return {"sync": sync_stats, "async": async_stats}
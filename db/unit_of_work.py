@@ -0,0 +1,135 @@
+# db/unit_of_work.py
+"""
+工作单元：在一个上下文（一次请求、一个后台任务）内共享同一个数据库连接
+
+作用域内 BaseDAO 的读写自动复用工作单元的连接，不再每条语句各自从连接池取出、归还；
+transaction=True 时作用域内的写入处于同一事务，正常退出时提交，抛出异常时回滚。
+
+- 同步和异步作用域相互独立：同步作用域持有 PooledDB 连接，异步作用域持有 aiomysql 连接
+- 嵌套的作用域加入外层的连接；外层没有开启事务时，内层 transaction=True 在共享连接上开启事务，内层退出时结束
+- 事务中有语句失败时工作单元标记为只能回滚，调用方吞掉异常也不会提交部分写入
+- 异步作用域内不要并发（asyncio.gather）执行查询，一个连接同一时间只能执行一条语句
+"""
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional, Iterator, AsyncIterator
+import logging
+from db.connection import get_db_connection, acquire_async_connection
+
+logger = logging.getLogger(__name__)
+
+class UnitOfWork:
+    """工作单元持有的连接和事务状态"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.transaction = False
+        self.rollback_only = False
+
+    def mark_rollback_only(self) -> None:
+        """事务中的语句失败后调用，作用域退出时回滚而不是提交"""
+        if self.transaction:
+            self.rollback_only = True
+
+_current_uow: ContextVar[Optional[UnitOfWork]] = ContextVar("unit_of_work", default=None)
+_current_uow_async: ContextVar[Optional[UnitOfWork]] = ContextVar("unit_of_work_async", default=None)
+
+def current_unit_of_work() -> Optional[UnitOfWork]:
+    """当前上下文的同步工作单元，不在作用域内时返回 None"""
+    return _current_uow.get()
+
+def current_unit_of_work_async() -> Optional[UnitOfWork]:
+    """当前上下文的异步工作单元，不在作用域内时返回 None"""
+    return _current_uow_async.get()
+
+@contextmanager
+def unit_of_work(transaction: bool = False) -> Iterator[UnitOfWork]:
+    """同步工作单元作用域"""
+    uow = _current_uow.get()
+    if uow is not None:
+        with _join(uow, transaction):
+            yield uow
+        return
+
+    conn = get_db_connection()
+    uow = UnitOfWork(conn)
+    token = _current_uow.set(uow)
+    try:
+        with _join(uow, transaction):
+            yield uow
+    finally:
+        _current_uow.reset(token)
+        conn.close()
+
+@asynccontextmanager
+async def unit_of_work_async(transaction: bool = False) -> AsyncIterator[UnitOfWork]:
+    """异步工作单元作用域"""
+    uow = _current_uow_async.get()
+    if uow is not None:
+        async with _join_async(uow, transaction):
+            yield uow
+        return
+
+    async with acquire_async_connection() as conn:
+        uow = UnitOfWork(conn)
+        token = _current_uow_async.set(uow)
+        try:
+            async with _join_async(uow, transaction):
+                yield uow
+        finally:
+            _current_uow_async.reset(token)
+
+@contextmanager
+def _join(uow: UnitOfWork, transaction: bool) -> Iterator[None]:
+    if uow.transaction or not transaction:
+        # 加入已有事务（或无需事务），失败时由开启事务的作用域回滚
+        try:
+            yield
+        except BaseException:
+            uow.mark_rollback_only()
+            raise
+        return
+
+    uow.conn.begin()
+    uow.transaction = True
+    try:
+        yield
+    except BaseException:
+        uow.conn.rollback()
+        raise
+    else:
+        if uow.rollback_only:
+            logger.warning("工作单元事务中有语句执行失败，已回滚")
+            uow.conn.rollback()
+        else:
+            uow.conn.commit()
+    finally:
+        uow.transaction = False
+        uow.rollback_only = False
+
+@asynccontextmanager
+async def _join_async(uow: UnitOfWork, transaction: bool) -> AsyncIterator[None]:
+    if uow.transaction or not transaction:
+        try:
+            yield
+        except BaseException:
+            uow.mark_rollback_only()
+            raise
+        return
+
+    await uow.conn.begin()
+    uow.transaction = True
+    try:
+        yield
+    except BaseException:
+        await uow.conn.rollback()
+        raise
+    else:
+        if uow.rollback_only:
+            logger.warning("工作单元事务中有语句执行失败，已回滚")
+            await uow.conn.rollback()
+        else:
+            await uow.conn.commit()
+    finally:
+        uow.transaction = False
+        uow.rollback_only = False
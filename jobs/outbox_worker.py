@@ -0,0 +1,43 @@
+"""
+发件箱召回消息发送 worker（独立进程），每个进程发送一个渠道（sms-短信，qywechat-企业微信）
+
+可以在多台机器上同时运行多个进程，通过 SELECT ... FOR UPDATE SKIP LOCKED 批量认领消息，互不重复发送。
+
+用法:
+    python -m jobs.outbox_worker --workers 4
+    python -m jobs.outbox_worker --channel qywechat --workers 2
+"""
+import argparse
+import asyncio
+import logging
+from db.connection import close_async_pool
+from services.delivery_service import DeliveryPipeline, DELIVERY_WORKERS, SMS_BATCH_SIZE, WECHAT_BATCH_SIZE
+from utils.sms.yunpian import SmsRecallSender
+from utils.qywechat.qywechat import WeChatOutboxSender
+
+logger = logging.getLogger(__name__)
+
+async def run(workers: int, channel: str = "sms") -> None:
+    if channel == "qywechat":
+        pipeline = DeliveryPipeline(WeChatOutboxSender(), workers=workers, channel=channel, batch_size=WECHAT_BATCH_SIZE)
+    else:
+        pipeline = DeliveryPipeline(SmsRecallSender(), workers=workers, channel=channel, batch_size=SMS_BATCH_SIZE)
+    try:
+        await pipeline.run_forever()
+    finally:
+        await close_async_pool()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="召回消息发件箱发送 worker")
+    parser.add_argument("--channel", choices=["sms", "qywechat"], default="sms", help="发送渠道")
+    parser.add_argument("--workers", type=int, default=max(DELIVERY_WORKERS, 1), help="并发发送的 worker 数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        asyncio.run(run(args.workers, args.channel))
+    except KeyboardInterrupt:
+        logger.info("发送 worker 已停止")
+
+if __name__ == "__main__":
+    main()
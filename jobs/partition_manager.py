@@ -0,0 +1,69 @@
+"""
+t_order / t_recall 月度分区维护（独立进程，建议每天由 cron 执行一次）
+
+- 从 p_max 中拆出未来 --months-ahead 个月的分区，保证新数据总是写入按月划分的分区
+- 指定 --keep-months 时删除超过保留期的月份；t_recall 加 --archive 时先把分区数据复制到 t_recall_archive 再删除
+- 默认只打印将要执行的操作，加 --execute 才真正执行
+
+表需要先按 aiops_partitioning.sql 完成分区改造。
+
+用法:
+    python -m jobs.partition_manager --months-ahead 3
+    python -m jobs.partition_manager --table t_recall --keep-months 6 --archive --execute
+"""
+import argparse
+import logging
+from services.dao.partition_dao import PartitionDAO, PARTITIONED_TABLES
+
+logger = logging.getLogger(__name__)
+
+def maintain(table: str, months_ahead: int, keep_months: int, archive: bool, execute: bool) -> None:
+    dao = PartitionDAO(table)
+
+    sql = dao.build_future_partitions_query(months_ahead)
+    if sql:
+        logger.info(f"{table} 新增分区:\n{sql}")
+        if execute:
+            dao.execute_update(sql)
+    else:
+        logger.info(f"{table} 已有未来 {months_ahead} 个月的分区")
+
+    if keep_months is None:
+        return
+    expired = dao.expired_partitions(keep_months)
+    if not expired:
+        logger.info(f"{table} 没有超过 {keep_months} 个月保留期的分区")
+        return
+    names = [partition["name"] for partition in expired]
+    logger.info(f"{table} 超过保留期的分区: {', '.join(names)}（约 {sum(p['rows'] or 0 for p in expired)} 行）")
+    if not execute:
+        return
+    if archive:
+        for name in names:
+            copied = dao.archive_partition(name)
+            logger.info(f"{table}.{name} 已归档 {copied} 行")
+    dao.drop_partitions(names)
+    logger.info(f"{table} 已删除分区: {', '.join(names)}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="维护 t_order / t_recall 的月度分区")
+    parser.add_argument("--table", action="append", choices=PARTITIONED_TABLES,
+                        help="要维护的表，可重复指定，默认全部")
+    parser.add_argument("--months-ahead", type=int, default=3, help="提前创建的月份数")
+    parser.add_argument("--keep-months", type=int, default=None,
+                        help="保留最近的月份数（不含当月），超过的分区被删除；不指定则不删除")
+    parser.add_argument("--archive", action="store_true", help="删除 t_recall 分区前先复制到 t_recall_archive")
+    parser.add_argument("--execute", action="store_true", help="执行变更，默认只打印计划")
+    args = parser.parse_args()
+
+    if args.keep_months is not None and args.keep_months < 1:
+        parser.error("--keep-months 至少为 1")
+    if args.archive and args.table and "t_recall" not in args.table:
+        parser.error("--archive 只适用于 t_recall")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    for table in args.table or PARTITIONED_TABLES:
+        maintain(table, args.months_ahead, args.keep_months, args.archive and table == "t_recall", args.execute)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+按明细表重建每日汇总（t_order_daily / t_order_daily_user / t_recall_daily）
+
+每日汇总在写入订单、创建召回和状态变更时增量更新，上线前的历史数据需要用本脚本回填一次；
+直接修改明细表（不经过 DAO）后也可以重建对应日期。每天一个事务，可以重复执行。
+
+用法:
+    python -m jobs.rebuild_daily_rollups --start 2024-01-01 --end 2024-12-31
+    python -m jobs.rebuild_daily_rollups --start 2024-06-01 --end 2024-06-30 --merchant-id 1 --only recall
+"""
+import argparse
+import logging
+from services.dao.order_daily_dao import OrderDailyDAO
+from services.dao.recall_daily_dao import RecallDailyDAO
+
+logger = logging.getLogger(__name__)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="重建每日销售/召回汇总")
+    parser.add_argument("--start", required=True, help="开始日期，如 2024-01-01")
+    parser.add_argument("--end", required=True, help="结束日期（包含），如 2024-12-31")
+    parser.add_argument("--merchant-id", type=int, default=None, help="只重建指定商家，默认所有商家")
+    parser.add_argument("--only", choices=["order", "recall"], default=None, help="只重建销售或召回汇总")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.only != "recall":
+        days = OrderDailyDAO().rebuild_days(args.start, args.end, args.merchant_id)
+        logger.info(f"每日销售汇总重建完成，共 {days} 天")
+    if args.only != "order":
+        days = RecallDailyDAO().rebuild_days(args.start, args.end, args.merchant_id)
+        logger.info(f"每日召回汇总重建完成，共 {days} 天")
+
+if __name__ == "__main__":
+    main()
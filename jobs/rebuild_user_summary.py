@@ -0,0 +1,28 @@
+"""
+按 t_order 重建用户订单汇总表 t_user_summary
+
+t_user_summary 在写入订单时增量更新，上线前已有的历史订单需要用本脚本回填一次；
+汇总数据与订单不一致时（例如直接修改了 t_order）也可以重新执行。
+
+用法:
+    python -m jobs.rebuild_user_summary --merchant-id 1 --merchant-id 2
+"""
+import argparse
+import logging
+from services.dao.user_summary_dao import UserSummaryDAO
+
+logger = logging.getLogger(__name__)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="重建用户订单汇总")
+    parser.add_argument("--merchant-id", type=int, action="append", required=True, help="商家ID，可重复指定")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    user_summary_dao = UserSummaryDAO()
+    for merchant_id in args.merchant_id:
+        affected_rows = user_summary_dao.rebuild_merchant(merchant_id)
+        logger.info(f"商家 {merchant_id} 用户汇总重建完成，影响行数 {affected_rows}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+过期召回记录清理（独立进程，可由 cron 定时执行）
+
+令牌过期超过保留天数且从未点击的召回记录按主键顺序分批移入 t_recall_archive（--delete 时直接删除），
+每批一个短事务，批次之间可以暂停，避免长时间锁表和主从延迟。进度记录在 t_recall_retention_progress，
+中断后重新执行会从上次的位置继续。
+
+用法:
+    python -m jobs.recall_retention --retention-days 30 --chunk-size 500 --sleep 0.2
+    python -m jobs.recall_retention --delete --max-chunks 100
+"""
+import argparse
+import logging
+from datetime import datetime, timedelta
+from services.dao.recall_archive_dao import RecallArchiveDAO
+
+logger = logging.getLogger(__name__)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="归档/删除过期未点击的召回记录")
+    parser.add_argument("--retention-days", type=int, default=30, help="令牌过期后保留的天数（至少 1 天）")
+    parser.add_argument("--chunk-size", type=int, default=500, help="每批处理的记录数")
+    parser.add_argument("--sleep", type=float, default=0.2, help="批次之间暂停的秒数")
+    parser.add_argument("--max-chunks", type=int, default=None, help="本次最多处理的批数，默认处理完为止")
+    parser.add_argument("--delete", action="store_true", help="直接删除，不写入归档表")
+    parser.add_argument("--reset", action="store_true", help="清除进度，从头开始扫描")
+    args = parser.parse_args()
+
+    if args.retention_days < 1:
+        parser.error("--retention-days 至少为 1")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    dao = RecallArchiveDAO()
+    job_name = "recall_delete" if args.delete else "recall_archive"
+    if args.reset:
+        dao.reset_progress(job_name)
+        logger.info(f"已清除清理进度: {job_name}")
+
+    before_date = datetime.now() - timedelta(days=args.retention_days)
+    dao.purge_expired(
+        before_date,
+        delete_only=args.delete,
+        chunk_size=args.chunk_size,
+        sleep_seconds=args.sleep,
+        max_chunks=args.max_chunks,
+        job_name=job_name
+    )
+
+if __name__ == "__main__":
+    main()
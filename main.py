@@ -1,14 +1,23 @@
 # main.py
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse
 from typing import Dict
 from dotenv import load_dotenv
 from services.order_service import OrderService
 from services.merchant_service import MerchantService
 from services.recall_service import RecallService
+from services.export_service import ExportService
+from services.session_service import SessionService, public_merchant
+from db.connection import close_async_pool, pool_stats
+from services.dao.query_builder import QueryBuilder
+from services.dao.recall_dao import (
+    CLAIM_SUCCESS, CLAIM_NOT_FOUND,
+    CLAIM_USER_MISMATCH, CLAIM_ALREADY_CLAIMED, CLAIM_EXPIRED
+)
 from datetime import datetime, timezone, timedelta
-import uuid, hashlib
+import hashlib
 
 # 加载 .env
 load_dotenv()
@@ -22,10 +31,58 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # 设置模板目录
 templates = Jinja2Templates(directory="templates")
 
+# 领取优惠券失败原因对应的提示
+CLAIM_FAILURE_MESSAGES = {
+    CLAIM_NOT_FOUND: "无效的优惠券链接",
+    CLAIM_USER_MISMATCH: "这不是你的优惠券！",
+    CLAIM_ALREADY_CLAIMED: "优惠券已领取，请勿重复领取！",
+    CLAIM_EXPIRED: "优惠券已过期。"
+}
+
+# /recalls/create 请求中每个召回对象可用的字段（商家取当前登录商家）
+RECALL_USER_FIELDS = ("user_name", "product", "product_type", "contact", "contact_type")
+
 #初始化service对象
-merchantService = MerchantService()
+sessionService = SessionService()
+merchantService = MerchantService(sessionService)
 orderService = OrderService()
 recallService = RecallService()
+exportService = ExportService()
+
+def get_bearer_token(request: Request) -> str:
+    """从 Authorization: Bearer <token> 或 X-Token 请求头中取出登录令牌"""
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        return authorization[7:].strip()
+    return request.headers.get("x-token", "")
+
+async def current_merchant(request: Request) -> Dict:
+    """
+    需要登录的接口使用的依赖：Depends(current_merchant) 返回当前商家记录（不含密码等敏感字段）
+
+    会话和商家记录在进程内缓存命中时不访问数据库，令牌无效、已过期或商家已删除时返回 401
+    """
+    session = await sessionService.get_session(get_bearer_token(request))
+    if session is None:
+        raise HTTPException(status_code=401, detail="登录已失效，请重新登录")
+    # 从商家缓存读取最新的商家记录，修改、删除商家后不必等会话过期
+    merchant = await merchantService.get_merchant_by_id_async(session["merchant_id"])
+    if not merchant or merchant.get("status") == "error" or merchant.get("is_deleted"):
+        raise HTTPException(status_code=401, detail="登录已失效，请重新登录")
+    return public_merchant(merchant)
+
+@app.on_event("startup")
+async def startup():
+    # 启动点击事件批量落库任务和短信发送管道
+    await recallService.start_click_buffer()
+    await recallService.start_delivery()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # 先把缓冲中的点击落库、发送队列中的短信，再关闭异步连接池
+    await recallService.stop_delivery()
+    await recallService.stop_click_buffer()
+    await close_async_pool()
 
 # === 1. API 接口：登录接口 ===
 @app.post("/login")
@@ -35,7 +92,7 @@ async def login(request: Request) -> Dict:
     password = body.get("password", None)
     if username is None:
         return {"status_code": "500", "message": "请填写用户名"}
-    user = merchantService.get_merchant_by_username(username)
+    user = await merchantService.get_merchant_by_username_async(username)
     # 检查用户是否存在
     if user is None:
         return {"status_code": "500", "message": "用户不存在"}
@@ -43,52 +100,87 @@ async def login(request: Request) -> Dict:
     if user.get('password') != hashlib.sha256(f"{password}".encode()).hexdigest():
         return {"status_code": "500", "message": "密码不正确"}
     name = user.get('name', username)
-    token = hashlib.sha256(f"{username}{password}{datetime.now().timestamp()}".encode()).hexdigest()
-    #将token存储n天，避免下次还要登录
+    #创建登录会话，token 在 SESSION_TTL_DAYS 天内有效，避免下次还要登录
+    session = await sessionService.create_session(user)
 
     return {
         "status_code": "200",
         "username":username,
         "name":name,
-        "token":token,
+        "token":session["token"],
+        "expires_at":session["expires_at"],
         "message": "登录成功"
     }
 
-# === 2. API 接口：保存订单 ===
+# 注销当前登录会话
+@app.post("/logout")
+async def logout(request: Request) -> Dict:
+    await sessionService.revoke_session(get_bearer_token(request))
+    return {"status_code": "200", "message": "已退出登录"}
+
+# 查询当前登录的商家
+@app.get("/session")
+async def get_session(merchant: Dict = Depends(current_merchant)) -> Dict:
+    return {"status_code": "200", "merchant": merchant}
+
+# === 2. API 接口：保存订单（订单归属当前登录商家） ===
 @app.post("/orders/create")
-async def create_orders(request: Request):
+async def create_orders(request: Request, merchant: Dict = Depends(current_merchant)):
+    # mode=upsert/ignore 时按商家订单号幂等写入，update_columns 指定冲突时更新的字段（逗号分隔）
+    mode = request.query_params.get("mode", "insert")
+    update_columns = request.query_params.get("update_columns")
+    update_columns = update_columns.split(",") if update_columns else None
+    # NDJSON 或 stream=true 时走流式导入，不把请求体整体读入内存
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or request.query_params.get("stream") == "true":
+        return await orderService.create_orders_stream(request.stream(), mode, update_columns,
+                                                       merchant_id=merchant["id"])
     body = await request.json()
     orders = body.get("orders", [])
     if not orders:
         return {"status_code": "500", "message": "没有订单数据"}
     # 保存订单数据到数据库
-    return orderService.create_orders(orders)
+    try:
+        return await orderService.create_orders_async(orders, mode, update_columns, merchant_id=merchant["id"])
+    except ValueError as e:
+        return {"status_code": "500", "message": str(e)}
 
 # === 3. API 接口：进行召回用户触达，MVP阶段使用短信或企业微信 ===
 @app.post("/recalls/create")
-async def create_recalls(request: Request):
+async def create_recalls(request: Request, merchant: Dict = Depends(current_merchant)):
     body = await request.json()
     recall_users = body.get("recall_users", [])
-    recall_records = []
-    for recall_user in recall_users:
-        recall_record = {}
-        recall_record["merchant_id"] = recall_user.get("merchant_id")
-        recall_record["user_name"] = recall_user.get("user_name")
-        recall_record["token"] = uuid.uuid4().hex
-        recall_record["token_expired"] = datetime.now(timezone.utc) + timedelta(days=7)
-        recall_record["product"] = recall_user.get("product")
-        recall_record["product_type"] = recall_user.get("product_type")
-        recall_record["contact"] = recall_user.get("contact")
-        recall_record["contact_type"] = recall_user.get("contact_type")
-        recall_records.append(recall_record)
-    #insertBatch t_recall记录，作为召回任务发出的记录
-    return recallService.create_recalls(recall_records)
+    # 只取召回对象字段，token、过期时间等由 RecallService 构建召回记录时生成
+    recalls = [
+        {"merchant_id": merchant["id"], **{field: recall_user.get(field) for field in RECALL_USER_FIELDS}}
+        for recall_user in recall_users
+    ]
+    #insertBatch t_recall记录，作为召回任务发出的记录；消息在后台发送，返回任务ID
+    return await recallService.create_recalls_async(recalls)
+
+# 查询当前商家召回任务的发送进度
+@app.get("/recalls/jobs/{job_id}")
+async def get_recall_job(job_id: str, merchant: Dict = Depends(current_merchant)) -> Dict:
+    job = await recallService.get_delivery_job_async(job_id, merchant["id"])
+    if job is None:
+        return {"status_code": "500", "message": "任务不存在"}
+    return {"status_code": "200", **job}
 
 # === 4. H5 召回落地页 ===
 @app.get("/landing/{token}")
 async def recall_landing(request: Request, token: str):
     # TODO: 根据 token 查询用户和优惠券
-    recall = recallService.get_recall(token)
+    # 查询召回记录并标记用户已打开
+    recall = await recallService.open_recall_async(token)
+    return render_landing(request, token, recall)
+
+# 短信中的短链接，解析为召回记录后展示同一个落地页
+@app.get("/r/{code}")
+async def recall_short_link(request: Request, code: str):
+    recall = await recallService.open_recall_by_code_async(code)
+    return render_landing(request, recall.get("token") if recall else None, recall)
+
+def render_landing(request: Request, token: str, recall: Dict):
     if recall is None:
         return templates.TemplateResponse(
             "error.html",
@@ -97,8 +189,6 @@ async def recall_landing(request: Request, token: str):
                 "message": "无效的优惠券链接或优惠券已过期。"
             }
         )
-    # 召回触达标记用户已打开
-    recallService.recall_click(token)
     id = recall.get("id")
     user_name = recall.get("user_name", "尊敬的用户") if recall else "尊敬的用户"
     product = recall.get("product")
@@ -170,17 +260,63 @@ async def get_coupon(request: Request) -> Dict:
     user_name = body.get("username", None)
     if not token:
         return {"status_code": "500", "message": "token不能为空"}
-    recall = recallService.get_recall(token)
-    if recall is None:
-        return {"status_code": "500", "message": "无效的优惠券链接"}
-    click = recall.get("click", 0)
-    if click != 1:
-        return {"status_code": "500", "message": "请先打开优惠券链接！"}
-    recall_user_name = recall.get("user_name")
-    if user_name != recall_user_name:
-        return {"status_code": "500", "message": "这不是你的优惠券！"}
-    #召回触达标记用户已领取优惠
-    recallService.recall_claim(token)
+    #校验并标记用户已领取优惠（一条条件 UPDATE 完成，并发重复提交只会成功一次）
+    result = await recallService.claim_coupon_async(token, user_name)
+    if result != CLAIM_SUCCESS:
+        return {"status_code": "500", "message": CLAIM_FAILURE_MESSAGES.get(result, "无效的优惠券链接")}
     return {"status_code": "200", "message": "优惠券领取成功！请前往游戏内商城使用。"}
     
-    
\ No newline at end of file
+    
+
+# === 6. 运行指标 ===
+@app.get("/metrics")
+async def metrics(merchant: Dict = Depends(current_merchant)) -> Dict:
+    return {
+        "recall_cache": recallService.cache_stats(),
+        "recall_tokens": recallService.token_stats(),
+        "sessions": sessionService.stats(),
+        "merchant_cache": merchantService.cache_stats(),
+        "click_buffer": recallService.click_buffer_stats(),
+        "delivery": recallService.delivery_stats(),
+        "frequency_cap": recallService.frequency_cap_stats(),
+        "query_shapes": QueryBuilder.shape_cache_info(),
+        "db_pool": pool_stats()
+    }
+
+# === 7. 数据导出：按商家和日期流式导出订单、召回记录（format=csv/ndjson，gzip=true 时压缩） ===
+# 只能导出当前登录商家的数据
+@app.get("/orders/export")
+async def export_orders(request: Request, merchant: Dict = Depends(current_merchant)):
+    params = request.query_params
+    user_ids = params.get("user_ids")
+    try:
+        chunks, media_type, filename = exportService.export_orders(
+            merchant["id"],
+            params.get("start_date"),
+            params.get("end_date"),
+            fmt=params.get("format", "csv"),
+            compress=params.get("gzip") == "true",
+            user_ids=user_ids.split(",") if user_ids else None
+        )
+    except ValueError as e:
+        return {"status_code": "500", "message": str(e)}
+    return StreamingResponse(chunks, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/recalls/export")
+async def export_recalls(request: Request, merchant: Dict = Depends(current_merchant)):
+    params = request.query_params
+    try:
+        flags = {flag: int(params[flag]) for flag in ("click", "claim", "writeoff") if params.get(flag)}
+        chunks, media_type, filename = exportService.export_recalls(
+            merchant["id"],
+            params.get("start_date"),
+            params.get("end_date"),
+            fmt=params.get("format", "csv"),
+            compress=params.get("gzip") == "true",
+            flags=flags
+        )
+    except ValueError as e:
+        return {"status_code": "500", "message": str(e)}
+    return StreamingResponse(chunks, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
@@ -0,0 +1,118 @@
+from typing import Dict, Optional
+from datetime import datetime
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# 点击事件最长缓冲时间（毫秒）和最大缓冲条数，任一条件满足即落库
+CLICK_FLUSH_INTERVAL_MS = int(os.getenv("CLICK_FLUSH_INTERVAL_MS", "500"))
+CLICK_FLUSH_MAX_EVENTS = int(os.getenv("CLICK_FLUSH_MAX_EVENTS", "500"))
+
+class ClickBuffer:
+    """
+    落地页点击事件写缓冲
+
+    同一 token 的重复点击在内存中合并，每隔 flush_interval_ms 毫秒或累计 max_events 个 token
+    时用一条 UPDATE ... WHERE token IN (...) AND click = 0 批量落库。
+    同一批次的点击时间取批次内最早的点击时间，精度为一个缓冲周期。
+    """
+
+    def __init__(self, recall_dao,
+                 flush_interval_ms: int = CLICK_FLUSH_INTERVAL_MS,
+                 max_events: int = CLICK_FLUSH_MAX_EVENTS) -> None:
+        self.recall_dao = recall_dao
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_events = max_events
+        self._pending: Dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.flushed_batches = 0
+        self.flushed_tokens = 0
+        self.coalesced = 0
+
+    def add(self, token: str, click_time: Optional[datetime] = None) -> bool:
+        """记录一次点击，token 已在缓冲中时合并，返回是否为新增"""
+        if token in self._pending:
+            self.coalesced += 1
+            return False
+        self._pending[token] = click_time or datetime.now()
+        if len(self._pending) >= self.max_events and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def pending_click_time(self, token: str) -> Optional[datetime]:
+        """缓冲中尚未落库的点击时间，不在缓冲中时返回 None"""
+        return self._pending.get(token)
+
+    async def start(self) -> None:
+        """启动后台定时落库任务"""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台任务，并把缓冲中的点击全部落库"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> int:
+        """立即把缓冲中的点击落库，返回实际更新的行数"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+            tokens = list(pending.keys())
+            affected_rows = 0
+            try:
+                for start in range(0, len(tokens), self.max_events):
+                    batch = tokens[start:start + self.max_events]
+                    click_time = min(pending[token] for token in batch)
+                    affected_rows += await self.recall_dao.mark_recalls_clicked_batch_async(batch, click_time)
+                    self.flushed_batches += 1
+                    self.flushed_tokens += len(batch)
+                    # 已落库的 token 不再重试
+                    for token in batch:
+                        pending.pop(token)
+            except Exception as e:
+                # 落库失败的点击放回缓冲区，下个周期重试
+                logger.error(f"点击事件落库失败，{len(pending)} 条待重试: {str(e)}")
+                for token, click_time in pending.items():
+                    self._pending.setdefault(token, click_time)
+                raise
+            return affected_rows
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # 错误已记录，继续下一个周期
+                pass
+
+    def stats(self) -> Dict:
+        return {
+            "pending": len(self._pending),
+            "flushed_batches": self.flushed_batches,
+            "flushed_tokens": self.flushed_tokens,
+            "coalesced": self.coalesced,
+            "flush_interval_ms": int(self.flush_interval * 1000),
+            "max_events": self.max_events
+        }
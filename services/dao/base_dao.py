@@ -1,61 +1,304 @@
-from typing import Dict, List, Any
-from db.connection import get_db_connection
+from typing import Dict, List, Any, Optional, Tuple, Iterator, AsyncIterator, Union
+from contextlib import contextmanager, asynccontextmanager
+from datetime import datetime
+from db.connection import get_db_connection, acquire_async_connection
+from db.unit_of_work import (
+    unit_of_work, unit_of_work_async, current_unit_of_work, current_unit_of_work_async
+)
+from services.dao.query_builder import QueryBuilder
 import logging
+import aiomysql
 import pymysql
 
 logger = logging.getLogger(__name__)
 
+# 流式查询每次从服务端读取的行数（逐行迭代时）
+STREAM_FETCH_SIZE = 1000
+
 class BaseDAO:
-    """基础数据访问对象"""
+    """
+    基础数据访问对象
+
+    在工作单元（db.unit_of_work）作用域内执行时复用作用域的连接，处于工作单元的事务中时不再单独提交，
+    由作用域退出时统一提交或回滚；不在作用域内时每次调用从连接池取出连接，用完归还。
+    """
     
     def __init__(self, table_name: str):
         self.table_name = table_name
     
+    @staticmethod
+    def _with_create_time(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        为未指定 create_time 的行填入同一个写入时间（精确到秒），已指定的行保持不变
+
+        汇总表的日期按行中的 create_time 计算，与明细表保存的值一致：不依赖数据库的 DEFAULT CURRENT_TIMESTAMP
+        （数据库时区可能与应用不同），也避免 DATETIME 列对毫秒四舍五入后跨天。
+        """
+        now = datetime.now().replace(microsecond=0)
+        return [row if row.get("create_time") else {**row, "create_time": now} for row in rows]
+
     def _get_connection(self):
         """获取数据库连接"""
         return get_db_connection()
     
-    def execute_query(self, sql: str, params: tuple = None) -> List[Dict[str, Any]]:
-        """执行查询语句"""
+    @contextmanager
+    def _connection(self):
+        """获取连接：工作单元内复用其连接，否则从连接池取出并在结束时归还"""
+        uow = current_unit_of_work()
+        if uow is not None:
+            yield uow.conn
+            return
         conn = self._get_connection()
         try:
-            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                cursor.execute(sql, params or ())
-                return cursor.fetchall()
-        except Exception as e:
-            logger.error(f"查询执行失败: {str(e)}")
-            raise
+            yield conn
         finally:
             conn.close()
     
+    @contextmanager
+    def _transaction(self):
+        """在事务中执行多条语句，已处于工作单元的事务中时直接加入"""
+        with unit_of_work(transaction=True) as uow:
+            yield uow.conn
+    
+    @staticmethod
+    def _commit(conn) -> None:
+        uow = current_unit_of_work()
+        if uow is None or not uow.transaction:
+            conn.commit()
+    
+    @staticmethod
+    def _rollback(conn) -> None:
+        uow = current_unit_of_work()
+        if uow is not None and uow.transaction:
+            uow.mark_rollback_only()
+        else:
+            conn.rollback()
+    
+    def execute_query(self, sql: str, params: tuple = None) -> List[Dict[str, Any]]:
+        """执行查询语句"""
+        with self._connection() as conn:
+            try:
+                with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                    cursor.execute(sql, params or ())
+                    return cursor.fetchall()
+            except Exception as e:
+                logger.error(f"查询执行失败: {str(e)}")
+                raise
+    
     def execute_update(self, sql: str, params: tuple = None) -> int:
         """执行更新/插入/删除语句"""
+        with self._connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(sql, params or ())
+                    affected_rows = cursor.rowcount
+                self._commit(conn)
+                return affected_rows
+            except Exception as e:
+                self._rollback(conn)
+                logger.error(f"更新执行失败: {str(e)}")
+                raise
+    
+    def execute_many(self, sql: str, params_list: List[tuple]) -> int:
+        """批量执行语句"""
+        with self._connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.executemany(sql, params_list)
+                    affected_rows = cursor.rowcount
+                self._commit(conn)
+                return affected_rows
+            except Exception as e:
+                self._rollback(conn)
+                logger.error(f"批量执行失败: {str(e)}")
+                raise
+    
+    def stream_query(self,
+                     sql: str,
+                     params: tuple = None,
+                     batch_size: Optional[int] = None) -> Iterator[Union[Dict[str, Any], List[Dict[str, Any]]]]:
+        """
+        流式查询：服务端游标（SSDictCursor）边读边返回，内存占用只与批大小有关，与结果集大小无关
+
+        batch_size 为空时逐行返回，否则每次返回最多 batch_size 行的列表。
+        流式读取期间连接不能执行其他语句，因此始终使用独立连接，不加入工作单元；
+        提前结束迭代时服务端剩余的行会在关闭游标时读完丢弃，大结果集应在 SQL 中限定范围。
+        """
+        fetch_size = batch_size or STREAM_FETCH_SIZE
         conn = self._get_connection()
         try:
-            with conn.cursor() as cursor:
+            with conn.cursor(pymysql.cursors.SSDictCursor) as cursor:
                 cursor.execute(sql, params or ())
-                affected_rows = cursor.rowcount
-                conn.commit()
-                return affected_rows
+                while True:
+                    rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    if batch_size:
+                        yield rows
+                    else:
+                        yield from rows
         except Exception as e:
-            conn.rollback()
-            logger.error(f"更新执行失败: {str(e)}")
+            logger.error(f"流式查询失败: {str(e)}")
             raise
         finally:
             conn.close()
     
-    def execute_many(self, sql: str, params_list: List[tuple]) -> int:
-        """批量执行语句"""
-        conn = self._get_connection()
+    def _query_keyset(self,
+                      conditions: Optional[Dict[str, Any]] = None,
+                      fields: Optional[List[str]] = None,
+                      order_column: str = "id",
+                      descending: bool = True,
+                      cursor: Optional[str] = None,
+                      page_size: int = 20,
+                      total: Optional[str] = None) -> Dict:
+        """
+        游标分页查询，total 为 "exact" 时精确计数，为 "estimate" 时读取执行计划估算，为空时不计数
+        """
+        sql, params = QueryBuilder.build_keyset_query(
+            self.table_name,
+            fields=fields,
+            conditions=conditions,
+            order_column=order_column,
+            descending=descending,
+            cursor=cursor,
+            page_size=page_size
+        )
+        rows, next_cursor = QueryBuilder.build_next_cursor(
+            self.execute_query(sql, tuple(params)), page_size, order_column, descending
+        )
+        pagination = {
+            "page_size": page_size,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
+        }
+        
+        if total == "exact":
+            count_sql, count_params = QueryBuilder.build_count_query(self.table_name, conditions)
+            result = self.execute_query(count_sql, tuple(count_params))
+            pagination["total"] = result[0]["total"] if result else 0
+        elif total == "estimate":
+            explain_sql, explain_params = QueryBuilder.build_explain_query(self.table_name, conditions)
+            plan = self.execute_query(explain_sql, tuple(explain_params))
+            pagination["total"] = plan[0].get("rows") if plan else None
+            pagination["total_estimated"] = True
+        return {"data": rows, "pagination": pagination}
+    
+    def execute_in_transaction(self, queries: List[Tuple[str, Any]]) -> int:
+        """在同一事务中依次执行多条语句，返回影响行数之和"""
         try:
-            with conn.cursor() as cursor:
-                cursor.executemany(sql, params_list)
-                affected_rows = cursor.rowcount
-                conn.commit()
+            with self._transaction() as conn:
+                affected_rows = 0
+                with conn.cursor() as cursor:
+                    for sql, params in queries:
+                        cursor.execute(sql, tuple(params or ()))
+                        affected_rows += cursor.rowcount
                 return affected_rows
         except Exception as e:
-            conn.rollback()
-            logger.error(f"批量执行失败: {str(e)}")
+            logger.error(f"事务执行失败: {str(e)}")
             raise
-        finally:
-            conn.close()
\ No newline at end of file
+    
+    @asynccontextmanager
+    async def _connection_async(self):
+        """获取异步连接：工作单元内复用其连接，否则从连接池取出并在结束时归还"""
+        uow = current_unit_of_work_async()
+        if uow is not None:
+            yield uow.conn
+            return
+        async with acquire_async_connection() as conn:
+            yield conn
+    
+    @asynccontextmanager
+    async def _transaction_async(self):
+        """在事务中执行多条语句（异步），已处于工作单元的事务中时直接加入"""
+        async with unit_of_work_async(transaction=True) as uow:
+            yield uow.conn
+    
+    @staticmethod
+    async def _commit_async(conn) -> None:
+        uow = current_unit_of_work_async()
+        if uow is None or not uow.transaction:
+            await conn.commit()
+    
+    @staticmethod
+    async def _rollback_async(conn) -> None:
+        uow = current_unit_of_work_async()
+        if uow is not None and uow.transaction:
+            uow.mark_rollback_only()
+        else:
+            await conn.rollback()
+    
+    async def execute_query_async(self, sql: str, params: tuple = None) -> List[Dict[str, Any]]:
+        """异步执行查询语句"""
+        async with self._connection_async() as conn:
+            try:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute(sql, params or ())
+                    return await cursor.fetchall()
+            except Exception as e:
+                logger.error(f"查询执行失败: {str(e)}")
+                raise
+    
+    async def stream_query_async(self,
+                                 sql: str,
+                                 params: tuple = None,
+                                 batch_size: Optional[int] = None) -> AsyncIterator[Union[Dict[str, Any], List[Dict[str, Any]]]]:
+        """流式查询（异步），参数和返回同 stream_query"""
+        fetch_size = batch_size or STREAM_FETCH_SIZE
+        async with acquire_async_connection() as conn:
+            try:
+                async with conn.cursor(aiomysql.SSDictCursor) as cursor:
+                    await cursor.execute(sql, params or ())
+                    while True:
+                        rows = await cursor.fetchmany(fetch_size)
+                        if not rows:
+                            break
+                        if batch_size:
+                            yield rows
+                        else:
+                            for row in rows:
+                                yield row
+            except Exception as e:
+                logger.error(f"流式查询失败: {str(e)}")
+                raise
+    
+    async def execute_update_async(self, sql: str, params: tuple = None) -> int:
+        """异步执行更新/插入/删除语句"""
+        async with self._connection_async() as conn:
+            try:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(sql, params or ())
+                    affected_rows = cursor.rowcount
+                await self._commit_async(conn)
+                return affected_rows
+            except Exception as e:
+                await self._rollback_async(conn)
+                logger.error(f"更新执行失败: {str(e)}")
+                raise
+    
+    async def execute_in_transaction_async(self, queries: List[Tuple[str, Any]]) -> int:
+        """在同一事务中依次执行多条语句（异步），返回影响行数之和"""
+        try:
+            async with self._transaction_async() as conn:
+                affected_rows = 0
+                async with conn.cursor() as cursor:
+                    for sql, params in queries:
+                        await cursor.execute(sql, tuple(params or ()))
+                        affected_rows += cursor.rowcount
+                return affected_rows
+        except Exception as e:
+            logger.error(f"事务执行失败: {str(e)}")
+            raise
+    
+    async def execute_many_async(self, sql: str, params_list: List[tuple]) -> int:
+        """异步批量执行语句"""
+        async with self._connection_async() as conn:
+            try:
+                async with conn.cursor() as cursor:
+                    await cursor.executemany(sql, params_list)
+                    affected_rows = cursor.rowcount
+                await self._commit_async(conn)
+                return affected_rows
+            except Exception as e:
+                await self._rollback_async(conn)
+                logger.error(f"批量执行失败: {str(e)}")
+                raise
@@ -0,0 +1,60 @@
+from typing import Tuple
+from services.dao.base_dao import BaseDAO
+from db.connection import acquire_async_connection
+import logging
+
+logger = logging.getLogger(__name__)
+
+class IdSequenceDAO(BaseDAO):
+    """
+    主键号段分配
+
+    需要在写入前就知道主键的场景（如召回令牌中包含召回ID）先从 t_id_sequence 一次取一段连续的主键，
+    再带主键批量写入。号段更新使用独立连接并立即提交，不加入调用方的事务，行锁只持有一条语句的时间；
+    调用方事务回滚时已分配的主键直接作废，只会留下空洞。
+    使用号段的表的所有写入都必须经过号段分配，否则自增主键可能与号段冲突。
+    """
+
+    def __init__(self):
+        super().__init__("t_id_sequence")
+
+    def _build_allocate_queries(self, name: str, count: int) -> Tuple[str, tuple, str]:
+        if count <= 0:
+            raise ValueError("分配数量必须大于0")
+        # LAST_INSERT_ID(expr) 把新值记在当前连接上，随后读取即可得到本次分配的号段终点
+        update_sql = f"UPDATE {self.table_name} SET next_id = LAST_INSERT_ID(next_id + %s) WHERE name = %s"
+        return update_sql, (count, name), "SELECT LAST_INSERT_ID() AS end_id"
+
+    def allocate(self, name: str, count: int) -> int:
+        """分配 count 个连续主键，返回第一个"""
+        update_sql, params, select_sql = self._build_allocate_queries(name, count)
+        conn = self._get_connection()
+        try:
+            with conn.cursor() as cursor:
+                if cursor.execute(update_sql, params) != 1:
+                    raise ValueError(f"号段未初始化: {name}")
+                cursor.execute(select_sql)
+                end_id = cursor.fetchone()["end_id"]
+            conn.commit()
+            return end_id - count
+        except Exception as e:
+            logger.error(f"分配主键号段失败: {str(e)}")
+            raise
+        finally:
+            conn.close()
+
+    async def allocate_async(self, name: str, count: int) -> int:
+        """分配 count 个连续主键（异步），返回第一个"""
+        update_sql, params, select_sql = self._build_allocate_queries(name, count)
+        try:
+            async with acquire_async_connection() as conn:
+                async with conn.cursor() as cursor:
+                    if await cursor.execute(update_sql, params) != 1:
+                        raise ValueError(f"号段未初始化: {name}")
+                    await cursor.execute(select_sql)
+                    end_id = (await cursor.fetchone())["end_id"]
+                await conn.commit()
+                return end_id - count
+        except Exception as e:
+            logger.error(f"分配主键号段失败: {str(e)}")
+            raise
@@ -2,9 +2,13 @@ from typing import Dict, List, Optional, Any
 from services.dao.base_dao import BaseDAO
 from services.dao.query_builder import QueryBuilder
 import logging
+import pymysql
 
 logger = logging.getLogger(__name__)
 
+# 按ID批量查询商家时每条 IN 查询的最大ID数
+MERCHANT_IDS_BATCH = 1000
+
 class MerchantDAO(BaseDAO):
     """商家数据访问对象"""
     
@@ -52,26 +56,103 @@ class MerchantDAO(BaseDAO):
             logger.error(f"获取商家失败: {str(e)}")
             return None
     
-    def update_merchant(self, merchant_id: int, update_data: Dict[str, Any]) -> int:
-        """更新商家信息"""
+    async def get_merchant_by_id_async(self, merchant_id: int) -> Optional[Dict]:
+        """根据ID获取商家（异步）"""
         conditions = {"id": merchant_id}
+        sql, params = QueryBuilder.build_select_query(
+            self.table_name,
+            conditions=conditions
+        )
         
-        # 移除不能更新的字段
-        update_data.pop('id', None)
-        update_data.pop('create_time', None)
-        
-        sql, params = QueryBuilder.build_update_query(
+        try:
+            results = await self.execute_query_async(sql, tuple(params))
+            return results[0] if results else None
+        except Exception as e:
+            logger.error(f"获取商家失败: {str(e)}")
+            return None
+    
+    async def get_merchant_by_username_async(self, username: str) -> Optional[Dict]:
+        """根据用户名获取商家（异步）"""
+        conditions = {"username": username}
+        sql, params = QueryBuilder.build_select_query(
             self.table_name,
-            update_data,
-            conditions
+            conditions=conditions
         )
         
+        try:
+            results = await self.execute_query_async(sql, tuple(params))
+            return results[0] if results else None
+        except Exception as e:
+            logger.error(f"获取商家失败: {str(e)}")
+            return None
+    
+    def _build_ids_queries(self, merchant_ids: List[int]) -> List[tuple]:
+        queries = []
+        for start in range(0, len(merchant_ids), MERCHANT_IDS_BATCH):
+            sql, params = QueryBuilder.build_select_query(
+                self.table_name,
+                conditions={"id": {"$in": merchant_ids[start:start + MERCHANT_IDS_BATCH]}}
+            )
+            queries.append((sql, tuple(params)))
+        return queries
+    
+    def get_merchants_by_ids(self, merchant_ids: List[int]) -> List[Dict]:
+        """按ID批量获取商家（一条 IN 查询，超过 MERCHANT_IDS_BATCH 个时分批）"""
+        if not merchant_ids:
+            return []
+        try:
+            results = []
+            for sql, params in self._build_ids_queries(merchant_ids):
+                results.extend(self.execute_query(sql, params))
+            return results
+        except Exception as e:
+            logger.error(f"批量获取商家失败: {str(e)}")
+            return []
+    
+    async def get_merchants_by_ids_async(self, merchant_ids: List[int]) -> List[Dict]:
+        """按ID批量获取商家（异步）"""
+        if not merchant_ids:
+            return []
+        try:
+            results = []
+            for sql, params in self._build_ids_queries(merchant_ids):
+                results.extend(await self.execute_query_async(sql, params))
+            return results
+        except Exception as e:
+            logger.error(f"批量获取商家失败: {str(e)}")
+            return []
+    
+    def update_merchant(self, merchant_id: int, update_data: Dict[str, Any]) -> int:
+        """更新商家信息"""
+        sql, params = self._build_update(merchant_id, update_data)
+        
         try:
             return self.execute_update(sql, tuple(params))
         except Exception as e:
             logger.error(f"更新商家失败: {str(e)}")
             raise
     
+    async def update_merchant_async(self, merchant_id: int, update_data: Dict[str, Any]) -> int:
+        """更新商家信息（异步）"""
+        sql, params = self._build_update(merchant_id, update_data)
+        
+        try:
+            return await self.execute_update_async(sql, tuple(params))
+        except Exception as e:
+            logger.error(f"更新商家失败: {str(e)}")
+            raise
+    
+    def _build_update(self, merchant_id: int, update_data: Dict[str, Any]) -> tuple:
+        # 移除不能更新的字段
+        update_data.pop('id', None)
+        update_data.pop('create_time', None)
+        
+        return QueryBuilder.build_update_query(
+            self.table_name,
+            update_data,
+            {"id": merchant_id}
+        )
+    
     def query_merchants(self, 
                        conditions: Optional[Dict[str, Any]] = None,
                        fields: Optional[List[str]] = None,
@@ -110,9 +191,8 @@ class MerchantDAO(BaseDAO):
             page_size=page_size
         )
         
-        conn = self._get_connection()
         try:
-            with conn.cursor(dictionary=True) as cursor:
+            with self._connection() as conn, conn.cursor(pymysql.cursors.DictCursor) as cursor:
                 # 查询数据
                 cursor.execute(data_sql, tuple(data_params))
                 data = cursor.fetchall()
@@ -134,8 +214,6 @@ class MerchantDAO(BaseDAO):
         except Exception as e:
             logger.error(f"分页查询商家失败: {str(e)}")
             return {"data": [], "pagination": {}}
-        finally:
-            conn.close()
     
     def get_merchant_stats(self, merchant_id: Optional[int] = None) -> Dict:
         """获取商家统计信息"""
@@ -0,0 +1,252 @@
+from typing import Dict, List, Optional, Any, Tuple
+from datetime import date, timedelta
+from decimal import Decimal
+from services.dao.base_dao import BaseDAO
+from services.dao.query_builder import QueryBuilder
+import logging
+
+logger = logging.getLogger(__name__)
+
+class OrderDailyDAO(BaseDAO):
+    """
+    商家每日销售汇总数据访问对象
+
+    t_order_daily 按 (merchant_id, order_date) 保存订单数、下单用户数、金额等，写入订单时在同一事务中增量更新；
+    下单用户数借助 t_order_daily_user（每天每个用户一行）去重，INSERT IGNORE 的影响行数即当天新增的用户数。
+    每日/区间统计直接读汇总表，不再扫描订单明细。
+    """
+
+    def __init__(self):
+        super().__init__("t_order_daily")
+        self.users_table = "t_order_daily_user"
+
+    def apply_orders(self, cursor, orders_data: List[Dict[str, Any]]) -> None:
+        """在调用方的事务中把新增订单累加到每日汇总"""
+        if not orders_data:
+            return
+        groups = self._group_orders(orders_data)
+        for key in sorted(groups, key=self._group_sort_key):
+            sql, params_list = self._build_users_query(key, groups[key]["users"])
+            cursor.executemany(sql, params_list)
+            groups[key]["user_count"] = cursor.rowcount
+        sql, params = self._build_increment_query(groups)
+        cursor.execute(sql, tuple(params))
+
+    async def apply_orders_async(self, cursor, orders_data: List[Dict[str, Any]]) -> None:
+        """在调用方的事务中把新增订单累加到每日汇总（异步）"""
+        if not orders_data:
+            return
+        groups = self._group_orders(orders_data)
+        for key in sorted(groups, key=self._group_sort_key):
+            sql, params_list = self._build_users_query(key, groups[key]["users"])
+            await cursor.executemany(sql, params_list)
+            groups[key]["user_count"] = cursor.rowcount
+        sql, params = self._build_increment_query(groups)
+        await cursor.execute(sql, tuple(params))
+
+    @staticmethod
+    def order_date(order: Dict[str, Any]) -> str:
+        """订单所属日期，由写入 t_order 的 create_time 得出（写入前由 BaseDAO._with_create_time 填充）"""
+        return str(order["create_time"])[:10]
+
+    @staticmethod
+    def _group_sort_key(key: Tuple[Any, str]) -> Tuple[str, str]:
+        # 并发写入时按相同顺序加锁，避免死锁
+        return str(key[0]), key[1]
+
+    def _group_orders(self, orders_data: List[Dict[str, Any]]) -> Dict[Tuple[Any, str], Dict[str, Any]]:
+        """按 (商家, 日期) 合并订单"""
+        groups: Dict[Tuple[Any, str], Dict[str, Any]] = {}
+        for order in orders_data:
+            order_time = order["create_time"]
+            amount = Decimal(str(order.get("amount") or 0))
+            key = (order.get("merchant_id"), self.order_date(order))
+            group = groups.get(key)
+            if group is None:
+                groups[key] = {
+                    "users": {order.get("user_id", "")},
+                    "order_count": 1,
+                    "total_amount": amount,
+                    "min_amount": amount,
+                    "max_amount": amount,
+                    "first_order_time": order_time,
+                    "last_order_time": order_time
+                }
+                continue
+            group["users"].add(order.get("user_id", ""))
+            group["order_count"] += 1
+            group["total_amount"] += amount
+            group["min_amount"] = min(group["min_amount"], amount)
+            group["max_amount"] = max(group["max_amount"], amount)
+            if str(order_time) < str(group["first_order_time"]):
+                group["first_order_time"] = order_time
+            if str(order_time) > str(group["last_order_time"]):
+                group["last_order_time"] = order_time
+        return groups
+
+    def _build_users_query(self, key: Tuple[Any, str], users: set) -> Tuple[str, List[tuple]]:
+        """当天已记录的用户被忽略，影响行数即新增的下单用户数"""
+        merchant_id, order_date = key
+        rows = [{"merchant_id": merchant_id, "order_date": order_date, "user_id": user_id}
+                for user_id in sorted(users, key=str)]
+        return QueryBuilder.build_upsert_query(self.users_table, rows, ignore=True)
+
+    def _build_increment_query(self, groups: Dict[Tuple[Any, str], Dict[str, Any]]) -> Tuple[str, List[Any]]:
+        columns = ["merchant_id", "order_date", "order_count", "user_count", "total_amount",
+                   "min_amount", "max_amount", "first_order_time", "last_order_time"]
+        params: List[Any] = []
+        for key in sorted(groups, key=self._group_sort_key):
+            group = groups[key]
+            params.extend([key[0], key[1]] + [group[column] for column in columns[2:]])
+        placeholders = ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(groups))
+
+        sql = f"""
+        INSERT INTO {self.table_name} ({', '.join(columns)})
+        VALUES {placeholders}
+        ON DUPLICATE KEY UPDATE
+            order_count = order_count + VALUES(order_count),
+            user_count = user_count + VALUES(user_count),
+            total_amount = total_amount + VALUES(total_amount),
+            min_amount = LEAST(min_amount, VALUES(min_amount)),
+            max_amount = GREATEST(max_amount, VALUES(max_amount)),
+            first_order_time = LEAST(first_order_time, VALUES(first_order_time)),
+            last_order_time = GREATEST(last_order_time, VALUES(last_order_time))
+        """
+        return sql, params
+
+    def build_refresh_queries(self, order_date: str, merchant_id: Optional[int] = None) -> List[Tuple[str, List[Any]]]:
+        """
+        构建按 t_order 重算某一天汇总的语句（幂等写入修改了已有订单、回填历史数据时使用）
+
+        merchant_id 为空时重算所有商家；订单按 create_time 范围过滤，可以使用 idx_merchant_time。
+        """
+        merchant_clause = "AND merchant_id = %s" if merchant_id is not None else ""
+        merchant_params = [merchant_id] if merchant_id is not None else []
+        day_start = str(order_date)[:10]
+        range_params = [day_start, day_start] + merchant_params
+
+        return [
+            (f"DELETE FROM {self.users_table} WHERE order_date = %s {merchant_clause}",
+             [day_start] + merchant_params),
+            (f"""
+            INSERT INTO {self.users_table} (merchant_id, order_date, user_id)
+            SELECT DISTINCT merchant_id, %s, user_id
+            FROM t_order
+            WHERE create_time >= %s AND create_time < %s + INTERVAL 1 DAY {merchant_clause}
+            """, [day_start] + range_params),
+            (f"DELETE FROM {self.table_name} WHERE order_date = %s {merchant_clause}",
+             [day_start] + merchant_params),
+            (f"""
+            INSERT INTO {self.table_name} (merchant_id, order_date, order_count, user_count, total_amount,
+                                           min_amount, max_amount, first_order_time, last_order_time)
+            SELECT merchant_id, %s, COUNT(*), COUNT(DISTINCT user_id), SUM(amount),
+                   MIN(amount), MAX(amount), MIN(create_time), MAX(create_time)
+            FROM t_order
+            WHERE create_time >= %s AND create_time < %s + INTERVAL 1 DAY {merchant_clause}
+            GROUP BY merchant_id
+            """, [day_start] + range_params)
+        ]
+
+    def rebuild_days(self, start_date: str, end_date: str, merchant_id: Optional[int] = None) -> int:
+        """按 t_order 逐天重建每日汇总，每天一个事务，返回处理的天数"""
+        day = date.fromisoformat(str(start_date)[:10])
+        last_day = date.fromisoformat(str(end_date)[:10])
+        days = 0
+        while day <= last_day:
+            try:
+                self.execute_in_transaction(self.build_refresh_queries(day.isoformat(), merchant_id))
+            except Exception as e:
+                logger.error(f"重建每日销售汇总失败({day}): {str(e)}")
+                raise
+            day += timedelta(days=1)
+            days += 1
+        return days
+
+    def get_daily_sales(self,
+                       merchant_id: int,
+                       start_date: str,
+                       end_date: str) -> List[Dict]:
+        """获取每日销售数据（读每日汇总，每天一行）"""
+        sql, params = QueryBuilder.build_select_query(
+            self.table_name,
+            fields=[
+                "order_date",
+                "order_count",
+                "user_count",
+                "total_amount",
+                "total_amount / order_count as avg_amount"
+            ],
+            conditions={
+                "merchant_id": merchant_id,
+                "order_date": {"$between": [str(start_date)[:10], str(end_date)[:10]]}
+            },
+            order_by=["order_date"]
+        )
+
+        try:
+            return self.execute_query(sql, tuple(params))
+        except Exception as e:
+            logger.error(f"获取每日销售数据失败: {str(e)}")
+            return []
+
+    def get_sales_stats(self,
+                       merchant_id: int,
+                       start_date: Optional[str] = None,
+                       end_date: Optional[str] = None) -> Dict:
+        """
+        获取销售统计（读每日汇总，按天粒度过滤，起止日期均包含）
+
+        区间内的去重用户数读 t_order_daily_user，未指定日期时读用户汇总表 t_user_summary。
+        """
+        conditions: Dict[str, Any] = {"merchant_id": merchant_id}
+        date_condition = self._date_condition(start_date, end_date)
+        if date_condition:
+            conditions["order_date"] = date_condition
+
+        sql, params = QueryBuilder.build_select_query(
+            self.table_name,
+            fields=[
+                "SUM(order_count) as order_count",
+                "SUM(total_amount) as total_amount",
+                "SUM(total_amount) / SUM(order_count) as avg_amount",
+                "MIN(min_amount) as min_amount",
+                "MAX(max_amount) as max_amount",
+                "MIN(first_order_time) as first_order_time",
+                "MAX(last_order_time) as last_order_time"
+            ],
+            conditions=conditions
+        )
+        if date_condition:
+            user_sql, user_params = QueryBuilder.build_select_query(
+                self.users_table,
+                fields=["COUNT(DISTINCT user_id) as user_count"],
+                conditions=conditions
+            )
+        else:
+            user_sql, user_params = QueryBuilder.build_select_query(
+                "t_user_summary",
+                fields=["COUNT(*) as user_count"],
+                conditions={"merchant_id": merchant_id}
+            )
+
+        try:
+            results = self.execute_query(sql, tuple(params))
+            stats = results[0] if results else {}
+            if not stats or not stats.get("order_count"):
+                return {}
+            users = self.execute_query(user_sql, tuple(user_params))
+            stats["user_count"] = users[0]["user_count"] if users else 0
+            return stats
+        except Exception as e:
+            logger.error(f"获取销售统计失败: {str(e)}")
+            return {}
+
+    @staticmethod
+    def _date_condition(start_date: Optional[str], end_date: Optional[str]) -> Optional[Dict[str, Any]]:
+        if start_date and end_date:
+            return {"$between": [str(start_date)[:10], str(end_date)[:10]]}
+        if start_date:
+            return {"$gte": str(start_date)[:10]}
+        if end_date:
+            return {"$lte": str(end_date)[:10]}
+        return None
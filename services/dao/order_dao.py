@@ -1,24 +1,41 @@
-from typing import Dict, List, Optional, Any, Tuple
-from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Tuple, Iterator, AsyncIterator
 from services.dao.base_dao import BaseDAO
 from services.dao.query_builder import QueryBuilder
+from services.dao.user_summary_dao import UserSummaryDAO
+from services.dao.order_daily_dao import OrderDailyDAO
 import logging
+import pymysql
 
 logger = logging.getLogger(__name__)
 
+# t_order 可写字段，用于校验调用方传入的字段名
+ORDER_COLUMNS = (
+    "order_id", "merchant_id", "industry", "user_id", "name", "product",
+    "product_type", "contact", "contact_type", "amount", "create_time"
+)
+# 唯一键 uk_merchant_order_id
+ORDER_UNIQUE_KEY = ("merchant_id", "order_id")
+# 修改后需要重算用户汇总和每日汇总的字段
+ORDER_SUMMARY_COLUMNS = ("merchant_id", "user_id", "amount", "product_type")
+# 预查询已存在订单时每条 IN 语句的订单号数量
+EXISTING_KEYS_BATCH = 1000
+
 class OrderDAO(BaseDAO):
     """订单数据访问对象"""
     
     def __init__(self):
         super().__init__("t_order")
+        self.user_summary_dao = UserSummaryDAO()
+        self.order_daily_dao = OrderDailyDAO()
     
     def create_order(self, order_data: Dict[str, Any]) -> int:
-        """创建订单"""
+        """创建订单，同一事务中累加用户汇总和每日汇总"""
+        order_data = self._with_create_time([order_data])[0]
         sql, params = QueryBuilder.build_insert_query(self.table_name, order_data)
+        summary_queries = [self.user_summary_dao.build_increment_query([order_data])]
         
         try:
-            affected_rows = self.execute_update(sql, tuple(params))
-            return affected_rows
+            return self._write_with_summary(sql, tuple(params), summary_queries, [order_data])
         except Exception as e:
             logger.error(f"创建订单失败: {str(e)}")
             raise
@@ -27,16 +44,311 @@ class OrderDAO(BaseDAO):
         """批量创建订单"""
         if not orders_data:
             return 0
+        orders_data = self._with_create_time(orders_data)
         
         sql, params = QueryBuilder.build_batch_insert_query(self.table_name, orders_data)
+        summary_queries = [self.user_summary_dao.build_increment_query(orders_data)]
         
         try:
-            affected_rows = self.execute_update(sql, tuple(params))
-            return affected_rows
+            return self._write_with_summary(sql, tuple(params), summary_queries, orders_data)
         except Exception as e:
             logger.error(f"批量创建订单失败: {str(e)}")
             raise
     
+    async def batch_create_orders_async(self, orders_data: List[Dict[str, Any]]) -> int:
+        """批量创建订单（异步）"""
+        if not orders_data:
+            return 0
+        orders_data = self._with_create_time(orders_data)
+        
+        sql, params = QueryBuilder.build_batch_insert_query(self.table_name, orders_data)
+        summary_queries = [self.user_summary_dao.build_increment_query(orders_data)]
+        
+        try:
+            return await self._write_with_summary_async(sql, tuple(params), summary_queries, orders_data)
+        except Exception as e:
+            logger.error(f"批量创建订单失败: {str(e)}")
+            raise
+    
+    async def insert_orders_chunk_async(self, orders_data: List[Dict[str, Any]]) -> int:
+        """
+        使用 executemany 写入一个订单数据块（流式导入使用）
+
+        所有行的字段必须与第一行一致，由调用方保证。
+        """
+        if not orders_data:
+            return 0
+        orders_data = self._with_create_time(orders_data)
+        
+        sql, params_list = QueryBuilder.build_insert_many_query(self.table_name, orders_data)
+        summary_queries = [self.user_summary_dao.build_increment_query(orders_data)]
+        
+        try:
+            return await self._write_with_summary_async(sql, params_list, summary_queries, orders_data, many=True)
+        except Exception as e:
+            logger.error(f"写入订单数据块失败: {str(e)}")
+            raise
+    
+    def upsert_orders(self,
+                      orders_data: List[Dict[str, Any]],
+                      update_columns: Optional[List[str]] = None,
+                      ignore: bool = False,
+                      pending_refresh: Optional[Dict[str, set]] = None) -> Dict[str, int]:
+        """
+        按 uk_merchant_order_id 幂等写入订单
+
+        写入事务中只累加新订单的汇总；被更新的订单涉及的用户汇总和每日汇总在事务提交后按 t_order 重算。
+
+        Args:
+            orders_data: 订单列表，字段以第一行为准
+            update_columns: 订单已存在时更新的字段，默认更新除唯一键外的所有字段
+            ignore: True 时已存在的订单直接跳过（INSERT IGNORE）
+            pending_refresh: new_summary_refresh() 创建的待重算集合，传入时只记录不重算，
+                由调用方在全部数据块写入后调用一次 refresh_summaries；默认本批次提交后立即重算
+            
+        Returns:
+            {"inserted": 新增数, "updated": 更新数, "skipped": 跳过数}
+        """
+        if not orders_data:
+            return {"inserted": 0, "updated": 0, "skipped": 0}
+        
+        rows, duplicated = self._dedupe_orders(orders_data)
+        update_columns = self._check_upsert_columns(rows, update_columns)
+        refresh = pending_refresh if pending_refresh is not None else self.new_summary_refresh()
+        
+        try:
+            existing = {}
+            for merchant_id, order_ids in self._existing_key_batches(rows):
+                sql_keys, params_keys = self._build_existing_keys_query(merchant_id, order_ids)
+                existing.update((self._order_key(row), row) for row in self.execute_query(sql_keys, tuple(params_keys)))
+            sql, params_list, rows = self._build_upsert(rows, existing, update_columns, ignore)
+            summary_queries, rollup_orders = self._build_summary_queries(rows, existing, ignore, refresh, update_columns)
+            affected_rows = self._write_with_summary(sql, params_list, summary_queries, rollup_orders, many=True)
+        except Exception as e:
+            logger.error(f"幂等写入订单失败: {str(e)}")
+            raise
+        if pending_refresh is None:
+            self.refresh_summaries(refresh)
+        return self._upsert_counts(len(rows), len(existing), affected_rows, duplicated, ignore)
+    
+    async def upsert_orders_async(self,
+                                  orders_data: List[Dict[str, Any]],
+                                  update_columns: Optional[List[str]] = None,
+                                  ignore: bool = False,
+                                  pending_refresh: Optional[Dict[str, set]] = None) -> Dict[str, int]:
+        """按 uk_merchant_order_id 幂等写入订单（异步），参数同 upsert_orders"""
+        if not orders_data:
+            return {"inserted": 0, "updated": 0, "skipped": 0}
+        
+        rows, duplicated = self._dedupe_orders(orders_data)
+        update_columns = self._check_upsert_columns(rows, update_columns)
+        refresh = pending_refresh if pending_refresh is not None else self.new_summary_refresh()
+        
+        try:
+            existing = {}
+            for merchant_id, order_ids in self._existing_key_batches(rows):
+                sql_keys, params_keys = self._build_existing_keys_query(merchant_id, order_ids)
+                results = await self.execute_query_async(sql_keys, tuple(params_keys))
+                existing.update((self._order_key(row), row) for row in results)
+            sql, params_list, rows = self._build_upsert(rows, existing, update_columns, ignore)
+            summary_queries, rollup_orders = self._build_summary_queries(rows, existing, ignore, refresh, update_columns)
+            affected_rows = await self._write_with_summary_async(sql, params_list, summary_queries, rollup_orders, many=True)
+        except Exception as e:
+            logger.error(f"幂等写入订单失败: {str(e)}")
+            raise
+        if pending_refresh is None:
+            await self.refresh_summaries_async(refresh)
+        return self._upsert_counts(len(rows), len(existing), affected_rows, duplicated, ignore)
+    
+    @staticmethod
+    def new_summary_refresh() -> Dict[str, set]:
+        """待重算的汇总：users 为 (商家ID, 用户ID)，days 为 (商家ID, 日期)"""
+        return {"users": set(), "days": set()}
+    
+    def _build_refresh_batches(self, refresh: Dict[str, set]) -> Tuple[List[Tuple[str, List[Any]]], List[List[Tuple[str, List[Any]]]]]:
+        """返回 (用户汇总重算语句, 每天一组的每日汇总重算语句)"""
+        users = [{"merchant_id": merchant_id, "user_id": user_id} for merchant_id, user_id in refresh["users"]]
+        user_queries = self.user_summary_dao.build_refresh_queries(users) if users else []
+        day_queries = [
+            self.order_daily_dao.build_refresh_queries(order_date, merchant_id)
+            for merchant_id, order_date in sorted(refresh["days"], key=lambda item: (str(item[0]), item[1]))
+        ]
+        return user_queries, day_queries
+    
+    def refresh_summaries(self, refresh: Dict[str, set]) -> None:
+        """
+        按 t_order 重算幂等写入更新过的用户汇总和每日汇总
+
+        在订单写入事务之外执行：用户汇总每批用户一条语句，每日汇总每天一个事务，不长时间锁住整天的汇总行。
+        """
+        user_queries, day_queries = self._build_refresh_batches(refresh)
+        try:
+            for sql, params in user_queries:
+                self.execute_update(sql, tuple(params))
+            for queries in day_queries:
+                self.execute_in_transaction(queries)
+        except Exception as e:
+            logger.error(f"重算订单汇总失败: {str(e)}")
+            raise
+    
+    async def refresh_summaries_async(self, refresh: Dict[str, set]) -> None:
+        """按 t_order 重算幂等写入更新过的用户汇总和每日汇总（异步）"""
+        user_queries, day_queries = self._build_refresh_batches(refresh)
+        try:
+            for sql, params in user_queries:
+                await self.execute_update_async(sql, tuple(params))
+            for queries in day_queries:
+                await self.execute_in_transaction_async(queries)
+        except Exception as e:
+            logger.error(f"重算订单汇总失败: {str(e)}")
+            raise
+    
+    def _write_with_summary(self, sql: str, params: Any, summary_queries: List[Tuple[str, List[Any]]],
+                            rollup_orders: List[Dict[str, Any]] = (), many: bool = False) -> int:
+        """
+        在同一事务中写入订单并更新汇总，返回订单语句的影响行数
+
+        summary_queries 为用户汇总/重算语句，rollup_orders 为需要累加到每日汇总的新增订单。
+        """
+        with self._transaction() as conn:
+            with conn.cursor() as cursor:
+                if many:
+                    cursor.executemany(sql, params)
+                else:
+                    cursor.execute(sql, params)
+                affected_rows = cursor.rowcount
+                for summary_sql, summary_params in summary_queries:
+                    cursor.execute(summary_sql, tuple(summary_params))
+                self.order_daily_dao.apply_orders(cursor, rollup_orders)
+            return affected_rows
+    
+    async def _write_with_summary_async(self, sql: str, params: Any, summary_queries: List[Tuple[str, List[Any]]],
+                                        rollup_orders: List[Dict[str, Any]] = (), many: bool = False) -> int:
+        """在同一事务中写入订单并更新汇总（异步）"""
+        async with self._transaction_async() as conn:
+            async with conn.cursor() as cursor:
+                if many:
+                    await cursor.executemany(sql, params)
+                else:
+                    await cursor.execute(sql, params)
+                affected_rows = cursor.rowcount
+                for summary_sql, summary_params in summary_queries:
+                    await cursor.execute(summary_sql, tuple(summary_params))
+                await self.order_daily_dao.apply_orders_async(cursor, rollup_orders)
+            return affected_rows
+    
+    def _build_summary_queries(self,
+                               rows: List[Dict[str, Any]],
+                               existing: Dict[Tuple[str, str], Dict[str, Any]],
+                               ignore: bool,
+                               refresh: Dict[str, set],
+                               update_columns: Optional[List[str]] = None) -> Tuple[List[Tuple[str, List[Any]]], List[Dict[str, Any]]]:
+        """
+        幂等写入时写入事务中的汇总语句，返回 (用户汇总累加语句, 需要累加到每日汇总的新增订单)
+
+        新订单在事务中累加；upsert 模式下已有订单的金额或时间可能被修改，
+        其用户以及订单新旧日期记入 refresh，提交后按 t_order 重算。
+        update_columns 为空时视为行中的字段都会更新。
+        """
+        new_rows = [row for row in rows if self._order_key(row) not in existing]
+        if not ignore:
+            for row in rows:
+                key = self._order_key(row)
+                if key not in existing:
+                    continue
+                old = existing[key]
+                refresh["users"].add((old["merchant_id"], old["user_id"]))
+                refresh["days"].add((old["merchant_id"], OrderDailyDAO.order_date(old)))
+                # 用户或下单时间被修改时，新的用户和日期也要重算
+                if "user_id" in row and (update_columns is None or "user_id" in update_columns):
+                    refresh["users"].add((old["merchant_id"], row["user_id"]))
+                if row.get("create_time") and (update_columns is None or "create_time" in update_columns):
+                    refresh["days"].add((old["merchant_id"], OrderDailyDAO.order_date(row)))
+        if not new_rows:
+            return [], []
+        return [self.user_summary_dao.build_increment_query(new_rows)], new_rows
+    
+    @staticmethod
+    def _check_upsert_columns(rows: List[Dict[str, Any]], update_columns: Optional[List[str]]) -> List[str]:
+        """
+        校验字段，返回冲突时更新的字段
+
+        默认更新字段按调用方传入的字段确定（在填充 create_time 之前），已有订单的下单时间不会被写入时间覆盖。
+        """
+        columns = list(rows[0].keys())
+        invalid = [column for column in columns + list(update_columns or []) if column not in ORDER_COLUMNS]
+        if invalid:
+            raise ValueError(f"不支持的订单字段: {', '.join(invalid)}")
+        if not update_columns:
+            update_columns = [column for column in columns if column not in ORDER_UNIQUE_KEY]
+        return update_columns
+
+    def _build_upsert(self,
+                      rows: List[Dict[str, Any]],
+                      existing: Dict[Tuple[str, str], Dict[str, Any]],
+                      update_columns: List[str],
+                      ignore: bool) -> Tuple[str, List[tuple], List[Dict[str, Any]]]:
+        """
+        构建 UPSERT 语句，返回 (SQL, 参数, 填充 create_time 后的订单)
+
+        已存在的订单使用库中保存的 create_time（调用方要求更新 create_time 时除外），新订单未指定时填入写入时间：
+        按 create_time 分区后唯一键包含 create_time，重复推送的订单只有下单时间不变才会命中已有的行，否则会新增一行。
+        """
+        keep_stored = ignore or "create_time" not in update_columns
+        rows = [
+            {**row, "create_time": existing[key]["create_time"]}
+            if key in existing and (keep_stored or not row.get("create_time")) else row
+            for row, key in ((row, self._order_key(row)) for row in rows)
+        ]
+        rows = self._with_create_time(rows)
+        sql, params_list = QueryBuilder.build_upsert_query(self.table_name, rows, update_columns, ignore)
+        return sql, params_list, rows
+    
+    @staticmethod
+    def _order_key(row: Dict[str, Any]) -> Tuple[str, str]:
+        return str(row.get("merchant_id")), str(row.get("order_id", ""))
+    
+    @staticmethod
+    def _dedupe_orders(orders_data: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """同一批次内重复的订单号只保留最后一条，返回 (去重后的订单, 被合并的条数)"""
+        unique = {}
+        for order in orders_data:
+            unique[OrderDAO._order_key(order)] = order
+        return list(unique.values()), len(orders_data) - len(unique)
+    
+    @staticmethod
+    def _existing_key_batches(rows: List[Dict[str, Any]]):
+        """按商家分组、按批次切分订单号，用于预查询已存在的订单"""
+        by_merchant: Dict[Any, List[Any]] = {}
+        for row in rows:
+            by_merchant.setdefault(row.get("merchant_id"), []).append(row.get("order_id", ""))
+        for merchant_id, order_ids in by_merchant.items():
+            for start in range(0, len(order_ids), EXISTING_KEYS_BATCH):
+                yield merchant_id, order_ids[start:start + EXISTING_KEYS_BATCH]
+    
+    def _build_existing_keys_query(self, merchant_id: Any, order_ids: List[Any]) -> Tuple[str, List[Any]]:
+        return QueryBuilder.build_select_query(
+            self.table_name,
+            fields=["merchant_id", "order_id", "user_id", "create_time"],
+            conditions={"merchant_id": merchant_id, "order_id": {"$in": order_ids}}
+        )
+    
+    @staticmethod
+    def _upsert_counts(total: int, existing: int, affected_rows: int, duplicated: int, ignore: bool) -> Dict[str, int]:
+        """
+        根据影响行数拆分新增/更新/跳过数量
+
+        MySQL 的影响行数：新增计 1，更新且值有变化计 2，值无变化计 0。
+        """
+        if ignore:
+            inserted = affected_rows
+            updated = 0
+        else:
+            inserted = total - existing
+            updated = max(0, (affected_rows - inserted) // 2)
+        skipped = max(0, total - inserted - updated) + duplicated
+        return {"inserted": inserted, "updated": updated, "skipped": skipped}
+    
     def get_order_by_id(self, order_id: int) -> Optional[Dict]:
         """根据ID获取订单"""
         conditions = {"id": order_id}
@@ -71,7 +383,11 @@ class OrderDAO(BaseDAO):
             return None
     
     def update_order(self, order_id: int, update_data: Dict[str, Any]) -> int:
-        """更新订单"""
+        """
+        更新订单
+
+        修改了商家、用户、金额或商品类型时，更新后按 t_order 重算订单新旧用户的汇总和下单当天的每日汇总。
+        """
         conditions = {"id": order_id}
         
         # 移除不能更新的字段
@@ -83,12 +399,33 @@ class OrderDAO(BaseDAO):
             update_data,
             conditions
         )
+        affects_summary = any(update_data.get(column) is not None for column in ORDER_SUMMARY_COLUMNS)
         
         try:
-            return self.execute_update(sql, tuple(params))
+            old = None
+            if affects_summary:
+                select_sql, select_params = QueryBuilder.build_select_query(
+                    self.table_name, fields=["merchant_id", "user_id", "create_time"], conditions=conditions
+                )
+                results = self.execute_query(select_sql, tuple(select_params))
+                old = results[0] if results else None
+            affected_rows = self.execute_update(sql, tuple(params))
         except Exception as e:
             logger.error(f"更新订单失败: {str(e)}")
             raise
+        if old is not None:
+            self.refresh_summaries(self._build_update_refresh(old, update_data))
+        return affected_rows
+    
+    def _build_update_refresh(self, old: Dict[str, Any], update_data: Dict[str, Any]) -> Dict[str, set]:
+        """修改订单后待重算的汇总：新旧 (商家, 用户) 和新旧商家的下单日期"""
+        refresh = self.new_summary_refresh()
+        merchant_id = update_data.get("merchant_id") or old["merchant_id"]
+        user_id = update_data.get("user_id") or old["user_id"]
+        order_date = OrderDailyDAO.order_date(old)
+        refresh["users"].update({(old["merchant_id"], old["user_id"]), (merchant_id, user_id)})
+        refresh["days"].update({(old["merchant_id"], order_date), (merchant_id, order_date)})
+        return refresh
     
     def query_orders(self, 
                     conditions: Optional[Dict[str, Any]] = None,
@@ -112,6 +449,65 @@ class OrderDAO(BaseDAO):
             logger.error(f"查询订单失败: {str(e)}")
             return []
     
+    def stream_orders(self,
+                      conditions: Optional[Dict[str, Any]] = None,
+                      fields: Optional[List[str]] = None,
+                      order_by: Optional[List[str]] = None,
+                      batch_size: Optional[int] = None) -> Iterator:
+        """
+        流式查询订单（导出、分析全部订单时使用），内存占用只与批大小有关
+
+        batch_size 为空时逐行返回，否则每次返回最多 batch_size 行的列表
+        """
+        sql, params = QueryBuilder.build_select_query(
+            self.table_name,
+            fields=fields,
+            conditions=conditions,
+            order_by=order_by
+        )
+        return self.stream_query(sql, tuple(params), batch_size)
+    
+    def stream_orders_async(self,
+                            conditions: Optional[Dict[str, Any]] = None,
+                            fields: Optional[List[str]] = None,
+                            order_by: Optional[List[str]] = None,
+                            batch_size: Optional[int] = None) -> AsyncIterator:
+        """流式查询订单（异步），用 async for 迭代"""
+        sql, params = QueryBuilder.build_select_query(
+            self.table_name,
+            fields=fields,
+            conditions=conditions,
+            order_by=order_by
+        )
+        return self.stream_query_async(sql, tuple(params), batch_size)
+    
+    def query_orders_by_cursor(self,
+                               conditions: Optional[Dict[str, Any]] = None,
+                               fields: Optional[List[str]] = None,
+                               order_column: str = "create_time",
+                               descending: bool = True,
+                               cursor: Optional[str] = None,
+                               page_size: int = 20,
+                               total: Optional[str] = None) -> Dict:
+        """
+        游标分页查询订单，翻到任意一页的开销与第一页相同
+
+        Args:
+            order_column: 排序字段，与 id 组成排序键
+            cursor: 上一页返回的 next_cursor，为空时查询第一页
+            total: "exact"-精确总数，"estimate"-估算总数，None-不返回总数
+            
+        Returns:
+            {"data": [...], "pagination": {"page_size", "next_cursor", "has_more", "total"}}
+        """
+        try:
+            return self._query_keyset(conditions, fields, order_column, descending, cursor, page_size, total)
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"游标分页查询订单失败: {str(e)}")
+            return {"data": [], "pagination": {}}
+    
     def query_orders_paginated(self,
                               conditions: Optional[Dict[str, Any]] = None,
                               fields: Optional[List[str]] = None,
@@ -128,9 +524,8 @@ class OrderDAO(BaseDAO):
             page_size=page_size
         )
         
-        conn = self._get_connection()
         try:
-            with conn.cursor(dictionary=True) as cursor:
+            with self._connection() as conn, conn.cursor(pymysql.cursors.DictCursor) as cursor:
                 # 查询数据
                 cursor.execute(data_sql, tuple(data_params))
                 data = cursor.fetchall()
@@ -152,8 +547,6 @@ class OrderDAO(BaseDAO):
         except Exception as e:
             logger.error(f"分页查询订单失败: {str(e)}")
             return {"data": [], "pagination": {}}
-        finally:
-            conn.close()
     
     def get_user_orders(self, 
                        merchant_id: int,
@@ -182,131 +575,48 @@ class OrderDAO(BaseDAO):
                           merchant_id: int,
                           inactive_days: int = 30,
                           limit: int = 100) -> List[Dict]:
-        """获取不活跃用户（超过指定天数未下单）"""
-        # 计算截止日期
-        cutoff_date = (datetime.now() - timedelta(days=inactive_days)).strftime('%Y-%m-%d')
-        
-        sql = """
-        SELECT 
-            user_id,
-            MAX(name) as user_name,
-            MAX(contact) as contact,
-            MAX(contact_type) as contact_type,
-            MAX(create_time) as last_order_time,
-            COUNT(*) as total_orders,
-            SUM(amount) as total_amount,
-            DATEDIFF(CURDATE(), MAX(create_time)) as inactive_days
-        FROM t_order
-        WHERE merchant_id = %s
-        GROUP BY user_id
-        HAVING MAX(create_time) < %s
-        ORDER BY MAX(create_time) ASC
-        LIMIT %s
-        """
-        
-        try:
-            return self.execute_query(sql, (merchant_id, cutoff_date, limit))
-        except Exception as e:
-            logger.error(f"获取不活跃用户失败: {str(e)}")
-            return []
+        """获取不活跃用户（超过指定天数未下单），读取增量维护的用户汇总表"""
+        return self.user_summary_dao.get_inactive_users(merchant_id, inactive_days, limit)
     
     def get_sales_stats(self,
                        merchant_id: int,
                        start_date: Optional[str] = None,
                        end_date: Optional[str] = None) -> Dict:
-        """获取销售统计"""
-        conditions = {"merchant_id": merchant_id}
-        
-        if start_date and end_date:
-            conditions["create_time"] = {"$between": [start_date, end_date]}
-        elif start_date:
-            conditions["create_time"] = {"$gte": start_date}
-        elif end_date:
-            conditions["create_time"] = {"$lte": end_date}
-        
-        sql, params = QueryBuilder.build_select_query(
-            self.table_name,
-            fields=[
-                "COUNT(*) as order_count",
-                "COUNT(DISTINCT user_id) as user_count",
-                "SUM(amount) as total_amount",
-                "AVG(amount) as avg_amount",
-                "MIN(amount) as min_amount",
-                "MAX(amount) as max_amount",
-                "MIN(create_time) as first_order_time",
-                "MAX(create_time) as last_order_time"
-            ],
-            conditions=conditions,
-            group_by=["merchant_id"]
-        )
-        
-        try:
-            results = self.execute_query(sql, tuple(params))
-            return results[0] if results else {}
-        except Exception as e:
-            logger.error(f"获取销售统计失败: {str(e)}")
-            return {}
+        """获取销售统计（读每日汇总，按天粒度过滤）"""
+        return self.order_daily_dao.get_sales_stats(merchant_id, start_date, end_date)
     
     def get_daily_sales(self,
                        merchant_id: int,
                        start_date: str,
                        end_date: str) -> List[Dict]:
-        """获取每日销售数据"""
-        sql = """
-        SELECT 
-            DATE(create_time) as order_date,
-            COUNT(*) as order_count,
-            COUNT(DISTINCT user_id) as user_count,
-            SUM(amount) as total_amount,
-            AVG(amount) as avg_amount
-        FROM t_order
-        WHERE merchant_id = %s 
-            AND DATE(create_time) >= %s 
-            AND DATE(create_time) <= %s
-        GROUP BY DATE(create_time)
-        ORDER BY order_date
-        """
-        
-        try:
-            return self.execute_query(sql, (merchant_id, start_date, end_date))
-        except Exception as e:
-            logger.error(f"获取每日销售数据失败: {str(e)}")
-            return []
+        """获取每日销售数据（读每日汇总）"""
+        return self.order_daily_dao.get_daily_sales(merchant_id, start_date, end_date)
     
     def get_top_products(self,
                         merchant_id: int,
                         limit: int = 10,
                         start_date: Optional[str] = None,
                         end_date: Optional[str] = None) -> List[Dict]:
-        """获取热销商品"""
-        conditions = {"merchant_id": merchant_id}
-        
-        if start_date and end_date:
-            conditions["create_time"] = {"$between": [start_date, end_date]}
-        
-        sql = """
-        SELECT 
-            product,
-            product_type,
-            COUNT(*) as sales_count,
-            SUM(amount) as sales_amount,
-            COUNT(DISTINCT user_id) as user_count
-        FROM t_order
-        WHERE merchant_id = %s
-        """
-        
-        params = [merchant_id]
+        """获取热销商品（起止日期均包含）"""
+        conditions: Dict[str, Any] = {"merchant_id": merchant_id}
+        time_range = QueryBuilder.build_time_range(start_date, end_date)
+        if time_range:
+            conditions["create_time"] = time_range
         
-        if start_date and end_date:
-            sql += " AND create_time BETWEEN %s AND %s"
-            params.extend([start_date, end_date])
-        
-        sql += """
-        GROUP BY product, product_type
-        ORDER BY sales_count DESC, sales_amount DESC
-        LIMIT %s
-        """
-        params.append(limit)
+        sql, params = QueryBuilder.build_select_query(
+            self.table_name,
+            fields=[
+                "product",
+                "product_type",
+                "COUNT(*) as sales_count",
+                "SUM(amount) as sales_amount",
+                "COUNT(DISTINCT user_id) as user_count"
+            ],
+            conditions=conditions,
+            group_by=["product", "product_type"],
+            order_by=["sales_count DESC", "sales_amount DESC"],
+            limit=limit
+        )
         
         try:
             return self.execute_query(sql, tuple(params))
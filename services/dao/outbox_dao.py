@@ -0,0 +1,154 @@
+from typing import Dict, List, Optional, Any
+from services.dao.base_dao import BaseDAO
+from services.dao.query_builder import QueryBuilder
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 发件箱消息状态
+OUTBOX_PENDING = 0
+OUTBOX_SENDING = 1
+OUTBOX_SENT = 2
+OUTBOX_FAILED = 3
+
+# 联系方式类型对应的发送渠道，未填写联系方式类型时按手机号处理；其他类型（邮箱、支付宝等）暂无发送渠道
+OUTBOX_CHANNELS = {"mobile": "sms", "qywechat": "qywechat"}
+
+def outbox_channel(contact_type: Optional[str]) -> Optional[str]:
+    """联系方式类型对应的发送渠道，没有对应渠道时返回 None"""
+    return OUTBOX_CHANNELS.get(contact_type or "mobile")
+
+class OutboxDAO(BaseDAO):
+    """召回消息发件箱数据访问对象"""
+
+    def __init__(self):
+        super().__init__("t_recall_outbox")
+
+    async def claim_batch_async(self,
+                                worker_id: str,
+                                batch_size: int,
+                                lease_seconds: int,
+                                channel: str = "sms") -> List[Dict]:
+        """
+        认领一批待发送消息（异步）
+
+        在事务中用 SELECT ... FOR UPDATE SKIP LOCKED 锁定待发送行并标记为发送中，
+        多个 worker 进程并发认领时互不阻塞、不会拿到同一条消息。
+        认领后关联 t_recall 返回发送所需的联系方式等字段。
+        """
+        claim_sql = f"""
+        SELECT id FROM {self.table_name}
+        WHERE status = %s AND next_retry_time <= NOW() AND channel = %s
+        ORDER BY id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+        """
+
+        try:
+            async with self._transaction_async() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(claim_sql, (OUTBOX_PENDING, channel, batch_size))
+                    ids = [row["id"] for row in await cursor.fetchall()]
+                    if not ids:
+                        return []
+                    placeholders = ', '.join(['%s'] * len(ids))
+                    await cursor.execute(
+                        f"""
+                        UPDATE {self.table_name}
+                        SET status = %s, attempts = attempts + 1, locked_by = %s,
+                            locked_until = NOW() + INTERVAL %s SECOND
+                        WHERE id IN ({placeholders})
+                        """,
+                        (OUTBOX_SENDING, worker_id, lease_seconds, *ids)
+                    )
+        except Exception as e:
+            logger.error(f"认领发件箱消息失败: {str(e)}")
+            raise
+
+        sql = f"""
+        SELECT o.id AS outbox_id, o.job_id, o.attempts,
+               r.id AS recall_id, r.merchant_id, r.user_name, r.token, r.token_expired,
+               r.product, r.product_type, r.contact, r.contact_type,
+               r.coupon_type, r.coupon_value
+        FROM {self.table_name} o
+        JOIN t_recall r ON r.token = o.recall_token
+        WHERE o.id IN ({placeholders})
+        ORDER BY o.id
+        """
+        return await self.execute_query_async(sql, tuple(ids))
+
+    async def mark_sent_async(self, outbox_ids: List[int]) -> int:
+        """批量标记为已发送"""
+        if not outbox_ids:
+            return 0
+        placeholders = ', '.join(['%s'] * len(outbox_ids))
+        sql = f"""
+        UPDATE {self.table_name}
+        SET status = %s, error = NULL, locked_by = NULL, locked_until = NULL, sent_time = NOW()
+        WHERE id IN ({placeholders})
+        """
+        return await self.execute_update_async(sql, (OUTBOX_SENT, *outbox_ids))
+
+    async def mark_retry_async(self, outbox_ids: List[int], delay_seconds: int, error: Optional[str] = None) -> int:
+        """批量放回待发送，delay_seconds 秒后可再次认领"""
+        if not outbox_ids:
+            return 0
+        placeholders = ', '.join(['%s'] * len(outbox_ids))
+        sql = f"""
+        UPDATE {self.table_name}
+        SET status = %s, error = %s, locked_by = NULL, locked_until = NULL,
+            next_retry_time = NOW() + INTERVAL %s SECOND
+        WHERE id IN ({placeholders})
+        """
+        return await self.execute_update_async(sql, (OUTBOX_PENDING, (error or "")[:255], delay_seconds, *outbox_ids))
+
+    async def mark_failed_async(self, outbox_ids: List[int], error: Optional[str] = None) -> int:
+        """批量标记为发送失败（不再重试）"""
+        if not outbox_ids:
+            return 0
+        placeholders = ', '.join(['%s'] * len(outbox_ids))
+        sql = f"""
+        UPDATE {self.table_name}
+        SET status = %s, error = %s, locked_by = NULL, locked_until = NULL
+        WHERE id IN ({placeholders})
+        """
+        return await self.execute_update_async(sql, (OUTBOX_FAILED, (error or "")[:255], *outbox_ids))
+
+    async def release_expired_leases_async(self) -> int:
+        """把租约过期（worker 崩溃或超时）的发送中消息放回待发送"""
+        sql = f"""
+        UPDATE {self.table_name}
+        SET status = %s, locked_by = NULL, locked_until = NULL
+        WHERE status = %s AND locked_until < NOW()
+        """
+        return await self.execute_update_async(sql, (OUTBOX_PENDING, OUTBOX_SENDING))
+
+    async def get_job_stats_async(self, job_id: str, merchant_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """统计任务各状态的消息数量，指定 merchant_id 时只统计该商家的消息（其他商家的任务视为不存在）"""
+        conditions: Dict[str, Any] = {"job_id": job_id}
+        if merchant_id is not None:
+            conditions["merchant_id"] = merchant_id
+        sql, params = QueryBuilder.build_select_query(
+            self.table_name,
+            fields=["status", "COUNT(*) AS total", "MIN(create_time) AS created_at", "MAX(sent_time) AS last_sent_time"],
+            conditions=conditions,
+            group_by=["status"]
+        )
+
+        try:
+            results = await self.execute_query_async(sql, tuple(params))
+        except Exception as e:
+            logger.error(f"获取发送任务统计失败: {str(e)}")
+            return None
+        if not results:
+            return None
+
+        counts = {row["status"]: row["total"] for row in results}
+        return {
+            "total": sum(counts.values()),
+            "sent": counts.get(OUTBOX_SENT, 0),
+            "failed": counts.get(OUTBOX_FAILED, 0),
+            "pending": counts.get(OUTBOX_PENDING, 0) + counts.get(OUTBOX_SENDING, 0),
+            "created_at": min(row["created_at"] for row in results),
+            "last_sent_time": max((row["last_sent_time"] for row in results if row["last_sent_time"]), default=None)
+        }
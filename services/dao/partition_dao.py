@@ -0,0 +1,120 @@
+from typing import Dict, List, Optional, Any
+from datetime import date
+from services.dao.base_dao import BaseDAO
+from services.dao.recall_archive_dao import RECALL_COLUMNS
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 按 create_time 月度分区的表（分区改造见 aiops_partitioning.sql）
+PARTITIONED_TABLES = ("t_order", "t_recall")
+# 兜底分区，未来月份从中拆分
+MAX_PARTITION = "p_max"
+# 归档旧分区时每批复制的行数
+ARCHIVE_BATCH_ROWS = 5000
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+class PartitionDAO(BaseDAO):
+    """
+    月度分区管理
+
+    分区按 create_time 的 RANGE COLUMNS 划分，每月一个分区，命名为 pYYYYMM（VALUES LESS THAN 次月 1 日），
+    最后一个分区 p_max 兜底。定期从 p_max 中拆出未来月份，删除（或先归档再删除）超过保留期的月份；
+    删除分区只是删除文件，不会像 DELETE 那样产生大事务和主从延迟。
+    """
+
+    def __init__(self, table_name: str):
+        if table_name not in PARTITIONED_TABLES:
+            raise ValueError(f"不支持分区管理的表: {table_name}")
+        super().__init__(table_name)
+
+    def list_partitions(self) -> List[Dict[str, Any]]:
+        """按顺序返回分区名、上界日期（p_max 为 None）和估算行数，表未分区时返回空列表"""
+        rows = self.execute_query(
+            """
+            SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS description, TABLE_ROWS AS table_rows
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+            """,
+            (self.table_name,)
+        )
+        partitions = []
+        for row in rows:
+            description = str(row["description"]).strip("'")
+            partitions.append({
+                "name": row["name"],
+                "less_than": None if description == "MAXVALUE" else date.fromisoformat(description[:10]),
+                "rows": row["table_rows"]
+            })
+        return partitions
+
+    def build_future_partitions_query(self, months_ahead: int, today: Optional[date] = None) -> Optional[str]:
+        """构建从 p_max 中拆出到 months_ahead 个月之后的分区的语句，已经足够时返回 None"""
+        partitions = self.list_partitions()
+        if not partitions:
+            raise ValueError(f"{self.table_name} 尚未分区，请先执行 aiops_partitioning.sql")
+        if partitions[-1]["name"] != MAX_PARTITION:
+            raise ValueError(f"{self.table_name} 的最后一个分区应为 {MAX_PARTITION}")
+
+        this_month = (today or date.today()).replace(day=1)
+        bounds = [partition["less_than"] for partition in partitions if partition["less_than"]]
+        month = bounds[-1] if bounds else this_month
+        target = _add_months(this_month, months_ahead + 1)
+
+        definitions = []
+        while month < target:
+            definitions.append(
+                f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{_add_months(month, 1).isoformat()}')"
+            )
+            month = _add_months(month, 1)
+        if not definitions:
+            return None
+        if partitions[-1]["rows"]:
+            logger.warning(f"{self.table_name}.{MAX_PARTITION} 中约有 {partitions[-1]['rows']} 行，拆分分区时需要搬移数据")
+        definitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)")
+        return (f"ALTER TABLE {self.table_name} REORGANIZE PARTITION {MAX_PARTITION} INTO (\n    "
+                + ",\n    ".join(definitions) + "\n)")
+
+    def expired_partitions(self, keep_months: int, today: Optional[date] = None) -> List[Dict[str, Any]]:
+        """上界早于保留期起点（keep_months 个月前的月初）的分区，即其中的数据全部超过保留期"""
+        cutoff = _add_months((today or date.today()).replace(day=1), -keep_months)
+        return [
+            partition for partition in self.list_partitions()
+            if partition["less_than"] is not None and partition["less_than"] <= cutoff
+        ]
+
+    def archive_partition(self, partition_name: str) -> int:
+        """把 t_recall 一个分区的数据按主键分批复制到 t_recall_archive（可重复执行），返回复制的行数"""
+        if self.table_name != "t_recall":
+            raise ValueError("只有 t_recall 支持归档分区")
+        columns = ', '.join(RECALL_COLUMNS)
+        last_id = 0
+        total = 0
+        while True:
+            rows = self.execute_query(
+                f"SELECT MAX(id) AS last_id FROM (SELECT id FROM {self.table_name} PARTITION ({partition_name}) "
+                f"WHERE id > %s ORDER BY id LIMIT %s) chunk",
+                (last_id, ARCHIVE_BATCH_ROWS)
+            )
+            chunk_last_id = rows[0]["last_id"] if rows else None
+            if chunk_last_id is None:
+                break
+            total += self.execute_update(
+                f"""
+                INSERT IGNORE INTO t_recall_archive ({columns}, archive_time)
+                SELECT {columns}, NOW() FROM {self.table_name} PARTITION ({partition_name})
+                WHERE id > %s AND id <= %s
+                """,
+                (last_id, chunk_last_id)
+            )
+            last_id = chunk_last_id
+        return total
+
+    def drop_partitions(self, partition_names: List[str]) -> int:
+        if not partition_names:
+            return 0
+        return self.execute_update(f"ALTER TABLE {self.table_name} DROP PARTITION {', '.join(partition_names)}")
@@ -1,4 +1,133 @@
 from typing import Dict, List, Optional, Tuple, Any
+from collections import OrderedDict
+from datetime import date, timedelta
+import base64
+import json
+import os
+import re
+import threading
+
+# 排序字段只允许普通列名，防止通过游标参数注入 SQL
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# 按查询结构缓存的 SQL 模板数量上限，设为 0 关闭缓存
+QUERY_SHAPE_CACHE_SIZE = int(os.getenv("QUERY_SHAPE_CACHE_SIZE", "1024"))
+
+# 比较操作符 -> SQL 运算符
+_COMPARE_OPERATORS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<=", "$ne": "!="}
+
+# 查询结构 -> SQL 模板，超过上限时淘汰最久未使用的结构；路由在线程池中执行，读写都持有锁
+_shape_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_shape_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_shape_lock = threading.Lock()
+
+def _arity_bucket(size: int) -> int:
+    """IN 列表长度向上取整到 2 的幂，限制 SQL 模板的数量（不足的位置用最后一个值补齐）"""
+    return 1 << (size - 1).bit_length()
+
+def _walk_conditions(conditions: Optional[Dict[str, Any]], shape: List[Any], params: List[Any]) -> None:
+    """
+    遍历一次查询条件，同时得到条件结构和参数
+
+    结构为扁平序列：字段, 运算符[, IN 列表长度分档]；结构相同的条件只是参数值不同，对应同一个 SQL 模板。
+    """
+    if not conditions:
+        return
+    for field, value in conditions.items():
+        if value is None:
+            continue
+        if isinstance(value, dict):
+            for op, op_value in value.items():
+                if op == "$in":
+                    if not op_value:
+                        continue
+                    values = list(op_value)
+                    size = _arity_bucket(len(values))
+                    shape.extend((field, "IN", size))
+                    params.extend(values)
+                    params.extend([values[-1]] * (size - len(values)))
+                elif op == "$between":
+                    if len(op_value) == 2:
+                        shape.extend((field, "BETWEEN"))
+                        params.extend(op_value)
+                elif op == "$like":
+                    shape.extend((field, "LIKE"))
+                    params.append(f"%{op_value}%")
+                elif op in _COMPARE_OPERATORS:
+                    shape.extend((field, _COMPARE_OPERATORS[op]))
+                    params.append(op_value)
+        elif isinstance(value, list):
+            if not value:
+                continue
+            size = _arity_bucket(len(value))
+            shape.extend((field, "IN", size))
+            params.extend(value)
+            params.extend([value[-1]] * (size - len(value)))
+        elif isinstance(value, str) and '%' in value:
+            shape.extend((field, "LIKE"))
+            params.append(value)
+        elif isinstance(value, bool):
+            shape.extend((field, "="))
+            params.append(1 if value else 0)
+        else:
+            shape.extend((field, "="))
+            params.append(value)
+
+def _render_where(shape: tuple, start: int = 0) -> str:
+    """把条件结构渲染为 WHERE 子句"""
+    where_conditions = []
+    index = start
+    while index < len(shape):
+        field, op = shape[index], shape[index + 1]
+        index += 2
+        if op == "IN":
+            where_conditions.append(f"{field} IN ({', '.join(['%s'] * shape[index])})")
+            index += 1
+        elif op == "BETWEEN":
+            where_conditions.append(f"{field} BETWEEN %s AND %s")
+        else:
+            where_conditions.append(f"{field} {op} %s")
+    return "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+
+def _render_select(shape: tuple) -> str:
+    _, table, fields, group_by, order_by, has_limit, has_offset = shape[:7]
+    select_clause = f"SELECT {', '.join(fields)}" if fields else "SELECT *"
+    group_clause = f"GROUP BY {', '.join(group_by)}" if group_by else ""
+    order_clause = f"ORDER BY {', '.join(order_by)}" if order_by else ""
+    limit_clause = ""
+    if has_limit:
+        limit_clause = "LIMIT %s OFFSET %s" if has_offset else "LIMIT %s"
+    sql_parts = [select_clause, f"FROM {table}", _render_where(shape, 7), group_clause, order_clause, limit_clause]
+    return " ".join(filter(None, sql_parts))
+
+def _render_update(shape: tuple) -> str:
+    table, column_count = shape[1], shape[2]
+    columns = shape[3:3 + column_count]
+    sql = f"UPDATE {table} SET {', '.join(f'{column} = %s' for column in columns)}"
+    where_clause = _render_where(shape, 3 + column_count)
+    return f"{sql} {where_clause}" if where_clause else sql
+
+_RENDERERS = {"select": _render_select, "update": _render_update, "where": lambda shape: _render_where(shape, 1)}
+
+def _compiled(shape: tuple) -> str:
+    """按查询结构取 SQL 模板，未命中时渲染并缓存（超过上限时淘汰最久未使用的一个）"""
+    with _shape_lock:
+        sql = _shape_cache.get(shape)
+        if sql is not None:
+            _shape_cache.move_to_end(shape)
+            _shape_stats["hits"] += 1
+            return sql
+        _shape_stats["misses"] += 1
+    # 渲染不持有锁，并发渲染同一结构的结果相同，后写入的覆盖先写入的
+    sql = _RENDERERS[shape[0]](shape)
+    if QUERY_SHAPE_CACHE_SIZE > 0:
+        with _shape_lock:
+            _shape_cache[shape] = sql
+            _shape_cache.move_to_end(shape)
+            while len(_shape_cache) > QUERY_SHAPE_CACHE_SIZE:
+                _shape_cache.popitem(last=False)
+                _shape_stats["evictions"] += 1
+    return sql
 
 class QueryBuilder:
     """SQL查询构建器"""
@@ -26,114 +155,46 @@ class QueryBuilder:
         Returns:
             (sql语句, 参数列表)
         """
-        # 构建SELECT部分
-        if not fields:
-            select_clause = "SELECT *"
-        else:
-            select_clause = f"SELECT {', '.join(fields)}"
-        
-        # 构建FROM部分
-        from_clause = f"FROM {table}"
-        
-        # 构建WHERE部分
-        where_clause, where_params = QueryBuilder._build_where_clause(conditions)
+        # 按查询结构取缓存的 SQL 模板，每次调用只需遍历一次条件提取参数
+        has_limit = limit is not None
+        shape = ["select", table,
+                 tuple(fields) if fields else None,
+                 tuple(group_by) if group_by else None,
+                 tuple(order_by) if order_by else None,
+                 has_limit,
+                 has_limit and offset is not None]
+        params: List[Any] = []
+        _walk_conditions(conditions, shape, params)
+        sql = _compiled(tuple(shape))
         
-        # 构建GROUP BY部分
-        group_clause = ""
-        if group_by:
-            group_clause = f"GROUP BY {', '.join(group_by)}"
-        
-        # 构建ORDER BY部分
-        order_clause = ""
-        if order_by:
-            order_clause = f"ORDER BY {', '.join(order_by)}"
-        
-        # 构建LIMIT/OFFSET部分
-        limit_clause = ""
-        params = where_params
-        
-        if limit is not None:
-            limit_clause = "LIMIT %s"
+        if has_limit:
             params.append(limit)
-            
             if offset is not None:
-                limit_clause += " OFFSET %s"
                 params.append(offset)
         
-        # 组合SQL语句
-        sql_parts = [select_clause, from_clause, where_clause, group_clause, order_clause, limit_clause]
-        sql = " ".join(filter(None, sql_parts))
-        
         return sql, params
     
     @staticmethod
     def _build_where_clause(conditions: Optional[Dict[str, Any]] = None) -> Tuple[str, List[Any]]:
         """构建WHERE子句"""
-        if not conditions:
-            return "", []
-        
-        where_conditions = []
-        params = []
-        
-        for field, value in conditions.items():
-            if value is None:
-                continue
-                
-            # 处理特殊操作符
-            if isinstance(value, dict):
-                for op, op_value in value.items():
-                    if op == "$gt":
-                        where_conditions.append(f"{field} > %s")
-                        params.append(op_value)
-                    elif op == "$gte":
-                        where_conditions.append(f"{field} >= %s")
-                        params.append(op_value)
-                    elif op == "$lt":
-                        where_conditions.append(f"{field} < %s")
-                        params.append(op_value)
-                    elif op == "$lte":
-                        where_conditions.append(f"{field} <= %s")
-                        params.append(op_value)
-                    elif op == "$ne":
-                        where_conditions.append(f"{field} != %s")
-                        params.append(op_value)
-                    elif op == "$like":
-                        where_conditions.append(f"{field} LIKE %s")
-                        params.append(f"%{op_value}%")
-                    elif op == "$in":
-                        if not op_value:
-                            continue
-                        placeholders = ', '.join(['%s'] * len(op_value))
-                        where_conditions.append(f"{field} IN ({placeholders})")
-                        params.extend(op_value)
-                    elif op == "$between":
-                        if len(op_value) == 2:
-                            where_conditions.append(f"{field} BETWEEN %s AND %s")
-                            params.extend(op_value)
-            elif isinstance(value, list):
-                # IN 查询
-                if not value:
-                    continue
-                placeholders = ', '.join(['%s'] * len(value))
-                where_conditions.append(f"{field} IN ({placeholders})")
-                params.extend(value)
-            elif isinstance(value, str) and '%' in value:
-                # LIKE 查询
-                where_conditions.append(f"{field} LIKE %s")
-                params.append(value)
-            elif isinstance(value, bool):
-                # 布尔值转换
-                where_conditions.append(f"{field} = %s")
-                params.append(1 if value else 0)
-            else:
-                # 普通等值查询
-                where_conditions.append(f"{field} = %s")
-                params.append(value)
-        
-        if where_conditions:
-            return "WHERE " + " AND ".join(where_conditions), params
-        else:
-            return "", params
+        shape: List[Any] = ["where"]
+        params: List[Any] = []
+        _walk_conditions(conditions, shape, params)
+        return _compiled(tuple(shape)), params
+    
+    @staticmethod
+    def shape_cache_info() -> Dict[str, Any]:
+        """SQL 模板缓存的命中统计"""
+        with _shape_lock:
+            total = _shape_stats["hits"] + _shape_stats["misses"]
+            return {
+                "size": len(_shape_cache),
+                "maxsize": QUERY_SHAPE_CACHE_SIZE,
+                "hits": _shape_stats["hits"],
+                "misses": _shape_stats["misses"],
+                "hit_rate": round(_shape_stats["hits"] / total, 4) if total else 0.0,
+                "evictions": _shape_stats["evictions"]
+            }
     
     @staticmethod
     def build_count_query(table: str, 
@@ -178,6 +239,114 @@ class QueryBuilder:
         
         return data_sql, count_sql, data_params, count_params
     
+    @staticmethod
+    def build_keyset_query(table: str,
+                           fields: Optional[List[str]] = None,
+                           conditions: Optional[Dict[str, Any]] = None,
+                           order_column: str = "id",
+                           descending: bool = True,
+                           cursor: Optional[str] = None,
+                           page_size: int = 20) -> Tuple[str, List[Any]]:
+        """
+        构建游标（keyset）分页查询
+
+        按 (order_column, id) 排序，从游标位置继续向后读取，不使用 OFFSET，
+        任意一页的开销都与第一页相同（需要有以 order_column 结尾的索引，InnoDB 二级索引自带主键）。
+        多查询一行用于判断是否还有下一页，下一页游标由 build_next_cursor 根据结果生成。
+
+        Args:
+            table: 表名
+            fields: 查询字段列表，会自动补上 order_column 和 id
+            conditions: 查询条件字典
+            order_column: 排序字段
+            descending: 是否倒序
+            cursor: 上一页返回的游标，为空时查询第一页
+            page_size: 每页条数
+
+        Returns:
+            (sql语句, 参数列表)
+        """
+        if not _IDENTIFIER.match(order_column):
+            raise ValueError(f"不支持的排序字段: {order_column}")
+
+        if fields:
+            fields = list(fields) + [column for column in (order_column, "id") if column not in fields]
+        select_clause = f"SELECT {', '.join(fields)}" if fields else "SELECT *"
+
+        where_clause, params = QueryBuilder._build_where_clause(conditions)
+        if cursor:
+            last_value, last_id = QueryBuilder.decode_cursor(cursor, order_column, descending)
+            op = "<" if descending else ">"
+            keyset_clause = f"({order_column} {op} %s OR ({order_column} = %s AND id {op} %s))"
+            where_clause = f"{where_clause} AND {keyset_clause}" if where_clause else f"WHERE {keyset_clause}"
+            params.extend([last_value, last_value, last_id])
+
+        direction = "DESC" if descending else "ASC"
+        order_clause = f"ORDER BY {order_column} {direction}, id {direction}"
+        params.append(page_size + 1)
+
+        sql_parts = [select_clause, f"FROM {table}", where_clause, order_clause, "LIMIT %s"]
+        return " ".join(filter(None, sql_parts)), params
+
+    @staticmethod
+    def build_next_cursor(rows: List[Dict[str, Any]],
+                          page_size: int,
+                          order_column: str = "id",
+                          descending: bool = True) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        处理 build_keyset_query 的查询结果
+
+        Returns:
+            (当前页数据, 下一页游标；没有下一页时为 None)
+        """
+        if len(rows) <= page_size:
+            return rows, None
+        rows = rows[:page_size]
+        last = rows[-1]
+        return rows, QueryBuilder.encode_cursor(last[order_column], last["id"], order_column, descending)
+
+    @staticmethod
+    def encode_cursor(last_value: Any, last_id: Any, order_column: str, descending: bool) -> str:
+        """生成不透明的分页游标（base64 编码的 JSON，包含排序字段以防混用）"""
+        payload = json.dumps([order_column, int(descending), last_value, last_id], default=str, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str, order_column: str, descending: bool) -> Tuple[Any, Any]:
+        """解析分页游标，返回 (排序字段值, id)；游标无效或与排序方式不符时抛出 ValueError"""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            column, cursor_descending, last_value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+        except Exception:
+            raise ValueError("分页游标无效")
+        if column != order_column or bool(cursor_descending) != descending:
+            raise ValueError("分页游标与排序方式不匹配")
+        return last_value, last_id
+
+    @staticmethod
+    def build_time_range(start_date: Optional[str] = None, end_date: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """
+        按日期构建时间字段的范围条件（起止日期均包含），用于 create_time 等 datetime 字段
+
+        生成 >= 开始日期、< 结束日期次日的半开区间：字段上不套函数，可以走索引，分区表可以裁剪分区；
+        BETWEEN '2024-01-01' AND '2024-01-31' 会漏掉最后一天 0 点之后的数据。日期格式无效时抛出 ValueError。
+        """
+        time_range: Dict[str, str] = {}
+        try:
+            if start_date:
+                time_range["$gte"] = date.fromisoformat(str(start_date)[:10]).isoformat()
+            if end_date:
+                time_range["$lt"] = (date.fromisoformat(str(end_date)[:10]) + timedelta(days=1)).isoformat()
+        except ValueError:
+            raise ValueError("日期格式应为 YYYY-MM-DD") from None
+        return time_range or None
+
+    @staticmethod
+    def build_explain_query(table: str, conditions: Optional[Dict[str, Any]] = None) -> Tuple[str, List[Any]]:
+        """构建估算行数的 EXPLAIN 语句（读取执行计划中的 rows，代替 COUNT(*)）"""
+        sql, params = QueryBuilder.build_select_query(table, fields=["id"], conditions=conditions)
+        return f"EXPLAIN {sql}", params
+
     @staticmethod
     def build_insert_query(table: str, data: Dict[str, Any]) -> Tuple[str, List[Any]]:
         """
@@ -222,31 +391,76 @@ class QueryBuilder:
         sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join(values_list)}"
         return sql, params
     
+    @staticmethod
+    def build_insert_many_query(table: str, data_list: List[Dict[str, Any]]) -> Tuple[str, List[tuple]]:
+        """
+        构建 executemany 使用的 INSERT 语句
+
+        与 build_batch_insert_query 不同，SQL 中只有一组占位符，
+        每行数据对应一个参数元组，由驱动按 max_allowed_packet 拆分发送。
+        """
+        if not data_list:
+            raise ValueError("数据列表不能为空")
+        
+        columns = list(data_list[0].keys())
+        placeholders = ', '.join(['%s'] * len(columns))
+        params_list = [tuple(data.get(column) for column in columns) for data in data_list]
+        
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+        return sql, params_list
+    
+    @staticmethod
+    def build_upsert_query(table: str,
+                           data_list: List[Dict[str, Any]],
+                           update_columns: Optional[List[str]] = None,
+                           ignore: bool = False) -> Tuple[str, List[tuple]]:
+        """
+        构建 executemany 使用的 UPSERT 语句
+
+        Args:
+            table: 表名
+            data_list: 数据列表，字段以第一行为准
+            update_columns: 唯一键冲突时需要更新的字段（ignore=False 时必填）
+            ignore: True 时使用 INSERT IGNORE，冲突行直接跳过
+            
+        Returns:
+            (sql语句, 每行参数元组列表)
+        """
+        if not data_list:
+            raise ValueError("数据列表不能为空")
+        
+        columns = list(data_list[0].keys())
+        placeholders = ', '.join(['%s'] * len(columns))
+        params_list = [tuple(data.get(column) for column in columns) for data in data_list]
+        
+        if ignore:
+            sql = f"INSERT IGNORE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+            return sql, params_list
+        
+        if not update_columns:
+            raise ValueError("更新字段不能为空")
+        
+        update_clause = ', '.join(f"{column} = VALUES({column})" for column in update_columns)
+        sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+               f"ON DUPLICATE KEY UPDATE {update_clause}")
+        return sql, params_list
+    
     @staticmethod
     def build_update_query(table: str, 
                           data: Dict[str, Any],
                           conditions: Optional[Dict[str, Any]] = None) -> Tuple[str, List[Any]]:
         """
-        构建UPDATE语句
+        构建UPDATE语句（值为 None 的字段不更新）
         """
-        set_clause = []
-        params = []
-        
+        shape: List[Any] = ["update", table, 0]
+        params: List[Any] = []
         for column, value in data.items():
             if value is not None:
-                set_clause.append(f"{column} = %s")
+                shape.append(column)
                 params.append(value)
-        
-        if not set_clause:
+        if not params:
             raise ValueError("更新数据不能为空")
+        shape[2] = len(params)
         
-        sql = f"UPDATE {table} SET {', '.join(set_clause)}"
-        
-        # 添加WHERE条件
-        if conditions:
-            where_clause, where_params = QueryBuilder._build_where_clause(conditions)
-            if where_clause:
-                sql += " " + where_clause
-                params.extend(where_params)
-        
-        return sql, params
\ No newline at end of file
+        _walk_conditions(conditions, shape, params)
+        return _compiled(tuple(shape)), params
\ No newline at end of file
@@ -0,0 +1,133 @@
+from typing import Dict, List, Optional, Any
+from datetime import datetime
+from services.dao.base_dao import BaseDAO
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# t_recall 的全部字段，归档表在此基础上增加 archive_time
+RECALL_COLUMNS = [
+    "id", "merchant_id", "user_name", "token", "token_expired", "contact", "contact_type",
+    "product", "product_type", "coupon_type", "coupon_value", "click", "claim", "writeoff",
+    "click_time", "claim_time", "writeoff_time", "create_time", "update_time"
+]
+
+class RecallArchiveDAO(BaseDAO):
+    """
+    过期召回记录归档数据访问对象
+
+    把令牌过期且从未点击的召回记录按主键顺序分批移入 t_recall_archive（或直接删除），
+    每批一个短事务，进度记录在 t_recall_retention_progress 中，中断后从上次的位置继续。
+    """
+
+    def __init__(self):
+        super().__init__("t_recall_archive")
+        self.progress_table = "t_recall_retention_progress"
+
+    def get_progress(self, job_name: str) -> Dict[str, Any]:
+        """读取任务进度，没有记录时从头开始"""
+        results = self.execute_query(
+            f"SELECT last_id, processed FROM {self.progress_table} WHERE job_name = %s",
+            (job_name,)
+        )
+        return results[0] if results else {"last_id": 0, "processed": 0}
+
+    def reset_progress(self, job_name: str) -> int:
+        return self.execute_update(f"DELETE FROM {self.progress_table} WHERE job_name = %s", (job_name,))
+
+    def purge_expired(self,
+                      before_date: datetime,
+                      delete_only: bool = False,
+                      chunk_size: int = 500,
+                      sleep_seconds: float = 0.0,
+                      max_chunks: Optional[int] = None,
+                      job_name: Optional[str] = None) -> int:
+        """
+        分批归档（delete_only 时直接删除）令牌在 before_date 之前过期且未点击的召回记录，返回处理的行数
+
+        每批按主键读取 chunk_size 行，只处理到第一条尚未过期的未点击记录为止：
+        主键顺序与创建顺序一致，之后的记录更新，进度停在这里，下次运行时继续。
+        已点击的记录保留，直接越过。
+        """
+        job_name = job_name or ("recall_delete" if delete_only else "recall_archive")
+        last_id = self.get_progress(job_name)["last_id"]
+        total = 0
+        chunks = 0
+
+        while max_chunks is None or chunks < max_chunks:
+            window = self.execute_query(
+                "SELECT id, click, token_expired FROM t_recall WHERE id > %s ORDER BY id LIMIT %s",
+                (last_id, chunk_size)
+            )
+            if not window:
+                break
+
+            ids: List[int] = []
+            frontier = last_id
+            reached_unexpired = False
+            for row in window:
+                if row["click"]:
+                    frontier = row["id"]
+                    continue
+                if row["token_expired"] >= before_date:
+                    reached_unexpired = True
+                    break
+                ids.append(row["id"])
+                frontier = row["id"]
+
+            if frontier > last_id:
+                total += self._purge_chunk(ids, before_date, delete_only, job_name, frontier)
+                last_id = frontier
+                chunks += 1
+            if reached_unexpired or len(window) < chunk_size:
+                break
+            if sleep_seconds:
+                # 批次之间暂停，给复制和线上写入让路
+                time.sleep(sleep_seconds)
+
+        logger.info(f"过期召回记录{'删除' if delete_only else '归档'}完成: {total} 条，{chunks} 批，进度 id={last_id}")
+        return total
+
+    def _purge_chunk(self, ids: List[int], before_date: datetime, delete_only: bool,
+                     job_name: str, frontier: int) -> int:
+        """在一个事务中锁定、归档、删除一批记录并推进进度，返回删除的行数"""
+        try:
+            with self._transaction() as conn:
+                with conn.cursor() as cursor:
+                    purged: List[int] = []
+                    if ids:
+                        placeholders = ', '.join(['%s'] * len(ids))
+                        # 重新校验条件并加锁，读取窗口后才被点击的记录不处理
+                        cursor.execute(
+                            f"""
+                            SELECT id FROM t_recall
+                            WHERE id IN ({placeholders}) AND click = 0 AND token_expired < %s
+                            FOR UPDATE
+                            """,
+                            (*ids, before_date)
+                        )
+                        purged = [row["id"] for row in cursor.fetchall()]
+                    if purged:
+                        placeholders = ', '.join(['%s'] * len(purged))
+                        if not delete_only:
+                            cursor.execute(
+                                f"""
+                                INSERT IGNORE INTO {self.table_name} ({', '.join(RECALL_COLUMNS)}, archive_time)
+                                SELECT {', '.join(RECALL_COLUMNS)}, NOW() FROM t_recall WHERE id IN ({placeholders})
+                                """,
+                                tuple(purged)
+                            )
+                        cursor.execute(f"DELETE FROM t_recall WHERE id IN ({placeholders})", tuple(purged))
+                    cursor.execute(
+                        f"""
+                        INSERT INTO {self.progress_table} (job_name, last_id, processed)
+                        VALUES (%s, %s, %s)
+                        ON DUPLICATE KEY UPDATE last_id = VALUES(last_id), processed = processed + VALUES(processed)
+                        """,
+                        (job_name, frontier, len(purged))
+                    )
+                return len(purged)
+        except Exception as e:
+            logger.error(f"归档过期召回记录失败(id <= {frontier}): {str(e)}")
+            raise
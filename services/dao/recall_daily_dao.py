@@ -0,0 +1,305 @@
+from typing import Dict, List, Optional, Any, Tuple
+from datetime import date, timedelta
+from services.dao.base_dao import BaseDAO
+from services.dao.query_builder import QueryBuilder
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 召回状态字段 -> 每日汇总计数字段
+RECALL_COUNTERS = {
+    "click": "clicked_count",
+    "claim": "claimed_count",
+    "writeoff": "writeoff_count"
+}
+
+class RecallDailyDAO(BaseDAO):
+    """
+    商家每日召回漏斗汇总数据访问对象
+
+    t_recall_daily 按 (merchant_id, recall_date) 保存召回数和点击/领取/核销数，
+    创建召回记录和状态从 0 变为 1 时在同一事务中增量更新。
+    过期数随时间变化无法增量维护，汇总表记录当天令牌的最早/最晚过期时间：
+    全部过期或全部未过期的日期直接得出，只有正在过期的日期（通常 1~2 天）回查明细。
+    """
+
+    def __init__(self):
+        super().__init__("t_recall_daily")
+
+    def build_increment_query(self, recalls_data: List[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+        """
+        构建新增召回记录累加到每日汇总的语句
+
+        召回记录须带有写入 t_recall 的 create_time（见 BaseDAO._with_create_time），汇总日期由它得出，
+        与状态变更时按 DATE(t_recall.create_time) 定位的日期一致。
+        """
+        groups: Dict[Tuple[Any, str], Dict[str, Any]] = {}
+        for recall in recalls_data:
+            create_time = recall["create_time"]
+            token_expired = recall.get("token_expired")
+            key = (recall.get("merchant_id"), str(create_time)[:10])
+            group = groups.get(key)
+            if group is None:
+                groups[key] = {
+                    "total_recalls": 1,
+                    "min_token_expired": token_expired,
+                    "max_token_expired": token_expired,
+                    "first_recall_time": create_time,
+                    "last_recall_time": create_time
+                }
+                continue
+            group["total_recalls"] += 1
+            if str(token_expired) < str(group["min_token_expired"]):
+                group["min_token_expired"] = token_expired
+            if str(token_expired) > str(group["max_token_expired"]):
+                group["max_token_expired"] = token_expired
+            if str(create_time) < str(group["first_recall_time"]):
+                group["first_recall_time"] = create_time
+            if str(create_time) > str(group["last_recall_time"]):
+                group["last_recall_time"] = create_time
+
+        columns = ["merchant_id", "recall_date", "total_recalls", "min_token_expired",
+                   "max_token_expired", "first_recall_time", "last_recall_time"]
+        params: List[Any] = []
+        # 并发写入时按相同顺序加锁，避免死锁
+        for key in sorted(groups, key=lambda item: (str(item[0]), item[1])):
+            group = groups[key]
+            params.extend([key[0], key[1]] + [group[column] for column in columns[2:]])
+        placeholders = ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(groups))
+
+        sql = f"""
+        INSERT INTO {self.table_name} ({', '.join(columns)})
+        VALUES {placeholders}
+        ON DUPLICATE KEY UPDATE
+            total_recalls = total_recalls + VALUES(total_recalls),
+            min_token_expired = LEAST(min_token_expired, VALUES(min_token_expired)),
+            max_token_expired = GREATEST(max_token_expired, VALUES(max_token_expired)),
+            first_recall_time = LEAST(first_recall_time, VALUES(first_recall_time)),
+            last_recall_time = GREATEST(last_recall_time, VALUES(last_recall_time))
+        """
+        return sql, params
+
+    def build_transition_query(self, conditions: Dict[str, Any], flag: str) -> Tuple[str, tuple]:
+        """
+        构建单条召回记录状态变为 1 后累加计数的语句，需在状态更新成功后于同一事务中执行
+
+        conditions 为定位召回记录的等值条件：签名令牌为 {"id", "merchant_id"}，旧格式令牌为 {"token"}
+        """
+        counter = RECALL_COUNTERS[flag]
+        where = " AND ".join(f"r.{column} = %s" for column in conditions)
+        sql = f"""
+        UPDATE {self.table_name} d
+        JOIN t_recall r ON d.merchant_id = r.merchant_id AND d.recall_date = DATE(r.create_time)
+        SET d.{counter} = d.{counter} + 1
+        WHERE {where}
+        """
+        return sql, tuple(conditions.values())
+
+    def build_claim_query(self, merchant_id: Any, recall_date: Any, clicked: bool) -> Tuple[str, tuple]:
+        """
+        构建领取成功后累加计数的语句：领取数加 1，领取时补记了点击（领取前 click = 0）时点击数一并加 1
+
+        商家和日期取自领取前锁定的召回记录，直接按汇总表的唯一键更新。
+        """
+        sql = f"""
+        UPDATE {self.table_name}
+        SET claimed_count = claimed_count + 1, clicked_count = clicked_count + %s
+        WHERE merchant_id = %s AND recall_date = %s
+        """
+        return sql, (1 if clicked else 0, merchant_id, recall_date)
+
+    def build_transition_lock_query(self, keys: List[Tuple[Any, Any]], tokens: List[str],
+                                    flag: str) -> Tuple[str, List[Any]]:
+        """
+        构建批量状态变更前锁定待变更记录的语句
+
+        keys 为签名令牌中的 (召回ID, 商家ID)，按主键定位；tokens 为旧格式令牌，按 token 唯一索引定位。
+        在状态更新前于同一事务中执行，返回实际会从 0 变为 1 的每条记录的主键、token、商家和日期。
+        """
+        if flag not in RECALL_COUNTERS:
+            raise ValueError(f"不支持的召回状态字段: {flag}")
+        lookups = []
+        params: List[Any] = []
+        if keys:
+            lookups.extend(["(id = %s AND merchant_id = %s)"] * len(keys))
+            for recall_id, merchant_id in keys:
+                params.extend([recall_id, merchant_id])
+        if tokens:
+            lookups.append(f"token IN ({', '.join(['%s'] * len(tokens))})")
+            params.extend(tokens)
+        sql = f"""
+        SELECT id, token, merchant_id, DATE(create_time) AS recall_date
+        FROM t_recall
+        WHERE ({' OR '.join(lookups)}) AND {flag} = 0
+        FOR UPDATE
+        """
+        return sql, params
+
+    def build_counter_queries(self, rows: List[Dict[str, Any]], flag: str) -> List[Tuple[str, tuple]]:
+        """根据 build_transition_lock_query 锁定的记录，按 (商家, 日期) 构建累加计数的语句"""
+        counter = RECALL_COUNTERS[flag]
+        totals: Dict[Tuple[Any, Any], int] = {}
+        for row in rows:
+            key = (row["merchant_id"], row["recall_date"])
+            totals[key] = totals.get(key, 0) + 1
+        return [
+            (f"UPDATE {self.table_name} SET {counter} = {counter} + %s WHERE merchant_id = %s AND recall_date = %s",
+             (total, merchant_id, recall_date))
+            for (merchant_id, recall_date), total in sorted(totals.items(), key=lambda item: (str(item[0][0]), str(item[0][1])))
+        ]
+
+    def build_refresh_queries(self, recall_date: str, merchant_id: Optional[int] = None) -> List[Tuple[str, List[Any]]]:
+        """
+        构建按召回明细重算某一天汇总的语句，merchant_id 为空时重算所有商家
+
+        已归档到 t_recall_archive 的过期记录一并统计，清理明细后重建的汇总与清理前一致。
+        """
+        merchant_clause = "AND merchant_id = %s" if merchant_id is not None else ""
+        merchant_params = [merchant_id] if merchant_id is not None else []
+        day_start = str(recall_date)[:10]
+
+        return [
+            (f"DELETE FROM {self.table_name} WHERE recall_date = %s {merchant_clause}",
+             [day_start] + merchant_params),
+            (f"""
+            INSERT INTO {self.table_name} (merchant_id, recall_date, total_recalls, clicked_count, claimed_count,
+                                           writeoff_count, min_token_expired, max_token_expired,
+                                           first_recall_time, last_recall_time)
+            SELECT merchant_id, %s, COUNT(*), SUM(click), SUM(claim), SUM(writeoff),
+                   MIN(token_expired), MAX(token_expired), MIN(create_time), MAX(create_time)
+            FROM (
+                SELECT merchant_id, click, claim, writeoff, token_expired, create_time
+                FROM t_recall
+                WHERE create_time >= %s AND create_time < %s + INTERVAL 1 DAY {merchant_clause}
+                UNION ALL
+                SELECT merchant_id, click, claim, writeoff, token_expired, create_time
+                FROM t_recall_archive
+                WHERE create_time >= %s AND create_time < %s + INTERVAL 1 DAY {merchant_clause}
+            ) r
+            GROUP BY merchant_id
+            """, [day_start] + ([day_start, day_start] + merchant_params) * 2)
+        ]
+
+    def rebuild_days(self, start_date: str, end_date: str, merchant_id: Optional[int] = None) -> int:
+        """按 t_recall（含归档）逐天重建每日汇总，每天一个事务，返回处理的天数"""
+        day = date.fromisoformat(str(start_date)[:10])
+        last_day = date.fromisoformat(str(end_date)[:10])
+        days = 0
+        while day <= last_day:
+            try:
+                self.execute_in_transaction(self.build_refresh_queries(day.isoformat(), merchant_id))
+            except Exception as e:
+                logger.error(f"重建每日召回汇总失败({day}): {str(e)}")
+                raise
+            day += timedelta(days=1)
+            days += 1
+        return days
+
+    def get_daily_recall_stats(self,
+                              merchant_id: int,
+                              start_date: str,
+                              end_date: str) -> List[Dict]:
+        """获取每日召回统计（读每日汇总，每天一行）"""
+        try:
+            rows = self._query_days(merchant_id, start_date, end_date)
+            self._fill_expired_counts(rows)
+        except Exception as e:
+            logger.error(f"获取每日召回统计失败: {str(e)}")
+            return []
+
+        return [
+            {
+                "recall_date": row["recall_date"],
+                "total_recalls": row["total_recalls"],
+                "clicked_count": row["clicked_count"],
+                "claimed_count": row["claimed_count"],
+                "writeoff_count": row["writeoff_count"],
+                "expired_count": row["expired_count"]
+            }
+            for row in rows
+        ]
+
+    def get_recall_stats(self,
+                        merchant_id: Optional[int] = None,
+                        start_date: Optional[str] = None,
+                        end_date: Optional[str] = None) -> Dict:
+        """获取召回统计（读每日汇总，按天粒度过滤，起止日期均包含）"""
+        try:
+            rows = self._query_days(merchant_id, start_date, end_date)
+            self._fill_expired_counts(rows)
+        except Exception as e:
+            logger.error(f"获取召回统计失败: {str(e)}")
+            return {}
+        if not rows:
+            return {}
+
+        stats = {
+            key: sum(row[key] for row in rows)
+            for key in ("total_recalls", "clicked_count", "claimed_count", "writeoff_count", "expired_count")
+        }
+        total = stats["total_recalls"]
+        for key, count_key in (("click_rate", "clicked_count"), ("claim_rate", "claimed_count"),
+                               ("writeoff_rate", "writeoff_count")):
+            stats[key] = round(stats[count_key] / total * 100, 2) if total else 0.0
+        stats["earliest_recall"] = min(row["first_recall_time"] for row in rows)
+        stats["latest_recall"] = max(row["last_recall_time"] for row in rows)
+        return stats
+
+    def _query_days(self,
+                    merchant_id: Optional[int],
+                    start_date: Optional[str],
+                    end_date: Optional[str]) -> List[Dict]:
+        conditions: Dict[str, Any] = {}
+        if merchant_id:
+            conditions["merchant_id"] = merchant_id
+        if start_date and end_date:
+            conditions["recall_date"] = {"$between": [str(start_date)[:10], str(end_date)[:10]]}
+        elif start_date:
+            conditions["recall_date"] = {"$gte": str(start_date)[:10]}
+        elif end_date:
+            conditions["recall_date"] = {"$lte": str(end_date)[:10]}
+
+        sql, params = QueryBuilder.build_select_query(
+            self.table_name,
+            fields=[
+                "merchant_id",
+                "recall_date",
+                "total_recalls",
+                "clicked_count",
+                "claimed_count",
+                "writeoff_count",
+                # NULL 表示当天的令牌正在过期，需要回查明细
+                "CASE WHEN max_token_expired < NOW() THEN total_recalls "
+                "WHEN min_token_expired >= NOW() THEN 0 END as expired_count",
+                "first_recall_time",
+                "last_recall_time"
+            ],
+            conditions=conditions,
+            order_by=["recall_date", "merchant_id"]
+        )
+        return self.execute_query(sql, tuple(params))
+
+    def _fill_expired_counts(self, rows: List[Dict]) -> None:
+        """回查正在过期的日期的过期数"""
+        partial = [row for row in rows if row["expired_count"] is None]
+        if not partial:
+            return
+
+        ranges = []
+        params: List[Any] = []
+        for row in partial:
+            ranges.append("(merchant_id = %s AND create_time >= %s AND create_time < %s + INTERVAL 1 DAY)")
+            params.extend([row["merchant_id"], row["recall_date"], row["recall_date"]])
+        sql = f"""
+        SELECT merchant_id, DATE(create_time) as recall_date, COUNT(*) as expired_count
+        FROM t_recall
+        WHERE token_expired < NOW() AND ({' OR '.join(ranges)})
+        GROUP BY merchant_id, DATE(create_time)
+        """
+
+        counts = {
+            (result["merchant_id"], str(result["recall_date"])): result["expired_count"]
+            for result in self.execute_query(sql, tuple(params))
+        }
+        for row in partial:
+            row["expired_count"] = counts.get((row["merchant_id"], str(row["recall_date"])), 0)
@@ -1,24 +1,56 @@
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Tuple, Iterator, AsyncIterator
+from contextlib import contextmanager, asynccontextmanager
 from datetime import datetime, timedelta
 from services.dao.base_dao import BaseDAO
 from services.dao.query_builder import QueryBuilder
+from services.dao.recall_daily_dao import RecallDailyDAO
+from services.dao.recall_archive_dao import RecallArchiveDAO
+from services.dao.outbox_dao import outbox_channel, OUTBOX_PENDING, OUTBOX_FAILED
+from db.unit_of_work import current_unit_of_work, current_unit_of_work_async
+from utils.cache.ttl_cache import TTLCache
+from utils.token.recall_token import (
+    RecallTokenSigner, RecallTokenClaims, TOKEN_VALID, TOKEN_LEGACY, TOKEN_INVALID, TOKEN_EXPIRED
+)
 import logging
+import pymysql
+import os
 
 logger = logging.getLogger(__name__)
 
+# token -> 召回记录 缓存配置（落地页和领取接口的热点查询）
+RECALL_CACHE_SIZE = int(os.getenv("RECALL_CACHE_SIZE", "10000"))
+RECALL_CACHE_TTL = float(os.getenv("RECALL_CACHE_TTL", "60"))
+# 等待同一商家的其他召回任务创建完成的最长秒数
+RECALL_CREATE_LOCK_TIMEOUT = int(os.getenv("RECALL_CREATE_LOCK_TIMEOUT", "30"))
+
+# 领取优惠券结果
+CLAIM_SUCCESS = "claimed"
+CLAIM_NOT_FOUND = "not_found"
+CLAIM_USER_MISMATCH = "user_mismatch"
+CLAIM_ALREADY_CLAIMED = "already_claimed"
+CLAIM_EXPIRED = "expired"
+
 class RecallDAO(BaseDAO):
     """召回记录数据访问对象"""
     
     def __init__(self):
         super().__init__("t_recall")
+        self.token_cache = TTLCache(maxsize=RECALL_CACHE_SIZE, ttl=RECALL_CACHE_TTL)
+        self.token_signer = RecallTokenSigner()
+        # 召回ID -> token（短链接解析用，对应关系不会变化）
+        self.id_token_cache = TTLCache(maxsize=RECALL_CACHE_SIZE, ttl=RECALL_CACHE_TTL)
+        self.token_checks = {TOKEN_VALID: 0, TOKEN_LEGACY: 0, TOKEN_INVALID: 0, TOKEN_EXPIRED: 0}
+        self.recall_daily_dao = RecallDailyDAO()
+        self.recall_archive_dao = RecallArchiveDAO()
     
     def create_recall(self, recall_data: Dict[str, Any]) -> int:
         """创建召回记录"""
+        recall_data = self._with_create_time([recall_data])[0]
         sql, params = QueryBuilder.build_insert_query(self.table_name, recall_data)
+        rollup_query = self.recall_daily_dao.build_increment_query([recall_data])
         
         try:
-            affected_rows = self.execute_update(sql, tuple(params))
-            return affected_rows
+            return self._update_with_rollup(sql, tuple(params), rollup_query)
         except Exception as e:
             logger.error(f"创建召回记录失败: {str(e)}")
             raise
@@ -27,16 +59,118 @@ class RecallDAO(BaseDAO):
         """批量创建召回记录"""
         if not recalls_data:
             return 0
+        recalls_data = self._with_create_time(recalls_data)
         
         sql, params = QueryBuilder.build_batch_insert_query(self.table_name, recalls_data)
+        rollup_query = self.recall_daily_dao.build_increment_query(recalls_data)
         
         try:
-            affected_rows = self.execute_update(sql, tuple(params))
-            return affected_rows
+            return self._update_with_rollup(sql, tuple(params), rollup_query)
+        except Exception as e:
+            logger.error(f"批量创建召回记录失败: {str(e)}")
+            raise
+    
+    async def batch_create_recalls_async(self, recalls_data: List[Dict[str, Any]]) -> int:
+        """批量创建召回记录（异步）"""
+        if not recalls_data:
+            return 0
+        recalls_data = self._with_create_time(recalls_data)
+        
+        sql, params = QueryBuilder.build_batch_insert_query(self.table_name, recalls_data)
+        rollup_query = self.recall_daily_dao.build_increment_query(recalls_data)
+        
+        try:
+            return await self._update_with_rollup_async(sql, tuple(params), rollup_query)
         except Exception as e:
             logger.error(f"批量创建召回记录失败: {str(e)}")
             raise
     
+    def batch_create_recalls_with_outbox(self, recalls_data: List[Dict[str, Any]], job_id: str) -> int:
+        """
+        批量创建召回记录，并在同一事务中写入发件箱和每日汇总，由各渠道的发送 worker 异步发送
+
+        发件箱的发送渠道按联系方式类型确定（见 outbox_dao.OUTBOX_CHANNELS），没有发送渠道的直接记为发送失败。
+        """
+        if not recalls_data:
+            return 0
+        recalls_data = self._with_create_time(recalls_data)
+        
+        sql, params = QueryBuilder.build_batch_insert_query(self.table_name, recalls_data)
+        outbox_sql, outbox_params = self._build_outbox_insert(recalls_data, job_id)
+        rollup_sql, rollup_params = self.recall_daily_dao.build_increment_query(recalls_data)
+        
+        try:
+            with self._transaction() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(sql, tuple(params))
+                    affected_rows = cursor.rowcount
+                    cursor.executemany(outbox_sql, outbox_params)
+                    cursor.execute(rollup_sql, tuple(rollup_params))
+                return affected_rows
+        except Exception as e:
+            logger.error(f"批量创建召回记录失败: {str(e)}")
+            raise
+    
+    async def batch_create_recalls_with_outbox_async(self, recalls_data: List[Dict[str, Any]], job_id: str) -> int:
+        """批量创建召回记录并写入发件箱（异步，同一事务）"""
+        if not recalls_data:
+            return 0
+        recalls_data = self._with_create_time(recalls_data)
+        
+        sql, params = QueryBuilder.build_batch_insert_query(self.table_name, recalls_data)
+        outbox_sql, outbox_params = self._build_outbox_insert(recalls_data, job_id)
+        rollup_sql, rollup_params = self.recall_daily_dao.build_increment_query(recalls_data)
+        
+        try:
+            async with self._transaction_async() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(sql, tuple(params))
+                    affected_rows = cursor.rowcount
+                    await cursor.executemany(outbox_sql, outbox_params)
+                    await cursor.execute(rollup_sql, tuple(rollup_params))
+                return affected_rows
+        except Exception as e:
+            logger.error(f"批量创建召回记录失败: {str(e)}")
+            raise
+    
+    @staticmethod
+    def _build_outbox_insert(recalls_data: List[Dict[str, Any]], job_id: str) -> Tuple[str, List[tuple]]:
+        outbox_rows = []
+        for recall in recalls_data:
+            channel = outbox_channel(recall.get("contact_type"))
+            outbox_rows.append({
+                "job_id": job_id,
+                "merchant_id": recall.get("merchant_id"),
+                "recall_token": recall.get("token"),
+                # 没有发送渠道的联系方式直接记为失败，任务进度中可以看到，不会一直处于发送中
+                "channel": channel or str(recall.get("contact_type"))[:20],
+                "status": OUTBOX_PENDING if channel else OUTBOX_FAILED,
+                "error": None if channel else f"不支持的联系方式类型: {recall.get('contact_type')}"
+            })
+        return QueryBuilder.build_insert_many_query("t_recall_outbox", outbox_rows)
+    
+    def _update_with_rollup(self, sql: str, params: tuple, rollup_query: Tuple[str, Any]) -> int:
+        """执行写入语句，有影响行时在同一事务中更新每日汇总，返回写入语句的影响行数"""
+        with self._transaction() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params)
+                affected_rows = cursor.rowcount
+                if affected_rows:
+                    rollup_sql, rollup_params = rollup_query
+                    cursor.execute(rollup_sql, tuple(rollup_params))
+            return affected_rows
+    
+    async def _update_with_rollup_async(self, sql: str, params: tuple, rollup_query: Tuple[str, Any]) -> int:
+        """执行写入语句并在同一事务中更新每日汇总（异步）"""
+        async with self._transaction_async() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(sql, params)
+                affected_rows = cursor.rowcount
+                if affected_rows:
+                    rollup_sql, rollup_params = rollup_query
+                    await cursor.execute(rollup_sql, tuple(rollup_params))
+            return affected_rows
+    
     def get_recall_by_id(self, recall_id: int) -> Optional[Dict]:
         """根据ID获取召回记录"""
         conditions = {"id": recall_id}
@@ -52,16 +186,78 @@ class RecallDAO(BaseDAO):
             logger.error(f"获取召回记录失败: {str(e)}")
             return None
     
+    def _check_token(self, token: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        校验令牌，返回 (校验结果, 查询条件)
+
+        签名令牌按令牌中的主键和商家ID查询，旧格式的随机令牌按 token 唯一索引查询；
+        无效和已过期的令牌没有查询条件，调用方直接拒绝，不访问数据库。
+        """
+        status, claims = self.token_signer.verify(token)
+        self.token_checks[status] += 1
+        if status == TOKEN_EXPIRED:
+            return status, None
+        return status, self._token_conditions(token, status, claims)
+    
+    def _write_conditions(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        状态写入时定位召回记录的条件，不计入令牌校验统计（请求入口已校验过一次）
+
+        已过期的签名令牌仍按主键定位：过期前打开落地页的点击可能在写缓冲中过期后才落库。
+        """
+        return self._token_conditions(token, *self.token_signer.verify(token))
+    
+    @staticmethod
+    def _token_conditions(token: str, status: str, claims: Optional[RecallTokenClaims]) -> Optional[Dict[str, Any]]:
+        """签名令牌按主键和商家ID定位，旧格式令牌按 token 定位，无效令牌返回 None"""
+        if claims is not None:
+            return {"id": claims.recall_id, "merchant_id": claims.merchant_id}
+        if status == TOKEN_LEGACY:
+            return {"token": token}
+        return None
+    
     def get_recall_by_token(self, token: str) -> Optional[Dict]:
-        """根据token获取召回记录"""
-        conditions = {"token": token}
+        """根据token获取召回记录（先校验令牌，再读缓存）"""
+        status, conditions = self._check_token(token)
+        if conditions is None:
+            return None
+        cached = self.token_cache.get(token)
+        if cached is not None:
+            return dict(cached)
+        
         sql, params = QueryBuilder.build_select_query(
             self.table_name,
             conditions=conditions
         )
         try:
             results = self.execute_query(sql, tuple(params))
-            return results[0] if results else None
+            if not results:
+                return None
+            self.token_cache.set(token, results[0])
+            return dict(results[0])
+        except Exception as e:
+            logger.error(f"获取召回记录失败: {str(e)}")
+            return None
+    
+    async def get_recall_by_token_async(self, token: str) -> Optional[Dict]:
+        """根据token获取召回记录（异步，先校验令牌，再读缓存）"""
+        status, conditions = self._check_token(token)
+        if conditions is None:
+            return None
+        cached = self.token_cache.get(token)
+        if cached is not None:
+            return dict(cached)
+        
+        sql, params = QueryBuilder.build_select_query(
+            self.table_name,
+            conditions=conditions
+        )
+        try:
+            results = await self.execute_query_async(sql, tuple(params))
+            if not results:
+                return None
+            self.token_cache.set(token, results[0])
+            return dict(results[0])
         except Exception as e:
             logger.error(f"获取召回记录失败: {str(e)}")
             return None
@@ -82,7 +278,9 @@ class RecallDAO(BaseDAO):
         )
         
         try:
-            return self.execute_update(sql, tuple(params))
+            affected_rows = self.execute_update(sql, tuple(params))
+            self.token_cache.remove_where(lambda recall: recall.get("id") == recall_id)
+            return affected_rows
         except Exception as e:
             logger.error(f"更新召回记录失败: {str(e)}")
             raise
@@ -94,7 +292,39 @@ class RecallDAO(BaseDAO):
             "click_time": click_time or datetime.now()
         }
         
-        conditions = {"token": token}
+        key = self._write_conditions(token)
+        if key is None:
+            return 0
+        # 只更新状态为 0 的记录，状态实际变化时才累加每日汇总
+        conditions = {**key, "click": 0}
+        
+        sql, params = QueryBuilder.build_update_query(
+            self.table_name,
+            update_data,
+            conditions
+        )
+        
+        try:
+            rollup_query = self.recall_daily_dao.build_transition_query(key, "click")
+            affected_rows = self._update_with_rollup(sql, tuple(params), rollup_query)
+            self._sync_cached_recall(token, update_data, affected_rows)
+            return affected_rows
+        except Exception as e:
+            logger.error(f"标记点击失败: {str(e)}")
+            raise
+    
+    async def mark_recall_clicked_async(self, token: str, click_time: Optional[datetime] = None) -> int:
+        """标记召回记录为已点击（异步）"""
+        update_data = {
+            "click": 1,
+            "click_time": click_time or datetime.now()
+        }
+        
+        key = self._write_conditions(token)
+        if key is None:
+            return 0
+        # 只更新状态为 0 的记录，状态实际变化时才累加每日汇总
+        conditions = {**key, "click": 0}
         
         sql, params = QueryBuilder.build_update_query(
             self.table_name,
@@ -103,11 +333,67 @@ class RecallDAO(BaseDAO):
         )
         
         try:
-            return self.execute_update(sql, tuple(params))
+            rollup_query = self.recall_daily_dao.build_transition_query(key, "click")
+            affected_rows = await self._update_with_rollup_async(sql, tuple(params), rollup_query)
+            self._sync_cached_recall(token, update_data, affected_rows)
+            return affected_rows
         except Exception as e:
             logger.error(f"标记点击失败: {str(e)}")
             raise
     
+    async def mark_recalls_clicked_batch_async(self, tokens: List[str], click_time: Optional[datetime] = None) -> int:
+        """批量标记召回记录为已点击（异步），已点击的记录不会重复更新"""
+        if not tokens:
+            return 0
+        
+        update_data = {
+            "click": 1,
+            "click_time": click_time or datetime.now()
+        }
+        
+        # 签名令牌按 (主键, 商家ID) 定位，旧格式令牌按 token 定位，无效令牌跳过
+        keys: List[Tuple[int, int]] = []
+        legacy_tokens: List[str] = []
+        for token in tokens:
+            key = self._write_conditions(token)
+            if key is None:
+                continue
+            if "token" in key:
+                legacy_tokens.append(token)
+            else:
+                keys.append((key["id"], key["merchant_id"]))
+        if not keys and not legacy_tokens:
+            return 0
+        
+        lock_sql, lock_params = self.recall_daily_dao.build_transition_lock_query(keys, legacy_tokens, "click")
+        
+        try:
+            async with self._transaction_async() as conn:
+                async with conn.cursor() as cursor:
+                    # 先锁定会从未点击变为已点击的记录，保证汇总计数与实际更新一致，再按锁定记录的主键更新
+                    await cursor.execute(lock_sql, tuple(lock_params))
+                    changed = await cursor.fetchall()
+                    affected_rows = 0
+                    if changed:
+                        sql, params = QueryBuilder.build_update_query(
+                            self.table_name,
+                            update_data,
+                            {"id": {"$in": [row["id"] for row in changed]}, "click": 0}
+                        )
+                        await cursor.execute(sql, tuple(params))
+                        affected_rows = cursor.rowcount
+                    for rollup_sql, rollup_params in self.recall_daily_dao.build_counter_queries(changed, "click"):
+                        await cursor.execute(rollup_sql, rollup_params)
+        except Exception as e:
+            logger.error(f"批量标记点击失败: {str(e)}")
+            raise
+        
+        # 只有本次由 0 变为 1 的记录使用新的点击时间，此前已点击的记录保留数据库中的时间，缓存直接失效
+        changed_tokens = {row["token"] for row in changed}
+        for token in tokens:
+            self._sync_cached_recall(token, update_data, token in changed_tokens)
+        return affected_rows
+    
     def mark_recall_claimed(self, token: str, claim_time: Optional[datetime] = None) -> int:
         """标记召回记录为已领取"""
         update_data = {
@@ -115,7 +401,11 @@ class RecallDAO(BaseDAO):
             "claim_time": claim_time or datetime.now()
         }
         
-        conditions = {"token": token}
+        key = self._write_conditions(token)
+        if key is None:
+            return 0
+        # 只更新状态为 0 的记录，状态实际变化时才累加每日汇总
+        conditions = {**key, "claim": 0}
         
         sql, params = QueryBuilder.build_update_query(
             self.table_name,
@@ -124,11 +414,177 @@ class RecallDAO(BaseDAO):
         )
 
         try:
-            return self.execute_update(sql, tuple(params))
+            rollup_query = self.recall_daily_dao.build_transition_query(key, "claim")
+            affected_rows = self._update_with_rollup(sql, tuple(params), rollup_query)
+            self._sync_cached_recall(token, update_data, affected_rows)
+            return affected_rows
+        except Exception as e:
+            logger.error(f"标记领取失败: {str(e)}")
+            raise
+    
+    async def mark_recall_claimed_async(self, token: str, claim_time: Optional[datetime] = None) -> int:
+        """标记召回记录为已领取（异步）"""
+        update_data = {
+            "claim": 1,
+            "claim_time": claim_time or datetime.now()
+        }
+        
+        key = self._write_conditions(token)
+        if key is None:
+            return 0
+        # 只更新状态为 0 的记录，状态实际变化时才累加每日汇总
+        conditions = {**key, "claim": 0}
+        
+        sql, params = QueryBuilder.build_update_query(
+            self.table_name,
+            update_data,
+            conditions
+        )
+        
+        try:
+            rollup_query = self.recall_daily_dao.build_transition_query(key, "claim")
+            affected_rows = await self._update_with_rollup_async(sql, tuple(params), rollup_query)
+            self._sync_cached_recall(token, update_data, affected_rows)
+            return affected_rows
         except Exception as e:
             logger.error(f"标记领取失败: {str(e)}")
             raise
     
+    async def get_token_by_short_code_async(self, code: str) -> Optional[str]:
+        """短链接码解析为召回令牌：先在内存中校验签名，再按主键查询（结果缓存）"""
+        recall_id = self.token_signer.verify_short_code(code)
+        if recall_id is None:
+            self.token_checks[TOKEN_INVALID] += 1
+            return None
+        token = self.id_token_cache.get(recall_id)
+        if token is not None:
+            return token
+        try:
+            results = await self.execute_query_async(
+                f"SELECT token FROM {self.table_name} WHERE id = %s", (recall_id,)
+            )
+            if not results:
+                return None
+            self.id_token_cache.set(recall_id, results[0]["token"])
+            return results[0]["token"]
+        except Exception as e:
+            logger.error(f"解析短链接失败: {str(e)}")
+            return None
+    
+    def claim_recall(self, token: str, user_name: str, claim_time: Optional[datetime] = None,
+                     click_time: Optional[datetime] = None) -> str:
+        """
+        领取优惠券：校验与状态变更（领取、补记点击）在一条条件 UPDATE 中完成，并发重复领取只会成功一次，
+        影响行数为 1 表示领取成功。
+
+        同一事务中先锁定召回记录读取领取前的状态：领取成功时据此判断是否补记了点击，
+        用一条语句累加每日汇总的领取数和点击数；领取失败时据此返回原因，不再单独查询。
+
+        打开落地页的点击可能还在其他 worker 的写缓冲中没有落库，因此不要求 click = 1：
+        未记录点击时一并记录点击（click_time 默认为领取时间），之后缓冲中的点击落库时按 click = 0 条件跳过。
+        
+        Returns:
+            CLAIM_* 常量之一
+        """
+        status, conditions = self._check_token(token)
+        if conditions is None:
+            return CLAIM_EXPIRED if status == TOKEN_EXPIRED else CLAIM_NOT_FOUND
+        claim_time = claim_time or datetime.now()
+        click_time = click_time or claim_time
+        lock_query, claim_query = self._build_claim_queries(conditions, user_name, claim_time, click_time)
+        
+        try:
+            with self._transaction() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(*lock_query)
+                    recall = cursor.fetchone()
+                    claimed = 0
+                    if recall is not None:
+                        cursor.execute(*claim_query)
+                        claimed = cursor.rowcount
+                        if claimed:
+                            cursor.execute(*self._build_claim_rollup(recall))
+            return self._claim_result(token, recall, claimed, user_name, claim_time, click_time)
+        except Exception as e:
+            logger.error(f"领取优惠券失败: {str(e)}")
+            raise
+    
+    async def claim_recall_async(self, token: str, user_name: str, claim_time: Optional[datetime] = None,
+                                 click_time: Optional[datetime] = None) -> str:
+        """领取优惠券（异步），参数同 claim_recall，返回 CLAIM_* 常量之一"""
+        status, conditions = self._check_token(token)
+        if conditions is None:
+            return CLAIM_EXPIRED if status == TOKEN_EXPIRED else CLAIM_NOT_FOUND
+        claim_time = claim_time or datetime.now()
+        click_time = click_time or claim_time
+        lock_query, claim_query = self._build_claim_queries(conditions, user_name, claim_time, click_time)
+        
+        try:
+            async with self._transaction_async() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(*lock_query)
+                    recall = await cursor.fetchone()
+                    claimed = 0
+                    if recall is not None:
+                        await cursor.execute(*claim_query)
+                        claimed = cursor.rowcount
+                        if claimed:
+                            await cursor.execute(*self._build_claim_rollup(recall))
+            return self._claim_result(token, recall, claimed, user_name, claim_time, click_time)
+        except Exception as e:
+            logger.error(f"领取优惠券失败: {str(e)}")
+            raise
+    
+    def _build_claim_queries(self, conditions: Dict[str, Any], user_name: str, claim_time: datetime,
+                             click_time: datetime) -> Tuple[Tuple[str, tuple], Tuple[str, tuple]]:
+        """
+        领取的两条语句：锁定召回记录并读取领取前的状态，领取的条件 UPDATE
+
+        conditions 为 _check_token 返回的定位条件（签名令牌为主键和商家ID，旧格式令牌为 token）
+        """
+        where_clause, where_params = QueryBuilder._build_where_clause(conditions)
+        lock_sql = f"""
+        SELECT merchant_id, DATE(create_time) AS recall_date, click, claim, user_name, token_expired > NOW() AS valid
+        FROM {self.table_name}
+        {where_clause}
+        FOR UPDATE
+        """
+        # 单表 UPDATE 按书写顺序赋值，click_time 须在 click 之前，IF 中读到的才是更新前的 click
+        claim_sql = f"""
+        UPDATE {self.table_name}
+        SET claim = 1, claim_time = %s, click_time = IF(click = 0, %s, click_time), click = 1
+        {where_clause} AND claim = 0 AND user_name = %s AND token_expired > NOW()
+        """
+        return ((lock_sql, tuple(where_params)),
+                (claim_sql, (claim_time, click_time, *where_params, user_name)))
+    
+    def _build_claim_rollup(self, recall: Dict[str, Any]) -> Tuple[str, tuple]:
+        """领取成功后的每日汇总语句，领取前未点击的记录点击数一并累加"""
+        return self.recall_daily_dao.build_claim_query(recall["merchant_id"], recall["recall_date"],
+                                                       clicked=not recall["click"])
+    
+    def _claim_result(self, token: str, recall: Optional[Dict[str, Any]], claimed: int, user_name: str,
+                      claim_time: datetime, click_time: datetime) -> str:
+        """根据影响行数和领取前的状态得出领取结果，领取成功时同步缓存"""
+        if not claimed:
+            return self._claim_failure_reason(recall, user_name)
+        changes: Dict[str, Any] = {"claim": 1, "claim_time": claim_time}
+        if not recall["click"]:
+            changes.update(click=1, click_time=click_time)
+        self.token_cache.update(token, changes)
+        return CLAIM_SUCCESS
+    
+    @staticmethod
+    def _claim_failure_reason(recall: Optional[Dict], user_name: str) -> str:
+        """根据当前记录状态判断领取失败的原因"""
+        if recall is None:
+            return CLAIM_NOT_FOUND
+        if recall.get("user_name") != user_name:
+            return CLAIM_USER_MISMATCH
+        if recall.get("claim") == 1:
+            return CLAIM_ALREADY_CLAIMED
+        return CLAIM_EXPIRED
+    
     def mark_recall_writeoff(self, token: str, writeoff_time: Optional[datetime] = None) -> int:
         """标记召回记录为已核销"""
         update_data = {
@@ -136,7 +592,11 @@ class RecallDAO(BaseDAO):
             "writeoff_time": writeoff_time or datetime.now()
         }
         
-        conditions = {"token": token}
+        key = self._write_conditions(token)
+        if key is None:
+            return 0
+        # 只更新状态为 0 的记录，状态实际变化时才累加每日汇总
+        conditions = {**key, "writeoff": 0}
         
         sql, params = QueryBuilder.build_update_query(
             self.table_name,
@@ -145,7 +605,10 @@ class RecallDAO(BaseDAO):
         )
         
         try:
-            return self.execute_update(sql, tuple(params))
+            rollup_query = self.recall_daily_dao.build_transition_query(key, "writeoff")
+            affected_rows = self._update_with_rollup(sql, tuple(params), rollup_query)
+            self._sync_cached_recall(token, update_data, affected_rows)
+            return affected_rows
         except Exception as e:
             logger.error(f"标记核销失败: {str(e)}")
             raise
@@ -172,6 +635,65 @@ class RecallDAO(BaseDAO):
             logger.error(f"查询召回记录失败: {str(e)}")
             return []
     
+    def stream_recalls(self,
+                       conditions: Optional[Dict[str, Any]] = None,
+                       fields: Optional[List[str]] = None,
+                       order_by: Optional[List[str]] = None,
+                       batch_size: Optional[int] = None) -> Iterator:
+        """
+        流式查询召回记录（导出、分析全部召回记录时使用），内存占用只与批大小有关
+
+        batch_size 为空时逐行返回，否则每次返回最多 batch_size 行的列表
+        """
+        sql, params = QueryBuilder.build_select_query(
+            self.table_name,
+            fields=fields,
+            conditions=conditions,
+            order_by=order_by
+        )
+        return self.stream_query(sql, tuple(params), batch_size)
+    
+    def stream_recalls_async(self,
+                             conditions: Optional[Dict[str, Any]] = None,
+                             fields: Optional[List[str]] = None,
+                             order_by: Optional[List[str]] = None,
+                             batch_size: Optional[int] = None) -> AsyncIterator:
+        """流式查询召回记录（异步），用 async for 迭代"""
+        sql, params = QueryBuilder.build_select_query(
+            self.table_name,
+            fields=fields,
+            conditions=conditions,
+            order_by=order_by
+        )
+        return self.stream_query_async(sql, tuple(params), batch_size)
+    
+    def query_recalls_by_cursor(self,
+                                conditions: Optional[Dict[str, Any]] = None,
+                                fields: Optional[List[str]] = None,
+                                order_column: str = "create_time",
+                                descending: bool = True,
+                                cursor: Optional[str] = None,
+                                page_size: int = 20,
+                                total: Optional[str] = None) -> Dict:
+        """
+        游标分页查询召回记录，翻到任意一页的开销与第一页相同
+
+        Args:
+            order_column: 排序字段，与 id 组成排序键
+            cursor: 上一页返回的 next_cursor，为空时查询第一页
+            total: "exact"-精确总数，"estimate"-估算总数，None-不返回总数
+            
+        Returns:
+            {"data": [...], "pagination": {"page_size", "next_cursor", "has_more", "total"}}
+        """
+        try:
+            return self._query_keyset(conditions, fields, order_column, descending, cursor, page_size, total)
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"游标分页查询召回记录失败: {str(e)}")
+            return {"data": [], "pagination": {}}
+    
     def query_recalls_paginated(self,
                                conditions: Optional[Dict[str, Any]] = None,
                                fields: Optional[List[str]] = None,
@@ -188,9 +710,8 @@ class RecallDAO(BaseDAO):
             page_size=page_size
         )
         
-        conn = self._get_connection()
         try:
-            with conn.cursor(dictionary=True) as cursor:
+            with self._connection() as conn, conn.cursor(pymysql.cursors.DictCursor) as cursor:
                 # 查询数据
                 cursor.execute(data_sql, tuple(data_params))
                 data = cursor.fetchall()
@@ -212,8 +733,6 @@ class RecallDAO(BaseDAO):
         except Exception as e:
             logger.error(f"分页查询召回记录失败: {str(e)}")
             return {"data": [], "pagination": {}}
-        finally:
-            conn.close()
     
     def get_expired_recalls(self, before_date: Optional[datetime] = None) -> List[Dict]:
         """获取已过期的召回记录"""
@@ -222,6 +741,8 @@ class RecallDAO(BaseDAO):
         
         conditions = {
             "token_expired": {"$lt": before_date},
+            # 令牌在创建之后才过期，附加 create_time 上界不改变结果，分区表可以跳过更新的月份
+            "create_time": {"$lt": before_date},
             "click": 0  # 只获取未点击的过期记录
         }
         
@@ -242,76 +763,15 @@ class RecallDAO(BaseDAO):
                         merchant_id: Optional[int] = None,
                         start_date: Optional[str] = None,
                         end_date: Optional[str] = None) -> Dict:
-        """获取召回统计"""
-        conditions = {}
-        
-        if merchant_id:
-            conditions["merchant_id"] = merchant_id
-        
-        if start_date and end_date:
-            conditions["create_time"] = {"$between": [start_date, end_date]}
-        elif start_date:
-            conditions["create_time"] = {"$gte": start_date}
-        elif end_date:
-            conditions["create_time"] = {"$lte": end_date}
-        
-        sql, params = QueryBuilder.build_select_query(
-            self.table_name,
-            fields=[
-                "COUNT(*) as total_recalls",
-                "COUNT(CASE WHEN click = 1 THEN 1 END) as clicked_count",
-                "COUNT(CASE WHEN claim = 1 THEN 1 END) as claimed_count",
-                "COUNT(CASE WHEN writeoff = 1 THEN 1 END) as writeoff_count",
-                "COUNT(CASE WHEN token_expired < NOW() THEN 1 END) as expired_count",
-                "SUM(CASE WHEN click = 1 THEN 1 ELSE 0 END) / COUNT(*) * 100 as click_rate",
-                "SUM(CASE WHEN claim = 1 THEN 1 ELSE 0 END) / COUNT(*) * 100 as claim_rate",
-                "SUM(CASE WHEN writeoff = 1 THEN 1 ELSE 0 END) / COUNT(*) * 100 as writeoff_rate",
-                "MIN(create_time) as earliest_recall",
-                "MAX(create_time) as latest_recall"
-            ],
-            conditions=conditions
-        )
-        
-        try:
-            results = self.execute_query(sql, tuple(params))
-            stats = results[0] if results else {}
-            
-            # 格式化比率
-            for key in ['click_rate', 'claim_rate', 'writeoff_rate']:
-                if key in stats:
-                    stats[key] = round(float(stats[key]), 2)
-            
-            return stats
-        except Exception as e:
-            logger.error(f"获取召回统计失败: {str(e)}")
-            return {}
+        """获取召回统计（读每日汇总，按天粒度过滤）"""
+        return self.recall_daily_dao.get_recall_stats(merchant_id, start_date, end_date)
     
     def get_daily_recall_stats(self,
                               merchant_id: int,
                               start_date: str,
                               end_date: str) -> List[Dict]:
-        """获取每日召回统计"""
-        sql = """
-        SELECT 
-            DATE(create_time) as recall_date,
-            COUNT(*) as total_recalls,
-            COUNT(CASE WHEN click = 1 THEN 1 END) as clicked_count,
-            COUNT(CASE WHEN claim = 1 THEN 1 END) as claimed_count,
-            COUNT(CASE WHEN writeoff = 1 THEN 1 END) as writeoff_count,
-            COUNT(CASE WHEN token_expired < NOW() THEN 1 END) as expired_count
-        FROM t_recall
-        WHERE merchant_id = %s 
-            AND DATE(create_time) >= %s 
-            AND DATE(create_time) <= %s
-        GROUP BY DATE(create_time)
-        ORDER BY recall_date
-        """
-        
-        try:
-            return self.execute_query(sql, (merchant_id, start_date, end_date))
-        except Exception as e:
-            logger.error(f"获取每日召回统计失败: {str(e)}")
-            return []
+        """获取每日召回统计（读每日汇总）"""
+        return self.recall_daily_dao.get_daily_recall_stats(merchant_id, start_date, end_date)
     
     def get_user_recall_history(self,
                                merchant_id: int,
@@ -338,30 +798,154 @@ class RecallDAO(BaseDAO):
             logger.error(f"获取用户召回历史失败: {str(e)}")
             return []
     
-    def cleanup_expired_recalls(self, before_date: Optional[datetime] = None) -> int:
-        """清理过期召回记录（软删除或归档）"""
+    def _build_recent_contacts_query(self, merchant_id: int, since: datetime) -> Tuple[str, tuple]:
+        # 走 idx_merchant_contact (merchant_id, contact_type, contact, create_time) 的松散索引扫描，不回表
+        sql = f"""
+        SELECT contact_type, contact, MAX(create_time) AS create_time
+        FROM {self.table_name}
+        WHERE merchant_id = %s AND create_time >= %s
+        GROUP BY contact_type, contact
+        """
+        return sql, (merchant_id, since)
+
+    def _build_contacts_since_query(self, merchant_id: int, since: datetime) -> Tuple[str, tuple]:
+        # 增量读取的时间窗口很短（上次读到的最晚时间减去重叠窗口），按 idx_create_time 范围扫描
+        sql = f"""
+        SELECT contact_type, contact, create_time
+        FROM {self.table_name}
+        WHERE create_time >= %s AND merchant_id = %s
+        """
+        return sql, (since, merchant_id)
+
+    def get_recent_contacts(self, merchant_id: int, since: datetime) -> List[Dict]:
+        """商家在 since 之后召回过的联系方式及最近召回时间（每个联系方式一行）"""
+        sql, params = self._build_recent_contacts_query(merchant_id, since)
+        try:
+            return self.execute_query(sql, params)
+        except Exception as e:
+            logger.error(f"获取近期召回联系方式失败: {str(e)}")
+            raise
+
+    async def get_recent_contacts_async(self, merchant_id: int, since: datetime) -> List[Dict]:
+        """商家在 since 之后召回过的联系方式（异步）"""
+        sql, params = self._build_recent_contacts_query(merchant_id, since)
+        try:
+            return await self.execute_query_async(sql, params)
+        except Exception as e:
+            logger.error(f"获取近期召回联系方式失败: {str(e)}")
+            raise
+
+    def get_contacts_since(self, merchant_id: int, since: datetime) -> List[Dict]:
+        """商家 create_time 不早于 since 的召回记录的联系方式（增量同步频控集合使用）"""
+        sql, params = self._build_contacts_since_query(merchant_id, since)
+        try:
+            return self.execute_query(sql, params)
+        except Exception as e:
+            logger.error(f"增量获取召回联系方式失败: {str(e)}")
+            raise
+
+    async def get_contacts_since_async(self, merchant_id: int, since: datetime) -> List[Dict]:
+        """商家 create_time 不早于 since 的召回记录的联系方式（异步）"""
+        sql, params = self._build_contacts_since_query(merchant_id, since)
+        try:
+            return await self.execute_query_async(sql, params)
+        except Exception as e:
+            logger.error(f"增量获取召回联系方式失败: {str(e)}")
+            raise
+
+    @staticmethod
+    def _create_lock_names(merchant_ids: List[Any]) -> List[str]:
+        # 多个商家按相同顺序加锁，避免死锁
+        return [f"t_recall:create:{merchant_id}" for merchant_id in sorted(set(merchant_ids), key=str)]
+
+    @contextmanager
+    def merchant_create_lock(self, merchant_ids: List[Any], timeout: int = RECALL_CREATE_LOCK_TIMEOUT) -> Iterator[None]:
+        """
+        持有商家的召回创建锁（MySQL GET_LOCK），同一商家的频控检查和写入在多个进程间串行执行
+
+        命名锁属于连接，必须在 unit_of_work 作用域内使用，作用域的连接归还连接池前释放；等待超时抛出 TimeoutError。
+        """
+        if current_unit_of_work() is None:
+            raise RuntimeError("merchant_create_lock 需要在 unit_of_work 作用域内使用")
+        acquired = []
+        try:
+            for name in self._create_lock_names(merchant_ids):
+                rows = self.execute_query("SELECT GET_LOCK(%s, %s) AS acquired", (name, timeout))
+                if not rows or rows[0]["acquired"] != 1:
+                    raise TimeoutError(f"等待召回创建锁超时: {name}")
+                acquired.append(name)
+            yield
+        finally:
+            for name in reversed(acquired):
+                try:
+                    self.execute_query("SELECT RELEASE_LOCK(%s) AS released", (name,))
+                except Exception as e:
+                    logger.error(f"释放召回创建锁失败: {str(e)}")
+
+    @asynccontextmanager
+    async def merchant_create_lock_async(self, merchant_ids: List[Any],
+                                         timeout: int = RECALL_CREATE_LOCK_TIMEOUT) -> AsyncIterator[None]:
+        """同 merchant_create_lock（异步），必须在 unit_of_work_async 作用域内使用"""
+        if current_unit_of_work_async() is None:
+            raise RuntimeError("merchant_create_lock_async 需要在 unit_of_work_async 作用域内使用")
+        acquired = []
+        try:
+            for name in self._create_lock_names(merchant_ids):
+                rows = await self.execute_query_async("SELECT GET_LOCK(%s, %s) AS acquired", (name, timeout))
+                if not rows or rows[0]["acquired"] != 1:
+                    raise TimeoutError(f"等待召回创建锁超时: {name}")
+                acquired.append(name)
+            yield
+        finally:
+            for name in reversed(acquired):
+                try:
+                    await self.execute_query_async("SELECT RELEASE_LOCK(%s) AS released", (name,))
+                except Exception as e:
+                    logger.error(f"释放召回创建锁失败: {str(e)}")
+
+    def cleanup_expired_recalls(self,
+                                before_date: Optional[datetime] = None,
+                                delete_only: bool = False,
+                                chunk_size: int = 500,
+                                sleep_seconds: float = 0.0) -> int:
+        """
+        清理过期召回记录：令牌在 before_date（默认 30 天前）之前过期且未点击的记录
+        按主键分批移入 t_recall_archive（delete_only 时直接删除），返回处理的行数
+
+        大批量清理应使用 jobs/recall_retention.py，支持批次间暂停和断点续跑。
+        """
         if not before_date:
             before_date = datetime.now() - timedelta(days=30)  # 保留30天
         
-        # 标记为已过期（软删除）
-        update_data = {
-            "status": "expired",
-            "update_time": datetime.now()
-        }
-        
-        conditions = {
-            "token_expired": {"$lt": before_date},
-            "click": 0
-        }
-        
-        sql, params = QueryBuilder.build_update_query(
-            self.table_name,
-            update_data,
-            conditions
-        )
-        
         try:
-            return self.execute_update(sql, tuple(params))
+            affected_rows = self.recall_archive_dao.purge_expired(
+                before_date,
+                delete_only=delete_only,
+                chunk_size=chunk_size,
+                sleep_seconds=sleep_seconds
+            )
+            if affected_rows:
+                self.token_cache.clear()
+            return affected_rows
         except Exception as e:
             logger.error(f"清理过期召回记录失败: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+    
+    def _sync_cached_recall(self, token: str, changes: Dict[str, Any], affected_rows: int) -> None:
+        """状态变更后同步缓存：更新成功则就地修改缓存记录，否则直接失效"""
+        if affected_rows:
+            self.token_cache.update(token, changes)
+        else:
+            self.token_cache.pop(token)
+    
+    def update_cached_recall(self, token: str, changes: Dict[str, Any]) -> bool:
+        """仅更新缓存中的召回记录（用于写缓冲尚未落库的状态）"""
+        return self.token_cache.update(token, changes)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """token 缓存命中统计"""
+        return self.token_cache.stats()
+    
+    def token_stats(self) -> Dict[str, Any]:
+        """令牌校验结果统计（invalid/expired 为未访问数据库直接拒绝的次数）"""
+        return {"signing": self.token_signer.enabled, **self.token_checks}
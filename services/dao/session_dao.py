@@ -0,0 +1,76 @@
+from typing import Dict, Optional, Any
+from datetime import datetime
+from services.dao.base_dao import BaseDAO
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 每次写入会话时顺带清理的过期会话数上限
+SESSION_CLEANUP_BATCH = 1000
+
+class SessionDAO(BaseDAO):
+    """商家登录会话数据访问对象，按令牌的 SHA-256 摘要保存，数据库中不出现明文令牌"""
+
+    def __init__(self):
+        super().__init__("t_merchant_session")
+
+    async def get_session_async(self, token_hash: str) -> Optional[Dict]:
+        """获取未过期的会话"""
+        sql = f"""
+        SELECT merchant_id, data, expire_time
+        FROM {self.table_name}
+        WHERE token_hash = %s AND expire_time > NOW()
+        """
+        try:
+            results = await self.execute_query_async(sql, (token_hash,))
+            return results[0] if results else None
+        except Exception as e:
+            logger.error(f"获取登录会话失败: {str(e)}")
+            return None
+
+    async def save_session_async(self, token_hash: str, merchant_id: int, data: str, expire_time: datetime) -> int:
+        """保存会话，并清理一批已过期的会话"""
+        sql = f"""
+        INSERT INTO {self.table_name} (token_hash, merchant_id, data, expire_time)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE merchant_id = VALUES(merchant_id), data = VALUES(data), expire_time = VALUES(expire_time)
+        """
+        try:
+            affected_rows = await self.execute_update_async(sql, (token_hash, merchant_id, data, expire_time))
+            await self.execute_update_async(
+                f"DELETE FROM {self.table_name} WHERE expire_time <= NOW() LIMIT %s",
+                (SESSION_CLEANUP_BATCH,)
+            )
+            return affected_rows
+        except Exception as e:
+            logger.error(f"保存登录会话失败: {str(e)}")
+            raise
+
+    async def delete_session_async(self, token_hash: str) -> int:
+        try:
+            return await self.execute_update_async(
+                f"DELETE FROM {self.table_name} WHERE token_hash = %s", (token_hash,)
+            )
+        except Exception as e:
+            logger.error(f"删除登录会话失败: {str(e)}")
+            raise
+
+    def delete_merchant_sessions(self, merchant_id: Any) -> int:
+        """删除商家的全部会话（修改密码、停用商家时使用）"""
+        try:
+            return self.execute_update(
+                f"DELETE FROM {self.table_name} WHERE merchant_id = %s", (merchant_id,)
+            )
+        except Exception as e:
+            logger.error(f"删除商家登录会话失败: {str(e)}")
+            raise
+
+    async def delete_merchant_sessions_async(self, merchant_id: Any) -> int:
+        """删除商家的全部会话（异步）"""
+        try:
+            return await self.execute_update_async(
+                f"DELETE FROM {self.table_name} WHERE merchant_id = %s", (merchant_id,)
+            )
+        except Exception as e:
+            logger.error(f"删除商家登录会话失败: {str(e)}")
+            raise
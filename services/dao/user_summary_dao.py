@@ -0,0 +1,175 @@
+from typing import Dict, List, Any, Tuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+from services.dao.base_dao import BaseDAO
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 重建用户汇总时每条语句处理的用户数量
+REFRESH_USERS_BATCH = 500
+
+class UserSummaryDAO(BaseDAO):
+    """
+    用户订单汇总数据访问对象
+
+    t_user_summary 按 (merchant_id, user_id) 保存每个用户的最近下单时间、订单数、消费总额和最近一次的联系方式，
+    在写入订单的同一事务中增量更新，不活跃用户查询走 idx_merchant_last_order 范围扫描，不再聚合全部订单。
+    """
+
+    def __init__(self):
+        super().__init__("t_user_summary")
+
+    def build_increment_query(self, orders_data: List[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+        """
+        构建按新增订单累加汇总的语句
+
+        同一用户的订单先在内存中合并为一行；联系方式只在新订单不早于已记录的最近下单时间时覆盖。
+        行按 (merchant_id, user_id) 排序，并发写入时以相同顺序加锁，避免死锁。
+        """
+        summaries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        now = datetime.now()
+        for order in orders_data:
+            order_time = order.get("create_time") or now
+            key = (str(order.get("merchant_id")), str(order.get("user_id", "")))
+            summary = summaries.get(key)
+            if summary is None:
+                summaries[key] = {
+                    "merchant_id": order.get("merchant_id"),
+                    "user_id": order.get("user_id", ""),
+                    "name": order.get("name"),
+                    "contact": order.get("contact"),
+                    "contact_type": order.get("contact_type"),
+                    "first_order_time": order_time,
+                    "last_order_time": order_time,
+                    "total_orders": 1,
+                    "total_amount": Decimal(str(order.get("amount") or 0))
+                }
+                continue
+            summary["total_orders"] += 1
+            summary["total_amount"] += Decimal(str(order.get("amount") or 0))
+            if str(order_time) < str(summary["first_order_time"]):
+                summary["first_order_time"] = order_time
+            if str(order_time) >= str(summary["last_order_time"]):
+                summary["last_order_time"] = order_time
+                for field in ("name", "contact", "contact_type"):
+                    if order.get(field):
+                        summary[field] = order.get(field)
+
+        columns = ["merchant_id", "user_id", "name", "contact", "contact_type",
+                   "first_order_time", "last_order_time", "total_orders", "total_amount"]
+        rows = [summaries[key] for key in sorted(summaries)]
+        placeholders = ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(rows))
+        params = [row[column] for row in rows for column in columns]
+
+        # MySQL 按书写顺序执行赋值，联系方式必须在 last_order_time 之前更新
+        sql = f"""
+        INSERT INTO {self.table_name} ({', '.join(columns)})
+        VALUES {placeholders}
+        ON DUPLICATE KEY UPDATE
+            name = IF(VALUES(last_order_time) >= last_order_time, COALESCE(VALUES(name), name), name),
+            contact = IF(VALUES(last_order_time) >= last_order_time, COALESCE(VALUES(contact), contact), contact),
+            contact_type = IF(VALUES(last_order_time) >= last_order_time, COALESCE(VALUES(contact_type), contact_type), contact_type),
+            first_order_time = LEAST(first_order_time, VALUES(first_order_time)),
+            last_order_time = GREATEST(last_order_time, VALUES(last_order_time)),
+            total_orders = total_orders + VALUES(total_orders),
+            total_amount = total_amount + VALUES(total_amount)
+        """
+        return sql, params
+
+    def build_refresh_queries(self, orders_data: List[Dict[str, Any]]) -> List[Tuple[str, List[Any]]]:
+        """
+        构建按 t_order 重新计算相关用户汇总的语句（幂等写入更新了已有订单时使用）
+
+        只重算本批次涉及的用户，走 idx_merchant_user 索引。
+        """
+        by_merchant: Dict[Any, set] = {}
+        for order in orders_data:
+            by_merchant.setdefault(order.get("merchant_id"), set()).add(order.get("user_id", ""))
+
+        queries = []
+        for merchant_id in sorted(by_merchant, key=str):
+            user_ids = sorted(by_merchant[merchant_id], key=str)
+            for start in range(0, len(user_ids), REFRESH_USERS_BATCH):
+                queries.append(self.build_refresh_query(merchant_id, user_ids[start:start + REFRESH_USERS_BATCH]))
+        return queries
+
+    def build_refresh_query(self, merchant_id: int, user_ids: List[str] = None) -> Tuple[str, List[Any]]:
+        """构建按 t_order 重算汇总的语句，user_ids 为空时重算商家的全部用户（需要 MySQL 8.0 窗口函数）"""
+        params: List[Any] = [merchant_id]
+        user_clause = ""
+        if user_ids:
+            user_clause = f"AND user_id IN ({', '.join(['%s'] * len(user_ids))})"
+            params.extend(user_ids)
+
+        sql = f"""
+        INSERT INTO {self.table_name} (merchant_id, user_id, name, contact, contact_type,
+                                       first_order_time, last_order_time, total_orders, total_amount)
+        SELECT merchant_id, user_id, name, contact, contact_type,
+               first_order_time, last_order_time, total_orders, total_amount
+        FROM (
+            SELECT
+                merchant_id,
+                user_id,
+                name,
+                contact,
+                contact_type,
+                MIN(create_time) OVER w AS first_order_time,
+                MAX(create_time) OVER w AS last_order_time,
+                COUNT(*) OVER w AS total_orders,
+                SUM(amount) OVER w AS total_amount,
+                ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY create_time DESC, id DESC) AS rn
+            FROM t_order
+            WHERE merchant_id = %s {user_clause}
+            WINDOW w AS (PARTITION BY user_id)
+        ) latest
+        WHERE rn = 1
+        ON DUPLICATE KEY UPDATE
+            name = VALUES(name),
+            contact = VALUES(contact),
+            contact_type = VALUES(contact_type),
+            first_order_time = VALUES(first_order_time),
+            last_order_time = VALUES(last_order_time),
+            total_orders = VALUES(total_orders),
+            total_amount = VALUES(total_amount)
+        """
+        return sql, params
+
+    def rebuild_merchant(self, merchant_id: int) -> int:
+        """按 t_order 重建商家的用户汇总（上线后回填历史数据或修复汇总时使用）"""
+        sql, params = self.build_refresh_query(merchant_id)
+
+        try:
+            return self.execute_update(sql, tuple(params))
+        except Exception as e:
+            logger.error(f"重建用户汇总失败: {str(e)}")
+            raise
+
+    def get_inactive_users(self,
+                          merchant_id: int,
+                          inactive_days: int = 30,
+                          limit: int = 100) -> List[Dict]:
+        """获取不活跃用户（超过指定天数未下单），按最近下单时间升序"""
+        cutoff_date = (datetime.now() - timedelta(days=inactive_days)).strftime('%Y-%m-%d')
+
+        sql = f"""
+        SELECT
+            user_id,
+            name as user_name,
+            contact,
+            contact_type,
+            last_order_time,
+            total_orders,
+            total_amount,
+            DATEDIFF(CURDATE(), last_order_time) as inactive_days
+        FROM {self.table_name}
+        WHERE merchant_id = %s AND last_order_time < %s
+        ORDER BY last_order_time ASC
+        LIMIT %s
+        """
+
+        try:
+            return self.execute_query(sql, (merchant_id, cutoff_date, limit))
+        except Exception as e:
+            logger.error(f"获取不活跃用户失败: {str(e)}")
+            return []
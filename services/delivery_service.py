@@ -0,0 +1,225 @@
+from typing import Any, Dict, List, Optional, Tuple
+from services.dao.outbox_dao import OutboxDAO
+from utils.rate_limiter import RateLimiter
+from utils.token.recall_token import RecallTokenSigner
+import asyncio
+import logging
+import os
+import socket
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# 云片批量发送单次最多 1000 个号码
+SMS_BATCH_SIZE = int(os.getenv("SMS_BATCH_SIZE", "1000"))
+# 每秒调用短信接口的次数上限（每个进程独立计算）
+SMS_RATE_LIMIT = float(os.getenv("SMS_RATE_LIMIT", "5"))
+# 企业微信渠道每批认领的消息数
+WECHAT_BATCH_SIZE = int(os.getenv("WECHAT_BATCH_SIZE", "1000"))
+# 接口调用失败时的最大尝试次数和首次重试间隔（秒），之后按指数退避
+SMS_MAX_RETRIES = int(os.getenv("SMS_MAX_RETRIES", "3"))
+SMS_RETRY_BACKOFF = float(os.getenv("SMS_RETRY_BACKOFF", "2"))
+# 每个进程并发发送的 worker 数，设为 0 时应用进程不发送，只由 jobs.outbox_worker 发送
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", "2"))
+# 发件箱为空时的轮询间隔（秒）
+DELIVERY_POLL_INTERVAL = float(os.getenv("DELIVERY_POLL_INTERVAL", "1"))
+# 认领租约（秒），超过该时间未标记结果的消息会被其他 worker 重新认领
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+
+# 短信中召回链接的域名（如 https://m.example.com），未配置时短信模板的 url 为空
+RECALL_LINK_BASE_URL = os.getenv("RECALL_LINK_BASE_URL", "").rstrip("/")
+
+outboxDAO = OutboxDAO()
+tokenSigner = RecallTokenSigner()
+
+def build_recall_link(recall: Dict) -> str:
+    """召回链接：配置了令牌密钥时使用短链接 /r/{code}，否则使用 /landing/{token}"""
+    if not RECALL_LINK_BASE_URL:
+        return ""
+    if tokenSigner.enabled and recall.get("recall_id"):
+        return f"{RECALL_LINK_BASE_URL}/r/{tokenSigner.issue_short_code(recall['recall_id'])}"
+    return f"{RECALL_LINK_BASE_URL}/landing/{recall.get('token')}"
+
+class DeliveryPipeline:
+    """
+    后台召回消息发送管道，每个发送渠道（短信、企业微信）一个管道
+
+    待发送消息持久化在发件箱表 t_recall_outbox 中（与召回记录同一事务写入，按联系方式类型分配渠道），
+    worker 用 SELECT ... FOR UPDATE SKIP LOCKED 按本渠道接口单次上限批量认领，
+    发送前经过令牌桶限流，结果批量回写；接口调用失败时按指数退避重新放回发件箱。
+    多个进程可以同时运行发送 worker，互不重复发送。
+    """
+
+    def __init__(self, sender,
+                 batch_size: int = SMS_BATCH_SIZE,
+                 rate_limit: float = SMS_RATE_LIMIT,
+                 workers: int = DELIVERY_WORKERS,
+                 max_retries: int = SMS_MAX_RETRIES,
+                 retry_backoff: float = SMS_RETRY_BACKOFF,
+                 poll_interval: float = DELIVERY_POLL_INTERVAL,
+                 channel: str = "sms") -> None:
+        self.sender = sender
+        self.batch_size = batch_size
+        self.limiter = RateLimiter(rate_limit)
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.channel = channel
+        self.worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._inflight = 0
+        self.sent = 0
+        self.failed = 0
+
+    def new_job_id(self) -> str:
+        return uuid.uuid4().hex
+
+    async def start(self) -> None:
+        """启动发送 worker，workers 为 0 时不启动（由独立 worker 进程发送）"""
+        if self._tasks or self.workers <= 0:
+            return
+        self._tasks = [asyncio.create_task(self._worker(f"{self.worker_prefix}:{index}"))
+                       for index in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._lease_reaper()))
+
+    async def stop(self) -> None:
+        """停止 worker；未发送的消息保留在发件箱中，由下次启动或其他进程继续发送"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def run_forever(self) -> None:
+        """独立 worker 进程入口"""
+        await self.start()
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            await self.stop()
+
+    async def get_job(self, job_id: str, merchant_id: Optional[int] = None) -> Optional[Dict]:
+        stats = await outboxDAO.get_job_stats_async(job_id, merchant_id)
+        if stats is None:
+            return None
+        if stats["pending"] > 0:
+            status = "sending"
+        elif stats["failed"] == 0:
+            status = "completed"
+        elif stats["sent"] == 0:
+            status = "failed"
+        else:
+            status = "partial"
+        return {"job_id": job_id, "status": status, **stats}
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers if self._tasks else 0,
+            "inflight_batches": self._inflight,
+            "sent": self.sent,
+            "failed": self.failed
+        }
+
+    async def _worker(self, worker_id: str) -> None:
+        while True:
+            try:
+                rows = await outboxDAO.claim_batch_async(worker_id, self.batch_size, OUTBOX_LEASE_SECONDS, self.channel)
+            except Exception as e:
+                logger.error(f"认领发件箱消息失败: {str(e)}")
+                rows = []
+            if not rows:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            self._inflight += 1
+            try:
+                await self._deliver(rows)
+            except Exception as e:
+                # 结果回写失败时消息保持发送中，租约到期后重新发送
+                logger.error(f"{self.channel} 批次发送异常: {str(e)}")
+            finally:
+                self._inflight -= 1
+
+    async def _lease_reaper(self) -> None:
+        """定期回收租约过期的消息"""
+        while True:
+            await asyncio.sleep(max(OUTBOX_LEASE_SECONDS / 2, self.poll_interval))
+            try:
+                released = await outboxDAO.release_expired_leases_async()
+                if released:
+                    logger.warning(f"回收租约过期的发件箱消息 {released} 条")
+            except Exception as e:
+                logger.error(f"回收发件箱租约失败: {str(e)}")
+
+    async def _deliver(self, rows: List[Dict]) -> None:
+        # 没有联系方式的消息直接标记失败，保证发送结果与提交顺序一一对应
+        missing = [row["outbox_id"] for row in rows if not row.get("contact")]
+        if missing:
+            await outboxDAO.mark_failed_async(missing, "缺少联系方式")
+            self.failed += len(missing)
+            rows = [row for row in rows if row.get("contact")]
+            if not rows:
+                return
+
+        for row in rows:
+            row["url"] = build_recall_link(row)
+
+        await self.limiter.acquire_async()
+        try:
+            # 云片 SDK、wechatpy 都是同步 HTTP 调用，放到线程中执行
+            result = await asyncio.to_thread(self.sender.send_recall_messages, rows)
+            sent_flags, error, retryable = self._parse_result(result, len(rows))
+        except Exception as e:
+            sent_flags, error, retryable = [False] * len(rows), str(e), True
+
+        sent_ids = [row["outbox_id"] for row, sent in zip(rows, sent_flags) if sent]
+        unsent = [row for row, sent in zip(rows, sent_flags) if not sent]
+        await outboxDAO.mark_sent_async(sent_ids)
+        self.sent += len(sent_ids)
+        if not unsent:
+            return
+
+        if retryable:
+            retry_ids = [row["outbox_id"] for row in unsent if row["attempts"] < self.max_retries]
+            if retry_ids:
+                # attempts 在认领时已加 1
+                attempts = min(row["attempts"] for row in unsent)
+                delay = int(self.retry_backoff * (2 ** (attempts - 1)))
+                logger.warning(f"{self.channel} 批次发送失败，{delay} 秒后重试 {len(retry_ids)} 条: {error}")
+                await outboxDAO.mark_retry_async(retry_ids, delay, error)
+            failed_ids = [row["outbox_id"] for row in unsent if row["attempts"] >= self.max_retries]
+        else:
+            failed_ids = [row["outbox_id"] for row in unsent]
+        await outboxDAO.mark_failed_async(failed_ids, error)
+        self.failed += len(failed_ids)
+
+    @staticmethod
+    def _parse_result(result: Any, batch_size: int) -> Tuple[List[bool], Optional[str], bool]:
+        """
+        解析发送器返回结果
+
+        Returns:
+            (每条消息是否发送成功, 错误信息, 失败的消息是否可重试)
+        """
+        # 企业微信发送器按提交顺序逐条返回是否成功，失败的多为接口异常，可重试
+        if isinstance(result, dict) and "results" in result:
+            sent_flags = [bool(sent) for sent in result["results"]]
+            if len(sent_flags) != batch_size:
+                return [False] * batch_size, "发送结果数量与提交数量不一致", True
+            return sent_flags, result.get("error") or (None if all(sent_flags) else "企业微信发送失败"), True
+        # 发送器返回的 dict 为本地配置/参数错误，重试无意义
+        if isinstance(result, dict):
+            return [False] * batch_size, result.get("message"), False
+        if result is None:
+            return [False] * batch_size, "短信接口无返回", True
+        if not result.is_succ():
+            return [False] * batch_size, f"{result.code()}: {result.msg()} {result.detail() or ''}".strip(), True
+
+        # 批量发送结果按提交顺序逐条返回；缺少逐条结果时无法确认哪些已送达，记为失败而不是全部成功，
+        # 接口已受理的短信可能已经发出，不重试以免重复发送
+        data = result.data() or {}
+        items = data.get("data") if isinstance(data, dict) else None
+        if not items or len(items) != batch_size:
+            return [False] * batch_size, "短信发送结果未知：逐条结果缺失或数量与提交数量不一致", False
+        sent_flags = [item.get("code") == 0 for item in items]
+        error = next((item.get("msg") for item in items if item.get("code") != 0), None)
+        return sent_flags, error, False
@@ -1,23 +1,87 @@
-from typing import Dict
+from typing import Any, Dict, Hashable, List, Optional
 from services.base_service import BaseService
 from services.dao.merchant_dao import MerchantDAO
+from services.session_service import SessionService
+from utils.cache.ttl_cache import TTLCache
 import logging
+import os
 from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 merchantDao = MerchantDAO()
 
+# 商家记录缓存（商家信息很少变化，读多写少）；多进程部署时其他进程最多 MERCHANT_CACHE_TTL 秒后看到修改
+MERCHANT_CACHE_SIZE = int(os.getenv("MERCHANT_CACHE_SIZE", "10000"))
+MERCHANT_CACHE_TTL = float(os.getenv("MERCHANT_CACHE_TTL", "300"))
+# 商家ID -> 商家记录，用户名 -> 商家ID
+merchantCache = TTLCache(maxsize=MERCHANT_CACHE_SIZE, ttl=MERCHANT_CACHE_TTL)
+merchantIdCache = TTLCache(maxsize=MERCHANT_CACHE_SIZE, ttl=MERCHANT_CACHE_TTL)
+
+def _cache_key(merchant_id: Any) -> Hashable:
+    # 路由参数中的商家ID可能是字符串，统一为整数
+    try:
+        return int(merchant_id)
+    except (TypeError, ValueError):
+        return merchant_id
+
 class MerchantService(BaseService):
+    """
+    商家服务，按ID、用户名查询商家时先读进程内缓存，修改、删除商家时清除对应缓存
+
+    session_service 为应用使用的会话服务，修改密码时通过它注销商家的全部登录会话
+    """
+
+    def __init__(self, session_service: Optional[SessionService] = None):
+        super().__init__()
+        self.session_service = session_service
 
     def get_merchant_by_id(self, merchant_id: int) -> Dict:
         if not merchant_id:
             return {"status": "error", "message": "商户ID不能为空"}
-        return merchantDao.get_merchant_by_id(merchant_id)
-    
+        cached = merchantCache.get(_cache_key(merchant_id))
+        if cached is not None:
+            return dict(cached)
+        return self._cache_merchant(merchantDao.get_merchant_by_id(merchant_id))
+
     def get_merchant_by_username(self, username: str) -> Dict:
         if not username:
             return None
-        return merchantDao.get_merchant_by_username(username)
+        cached = self._get_cached_by_username(username)
+        if cached is not None:
+            return cached
+        return self._cache_merchant(merchantDao.get_merchant_by_username(username))
+
+    async def get_merchant_by_id_async(self, merchant_id: int) -> Dict:
+        if not merchant_id:
+            return {"status": "error", "message": "商户ID不能为空"}
+        cached = merchantCache.get(_cache_key(merchant_id))
+        if cached is not None:
+            return dict(cached)
+        return self._cache_merchant(await merchantDao.get_merchant_by_id_async(merchant_id))
+
+    async def get_merchant_by_username_async(self, username: str) -> Dict:
+        if not username:
+            return None
+        cached = self._get_cached_by_username(username)
+        if cached is not None:
+            return cached
+        return self._cache_merchant(await merchantDao.get_merchant_by_username_async(username))
+
+    def get_merchants_by_ids(self, merchant_ids: List[int]) -> Dict[Any, Dict]:
+        """批量获取商家，返回 {商家ID: 商家记录}；缓存未命中的商家用一条 IN 查询获取，不存在的商家不在结果中"""
+        merchants, missing = self._get_cached_by_ids(merchant_ids)
+        if missing:
+            for merchant in merchantDao.get_merchants_by_ids(missing):
+                merchants[merchant["id"]] = self._cache_merchant(merchant)
+        return merchants
+
+    async def get_merchants_by_ids_async(self, merchant_ids: List[int]) -> Dict[Any, Dict]:
+        """批量获取商家（异步），返回 {商家ID: 商家记录}"""
+        merchants, missing = self._get_cached_by_ids(merchant_ids)
+        if missing:
+            for merchant in await merchantDao.get_merchants_by_ids_async(missing):
+                merchants[merchant["id"]] = self._cache_merchant(merchant)
+        return merchants
 
     def create_merchant(self, merchant_data: Dict) -> int:
         if not merchant_data:
@@ -26,7 +90,81 @@ class MerchantService(BaseService):
         return merchantDao.create_merchant(merchant_data)
 
     def update_merchant(self, merchant_id: int, merchant_data: Dict) -> int:
+        """更新商家，修改了密码时注销该商家的全部登录会话"""
+        if not merchant_id or not merchant_data:
+            return {"status": "error", "message": "商户ID或数据不能为空"}
+        password_changed = "password" in merchant_data
+        merchant_data["updated_at"] = datetime.now(timezone.utc)
+        try:
+            affected_rows = merchantDao.update_merchant(merchant_id, merchant_data)
+        finally:
+            # 更新失败时也清除，避免缓存与数据库不一致
+            self.invalidate_merchant(merchant_id)
+        if password_changed and self.session_service is not None:
+            self.session_service.revoke_merchant_sessions_sync(_cache_key(merchant_id))
+        return affected_rows
+
+    async def update_merchant_async(self, merchant_id: int, merchant_data: Dict) -> int:
+        """更新商家，修改了密码时注销该商家的全部登录会话"""
         if not merchant_id or not merchant_data:
             return {"status": "error", "message": "商户ID或数据不能为空"}
+        password_changed = "password" in merchant_data
         merchant_data["updated_at"] = datetime.now(timezone.utc)
-        return merchantDao.update_merchant(merchant_id, merchant_data)
\ No newline at end of file
+        try:
+            affected_rows = await merchantDao.update_merchant_async(merchant_id, merchant_data)
+        finally:
+            self.invalidate_merchant(merchant_id)
+        if password_changed and self.session_service is not None:
+            await self.session_service.revoke_merchant_sessions(_cache_key(merchant_id))
+        return affected_rows
+
+    def delete_merchant(self, merchant_id: int) -> int:
+        if not merchant_id:
+            return {"status": "error", "message": "商户ID不能为空"}
+        try:
+            return merchantDao.delete_merchant(merchant_id)
+        finally:
+            self.invalidate_merchant(merchant_id)
+
+    def invalidate_merchant(self, merchant_id: int) -> None:
+        """清除商家的缓存（直接修改 t_merchant 后也应调用）"""
+        key = _cache_key(merchant_id)
+        merchantCache.pop(key)
+        merchantIdCache.remove_where(lambda cached_id: cached_id == key)
+
+    def cache_stats(self) -> Dict:
+        return merchantCache.stats()
+
+    @staticmethod
+    def _cache_merchant(merchant: Optional[Dict]) -> Optional[Dict]:
+        """缓存查询到的商家记录，返回副本"""
+        if merchant is None:
+            return None
+        key = _cache_key(merchant.get("id"))
+        merchantCache.set(key, merchant)
+        if merchant.get("username"):
+            merchantIdCache.set(merchant["username"], key)
+        return dict(merchant)
+
+    @staticmethod
+    def _get_cached_by_username(username: str) -> Optional[Dict]:
+        merchant_id = merchantIdCache.get(username)
+        if merchant_id is None:
+            return None
+        cached = merchantCache.get(merchant_id)
+        # 用户名被修改后旧的对应关系作废
+        if cached is None or cached.get("username") != username:
+            return None
+        return dict(cached)
+
+    @staticmethod
+    def _get_cached_by_ids(merchant_ids: List[int]) -> tuple:
+        merchants = {}
+        missing = []
+        for merchant_id in dict.fromkeys(_cache_key(merchant_id) for merchant_id in merchant_ids or [] if merchant_id):
+            cached = merchantCache.get(merchant_id)
+            if cached is not None:
+                merchants[merchant_id] = dict(cached)
+            else:
+                missing.append(merchant_id)
+        return merchants, missing
@@ -1,11 +1,18 @@
-from typing import Dict
+from typing import AsyncIterator, Dict, List, Optional
 from services.base_service import BaseService
-from services.dao.order_dao import OrderDAO
+from services.dao.order_dao import OrderDAO, ORDER_COLUMNS
+from utils.stream.json_stream import iter_json_records
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 orderDAO = OrderDAO()
 
+# 流式导入时每个数据块的最大字节数（需小于 MySQL max_allowed_packet）
+INGEST_CHUNK_BYTES = int(os.getenv("ORDER_INGEST_CHUNK_BYTES", str(1024 * 1024)))
+# 幂等写入模式：upsert-已存在则更新，ignore-已存在则跳过
+UPSERT_MODES = ("upsert", "ignore")
+
 class OrderService(BaseService):
     
     def __init__(self):
@@ -14,4 +21,119 @@ class OrderService(BaseService):
     def create_orders(self, orders: Dict) -> Dict:   
         if not orders:
             return {"status": "error", "message": "没有数据可存储"}
-        return orderDAO.batch_create_orders(orders)
\ No newline at end of file
+        return orderDAO.batch_create_orders(orders)
+
+    async def create_orders_async(self, orders: Dict, mode: str = "insert",
+                                  update_columns: List[str] = None,
+                                  merchant_id: Optional[int] = None) -> Dict:
+        if not orders:
+            return {"status": "error", "message": "没有数据可存储"}
+        if merchant_id is not None:
+            # 订单一律归属当前登录商家，忽略请求中的 merchant_id
+            orders = [{**order, "merchant_id": merchant_id} for order in orders]
+        if mode == "insert":
+            # 字段名会拼入 SQL，只允许 t_order 的可写字段（upsert 模式由 DAO 校验）
+            invalid = sorted({key for order in orders for key in order if key not in ORDER_COLUMNS})
+            if invalid:
+                return {"status": "error", "message": f"不支持的订单字段: {', '.join(map(str, invalid))}"}
+            return await orderDAO.batch_create_orders_async(orders)
+        if mode not in UPSERT_MODES:
+            return {"status": "error", "message": f"不支持的写入模式: {mode}"}
+        # 幂等写入：重复推送的订单按 uk_merchant_order_id 更新或跳过，被更新订单的汇总在写入提交后重算
+        pending_refresh = orderDAO.new_summary_refresh()
+        counts = await orderDAO.upsert_orders_async(orders, update_columns, ignore=(mode == "ignore"),
+                                                    pending_refresh=pending_refresh)
+        result = {"status": "success", **counts}
+        error = await self._refresh_summaries(pending_refresh)
+        if error:
+            result.update(status="error", message=error)
+        return result
+
+    async def create_orders_stream(self, chunks: AsyncIterator[bytes],
+                                   mode: str = "insert",
+                                   update_columns: List[str] = None,
+                                   max_chunk_bytes: int = INGEST_CHUNK_BYTES,
+                                   merchant_id: Optional[int] = None) -> Dict:
+        """
+        流式导入订单：边解析请求体边按字节数切块写入，内存占用与上传大小无关。
+        单个数据块失败不影响其他数据块，返回每个数据块的写入结果。
+        mode 为 upsert/ignore 时按 uk_merchant_order_id 幂等写入，被更新订单涉及的汇总在全部数据块写入后统一重算一次。
+        指定 merchant_id 时每条订单的 merchant_id 都替换为它。
+        字段名会拼入 SQL，含有 t_order 可写字段（ORDER_COLUMNS）以外字段的记录计为拒绝。
+        """
+        if mode != "insert" and mode not in UPSERT_MODES:
+            return {"status": "error", "message": f"不支持的写入模式: {mode}"}
+        chunk_results: List[Dict] = []
+        rows: List[Dict] = []
+        columns = None
+        chunk_bytes = 0
+        rejected = 0
+        pending_refresh = orderDAO.new_summary_refresh()
+
+        async def flush():
+            index = len(chunk_results) + 1
+            try:
+                if mode == "insert":
+                    counts = {"affected": await orderDAO.insert_orders_chunk_async(rows)}
+                else:
+                    counts = await orderDAO.upsert_orders_async(rows, update_columns, ignore=(mode == "ignore"),
+                                                                pending_refresh=pending_refresh)
+                chunk_results.append({"chunk": index, "rows": len(rows), "bytes": chunk_bytes,
+                                      "status": "success", **counts})
+            except Exception as e:
+                chunk_results.append({"chunk": index, "rows": len(rows), "bytes": chunk_bytes,
+                                      "status": "error", "message": str(e)})
+
+        try:
+            async for record, size in iter_json_records(chunks):
+                # 无法解析的 NDJSON 行（None）、非对象记录和含未知字段的记录计为拒绝，继续处理后续记录
+                if not isinstance(record, dict) or not record or any(key not in ORDER_COLUMNS for key in record):
+                    rejected += 1
+                    continue
+                if merchant_id is not None:
+                    record["merchant_id"] = merchant_id
+                keys = tuple(record.keys())
+                # 字段不一致或超过字节上限时先写入当前数据块
+                if rows and (keys != columns or chunk_bytes + size > max_chunk_bytes):
+                    await flush()
+                    rows, chunk_bytes = [], 0
+                columns = keys
+                rows.append(record)
+                chunk_bytes += size
+        except ValueError as e:
+            # 解析失败：已解析的数据照常写入，并返回错误信息
+            if rows:
+                await flush()
+            await self._refresh_summaries(pending_refresh)
+            return self._stream_summary(chunk_results, rejected, f"订单数据解析失败: {str(e)}")
+
+        if rows:
+            await flush()
+        return self._stream_summary(chunk_results, rejected, await self._refresh_summaries(pending_refresh))
+
+    async def _refresh_summaries(self, pending_refresh: Dict[str, set]) -> Optional[str]:
+        """重算幂等写入更新过的订单涉及的汇总，失败时返回错误信息（订单已写入，不回滚）"""
+        if not pending_refresh["users"] and not pending_refresh["days"]:
+            return None
+        try:
+            await orderDAO.refresh_summaries_async(pending_refresh)
+            return None
+        except Exception as e:
+            return (f"订单已写入，汇总重算失败，请执行 jobs.rebuild_user_summary 和 jobs.rebuild_daily_rollups 修复: "
+                    f"{str(e)}")
+
+    def _stream_summary(self, chunk_results: List[Dict], rejected: int, error: str = None) -> Dict:
+        failed = [chunk for chunk in chunk_results if chunk["status"] != "success"]
+        summary = {
+            "status": "error" if error or failed else "success",
+            "total_rows": sum(chunk["rows"] for chunk in chunk_results),
+            "failed_rows": sum(chunk["rows"] for chunk in failed),
+            "rejected_rows": rejected,
+        }
+        for key in ("inserted", "updated", "skipped"):
+            if any(key in chunk for chunk in chunk_results):
+                summary[key] = sum(chunk.get(key, 0) for chunk in chunk_results)
+        summary["chunks"] = chunk_results
+        if error:
+            summary["message"] = error
+        return summary
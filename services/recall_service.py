@@ -1,14 +1,30 @@
 from typing import Dict
 from services.base_service import BaseService
-from services.dao.recall_dao import RecallDAO
+from services.dao.recall_dao import RecallDAO, CLAIM_NOT_FOUND, CLAIM_EXPIRED
+from services.dao.id_sequence_dao import IdSequenceDAO
+from utils.token.recall_token import TOKEN_INVALID, TOKEN_EXPIRED
+from services.click_buffer import ClickBuffer
+from services.recent_contacts import RecentContactIndex
+from services.delivery_service import DeliveryPipeline, WECHAT_BATCH_SIZE
+from db.unit_of_work import unit_of_work, unit_of_work_async
 import logging
+import os
 from datetime import datetime, timezone, timedelta
 import uuid
 from utils.sms.yunpian import SmsRecallSender
+from utils.qywechat.qywechat import WeChatOutboxSender
 
 logger = logging.getLogger(__name__)
+# 召回链接有效天数
+RECALL_TOKEN_TTL_DAYS = int(os.getenv("RECALL_TOKEN_TTL_DAYS", "7"))
 recallDAO = RecallDAO()
+idSequenceDAO = IdSequenceDAO()
 smsRecallSender = SmsRecallSender()
+clickBuffer = ClickBuffer(recallDAO)
+deliveryPipeline = DeliveryPipeline(smsRecallSender)
+# 企业微信渠道（联系方式类型为 qywechat 的召回），未配置企业微信时消息标记为发送失败
+wechatDeliveryPipeline = DeliveryPipeline(WeChatOutboxSender(), channel="qywechat", batch_size=WECHAT_BATCH_SIZE)
+recentContacts = RecentContactIndex(recallDAO)
 
 class RecallService(BaseService):
 
@@ -17,33 +33,177 @@ class RecallService(BaseService):
             return {"status": "error", "message": "Token不能为空"}
         return recallDAO.get_recall_by_token(token)
 
+    async def get_recall_async(self, token: str) -> Dict:
+        if not token:
+            return {"status": "error", "message": "Token不能为空"}
+        return await recallDAO.get_recall_by_token_async(token)
+
     def recall_click(self, token: str) -> int:
         if not token:
             return {"status": "error", "message": "召回ID不能为空"}
         # 更新召回记录为打开状态
         return recallDAO.mark_recall_clicked(token)
 
+    async def recall_click_async(self, token: str, recall: Dict = None) -> int:
+        if not token:
+            return {"status": "error", "message": "召回ID不能为空"}
+        # 已点击的链接重复打开时不再写库
+        if recall is not None and recall.get("click") == 1:
+            return 0
+        # 写入点击缓冲，由后台任务批量落库；缓存先标记为已点击，后续访问直接跳过
+        click_time = datetime.now()
+        if clickBuffer.add(token, click_time):
+            recallDAO.update_cached_recall(token, {"click": 1, "click_time": click_time})
+            return 1
+        return 0
+
+    async def open_recall_async(self, token: str) -> Dict:
+        """落地页打开召回链接：查询召回记录并记录点击，共用一个连接"""
+        if not token:
+            return None
+        # 无效或已过期的签名令牌直接拒绝，不占用数据库连接
+        if recallDAO.token_signer.verify(token)[0] in (TOKEN_INVALID, TOKEN_EXPIRED):
+            return None
+        async with unit_of_work_async():
+            recall = await recallDAO.get_recall_by_token_async(token)
+            if recall is not None:
+                await self.recall_click_async(token, recall)
+        return recall
+
+    async def open_recall_by_code_async(self, code: str) -> Dict:
+        """短链接打开召回链接，返回召回记录（含 token），无效或已过期时返回 None"""
+        token = await recallDAO.get_token_by_short_code_async(code)
+        if token is None:
+            return None
+        return await self.open_recall_async(token)
+
+    async def claim_coupon_async(self, token: str, user_name: str) -> str:
+        if not token:
+            return CLAIM_NOT_FOUND
+        status = recallDAO.token_signer.verify(token)[0]
+        if status == TOKEN_INVALID:
+            return CLAIM_NOT_FOUND
+        if status == TOKEN_EXPIRED:
+            return CLAIM_EXPIRED
+        # 条件 UPDATE 和失败原因查询共用一个连接；点击可能还在本进程或其他 worker 的写缓冲中，
+        # 领取时补记点击，本进程缓冲中有点击时使用其点击时间
+        async with unit_of_work_async():
+            return await recallDAO.claim_recall_async(token, user_name,
+                                                      click_time=clickBuffer.pending_click_time(token))
+
+    async def start_click_buffer(self):
+        await clickBuffer.start()
+
+    async def stop_click_buffer(self):
+        # 退出前把缓冲中的点击全部落库
+        await clickBuffer.stop()
+
     def recall_claim(self, token: str) -> int:
         if not token:
             return {"status": "error", "message": "Token不能为空"}
         # 更新召回记录为已认领状态
         return recallDAO.mark_recall_claimed(token)
 
-    def create_recalls(self, recalls: list[Dict]) -> int:
+    async def recall_claim_async(self, token: str) -> int:
+        if not token:
+            return {"status": "error", "message": "Token不能为空"}
+        return await recallDAO.mark_recall_claimed_async(token)
+
+    def cache_stats(self) -> Dict:
+        # token 缓存命中统计
+        return recallDAO.cache_stats()
+
+    def token_stats(self) -> Dict:
+        return recallDAO.token_stats()
+
+    def click_buffer_stats(self) -> Dict:
+        return clickBuffer.stats()
+
+    def create_recalls(self, recalls: list[Dict], cap_days: int = None) -> Dict:
+        if not recalls:
+            return {"status": "error", "message": "没有数据可存储"}
+        merchant_ids = [recall.get("merchant_id") for recall in recalls]
+        # 同一商家的频控检查和写入持有商家的召回创建锁串行执行，并发创建不会重复召回同一联系方式
+        try:
+            with unit_of_work(), recallDAO.merchant_create_lock(merchant_ids):
+                # 频控：跳过最近 cap_days 天（默认 RECALL_FREQUENCY_CAP_DAYS）内召回过的联系方式
+                recalls, capped = recentContacts.filter(recalls, cap_days)
+                if not recalls:
+                    return {"status": "success", "job_id": None, "total": 0, "capped": capped}
+                first_id = idSequenceDAO.allocate("t_recall", len(recalls)) if recallDAO.token_signer.enabled else None
+                recall_records = self._build_recall_records(recalls, first_id)
+                # 召回记录和发件箱同一事务写入，由各渠道的发送 worker 发送
+                job_id = deliveryPipeline.new_job_id()
+                recallDAO.batch_create_recalls_with_outbox(recall_records, job_id)
+        except TimeoutError as e:
+            logger.error(f"创建召回任务失败: {str(e)}")
+            return {"status": "error", "message": "该商家的召回任务正在创建，请稍后重试"}
+        return {"status": "success", "job_id": job_id, "total": len(recall_records), "capped": capped}
+
+    async def create_recalls_async(self, recalls: list[Dict], cap_days: int = None) -> Dict:
         if not recalls:
             return {"status": "error", "message": "没有数据可存储"}
+        merchant_ids = [recall.get("merchant_id") for recall in recalls]
+        try:
+            async with unit_of_work_async(), recallDAO.merchant_create_lock_async(merchant_ids):
+                recalls, capped = await recentContacts.filter_async(recalls, cap_days)
+                if not recalls:
+                    return {"status": "success", "job_id": None, "total": 0, "capped": capped}
+                first_id = (await idSequenceDAO.allocate_async("t_recall", len(recalls))
+                            if recallDAO.token_signer.enabled else None)
+                recall_records = self._build_recall_records(recalls, first_id)
+                # 召回记录和发件箱同一事务写入，接口立即返回任务ID，通过 get_delivery_job_async 查询进度
+                job_id = deliveryPipeline.new_job_id()
+                await recallDAO.batch_create_recalls_with_outbox_async(recall_records, job_id)
+        except TimeoutError as e:
+            logger.error(f"创建召回任务失败: {str(e)}")
+            return {"status": "error", "message": "该商家的召回任务正在创建，请稍后重试"}
+        return {"status": "success", "job_id": job_id, "total": len(recall_records), "capped": capped}
+
+    def frequency_cap_stats(self) -> Dict:
+        return recentContacts.stats()
+
+    async def get_delivery_job_async(self, job_id: str, merchant_id: int = None) -> Dict:
+        # 任务的发件箱消息不区分渠道，按 job_id（和商家）统计
+        return await deliveryPipeline.get_job(job_id, merchant_id)
+
+    def delivery_stats(self) -> Dict:
+        return {pipeline.channel: pipeline.stats() for pipeline in (deliveryPipeline, wechatDeliveryPipeline)}
+
+    async def start_delivery(self):
+        await deliveryPipeline.start()
+        await wechatDeliveryPipeline.start()
+
+    async def stop_delivery(self):
+        await deliveryPipeline.stop()
+        await wechatDeliveryPipeline.stop()
+
+    def _build_recall_records(self, recalls: list[Dict], first_id: int = None) -> list[Dict]:
+        """
+        构建召回记录，first_id 为预先分配的连续主键的起点
+
+        有主键时签发自带召回ID、商家ID和过期时间的签名令牌，否则（未配置 RECALL_TOKEN_SECRET）使用随机令牌
+        """
         recall_records = []
-        for recall in recalls:
+        token_expired = datetime.now(timezone.utc) + timedelta(days=RECALL_TOKEN_TTL_DAYS)
+        # 显式写入创建时间，每日汇总的日期与 t_recall.create_time 取自同一个值
+        create_time = datetime.now().replace(microsecond=0)
+        for index, recall in enumerate(recalls):
             recall_record = {}
+            if first_id is not None:
+                recall_record["id"] = first_id + index
+                recall_record["token"] = recallDAO.token_signer.issue(
+                    recall_record["id"], int(recall.get("merchant_id") or 0), token_expired
+                )
+            else:
+                recall_record["token"] = uuid.uuid4().hex
             recall_record["merchant_id"] = recall.get("merchant_id")
             recall_record["user_name"] = recall.get("user_name")
-            recall_record["token"] = uuid.uuid4().hex
-            recall_record["token_expired"] = datetime.now(timezone.utc) + timedelta(days=7)
+            recall_record["token_expired"] = token_expired
             recall_record["product"] = recall.get("product")
             recall_record["product_type"] = recall.get("product_type")
             recall_record["contact"] = recall.get("contact")
             recall_record["contact_type"] = recall.get("contact_type")
+            recall_record["create_time"] = create_time
             recall_records.append(recall_record)
-        recallDAO.batch_create_recalls(recall_records)
-        #发送短信
-        return smsRecallSender.send_recall_messages(recall_records)
\ No newline at end of file
+        return recall_records
@@ -0,0 +1,152 @@
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from datetime import datetime, timedelta
+from utils.cache.ttl_cache import TTLCache
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 频控窗口：同一商家在最近 N 天内召回过的联系方式不再召回（0 表示关闭）
+RECALL_FREQUENCY_CAP_DAYS = int(os.getenv("RECALL_FREQUENCY_CAP_DAYS", "7"))
+# 进程内最多缓存的商家数，以及每个商家的集合多久全量重新加载一次（秒，同时清理窗口外的旧联系方式）
+RECENT_CONTACT_MERCHANTS = int(os.getenv("RECENT_CONTACT_MERCHANTS", "1000"))
+RECENT_CONTACT_RELOAD_SECONDS = float(os.getenv("RECENT_CONTACT_RELOAD_SECONDS", "3600"))
+# 增量同步时从上次读到的最晚召回时间往前重叠的秒数，覆盖写入事务的耗时和各应用服务器的时钟偏差
+RECENT_CONTACT_OVERLAP_SECONDS = float(os.getenv("RECENT_CONTACT_OVERLAP_SECONDS", "300"))
+
+class _MerchantContacts:
+    """一个商家的近期召回联系方式：(contact_type, contact) -> 最近召回时间"""
+
+    __slots__ = ("since", "watermark", "contacts")
+
+    def __init__(self, since: datetime, watermark: datetime) -> None:
+        self.since = since
+        # 已同步到的召回时间，下次从 watermark 减去重叠窗口开始读取
+        self.watermark = watermark
+        self.contacts: Dict[Tuple[str, str], datetime] = {}
+
+    def add_rows(self, rows: List[Dict[str, Any]]) -> None:
+        # 按联系方式取最晚的召回时间，重叠窗口内重复读到的记录不影响结果
+        for row in rows:
+            key = (row.get("contact_type") or "", row["contact"])
+            previous = self.contacts.get(key)
+            if previous is None or row["create_time"] > previous:
+                self.contacts[key] = row["create_time"]
+            if row["create_time"] > self.watermark:
+                self.watermark = row["create_time"]
+
+class RecentContactIndex:
+    """
+    召回频控：按商家缓存近期召回过的联系方式集合
+
+    首次使用时按 idx_merchant_contact 聚合加载窗口内的联系方式（每个联系方式一行），
+    之后每次检查前按 create_time 读取已同步时间（减去重叠窗口）之后的召回记录，集合在内存中增量维护，
+    10 万人的召回名单在一次遍历中完成过滤，不再逐个用户查询召回历史。
+    召回ID 在写入事务之外预先分配，主键大的记录可能先提交，因此不按主键增量读取；
+    create_time 在写入前由应用填充，晚提交的记录只要在重叠窗口内就会被读到。
+    多进程部署时各进程的集合独立，但每次检查都会先增量同步数据库中的新记录。
+    """
+
+    def __init__(self, recall_dao,
+                 cap_days: int = RECALL_FREQUENCY_CAP_DAYS,
+                 max_merchants: int = RECENT_CONTACT_MERCHANTS,
+                 reload_seconds: float = RECENT_CONTACT_RELOAD_SECONDS,
+                 overlap_seconds: float = RECENT_CONTACT_OVERLAP_SECONDS) -> None:
+        self.recall_dao = recall_dao
+        self.cap_days = cap_days
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self._merchants = TTLCache(maxsize=max_merchants, ttl=reload_seconds)
+        self._lock = threading.Lock()
+        self.full_loads = 0
+        self.refreshes = 0
+        self.checked = 0
+        self.capped = 0
+
+    def filter(self, recalls: List[Dict], days: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """去掉最近 days 天内召回过的联系方式（以及名单内重复的联系方式），返回 (保留的召回, 跳过的数量)"""
+        since = self._window_start(days)
+        if since is None or not recalls:
+            return list(recalls), 0
+        states = {}
+        for merchant_id in {recall.get("merchant_id") for recall in recalls}:
+            state = self._merchants.get(merchant_id)
+            if state is None or state.since > since:
+                loaded_at = datetime.now()
+                state = self._load(merchant_id, since, loaded_at, self.recall_dao.get_recent_contacts(merchant_id, since))
+            else:
+                self._refresh(state, self.recall_dao.get_contacts_since(merchant_id, state.watermark - self.overlap))
+            states[merchant_id] = state
+        return self._apply(recalls, states, since)
+
+    async def filter_async(self, recalls: List[Dict], days: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """同 filter（异步）"""
+        since = self._window_start(days)
+        if since is None or not recalls:
+            return list(recalls), 0
+        states = {}
+        for merchant_id in {recall.get("merchant_id") for recall in recalls}:
+            state = self._merchants.get(merchant_id)
+            if state is None or state.since > since:
+                loaded_at = datetime.now()
+                rows = await self.recall_dao.get_recent_contacts_async(merchant_id, since)
+                state = self._load(merchant_id, since, loaded_at, rows)
+            else:
+                rows = await self.recall_dao.get_contacts_since_async(merchant_id, state.watermark - self.overlap)
+                self._refresh(state, rows)
+            states[merchant_id] = state
+        return self._apply(recalls, states, since)
+
+    def _window_start(self, days: Optional[int]) -> Optional[datetime]:
+        days = self.cap_days if days is None else days
+        if days <= 0:
+            return None
+        return datetime.now() - timedelta(days=days)
+
+    def _load(self, merchant_id: Hashable, since: datetime, loaded_at: datetime, rows: List[Dict[str, Any]]) -> _MerchantContacts:
+        state = _MerchantContacts(since, loaded_at)
+        state.add_rows(rows)
+        self._merchants.set(merchant_id, state)
+        with self._lock:
+            self.full_loads += 1
+        return state
+
+    def _refresh(self, state: _MerchantContacts, rows: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            state.add_rows(rows)
+            self.refreshes += 1
+
+    def _apply(self, recalls: List[Dict], states: Dict[Any, _MerchantContacts], since: datetime) -> Tuple[List[Dict], int]:
+        kept = []
+        seen = set()
+        for recall in recalls:
+            contact = recall.get("contact")
+            # 没有联系方式的记录无法发送，也不参与频控
+            if not contact:
+                kept.append(recall)
+                continue
+            merchant_id = recall.get("merchant_id")
+            key = (recall.get("contact_type") or "", contact)
+            last_time = states[merchant_id].contacts.get(key)
+            if (merchant_id, key) in seen or (last_time is not None and last_time >= since):
+                continue
+            seen.add((merchant_id, key))
+            kept.append(recall)
+        capped = len(recalls) - len(kept)
+        with self._lock:
+            self.checked += len(recalls)
+            self.capped += capped
+        if capped:
+            logger.info(f"召回频控跳过 {capped} 个联系方式（{len(recalls)} 个中）")
+        return kept, capped
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "cap_days": self.cap_days,
+                "merchants": len(self._merchants),
+                "full_loads": self.full_loads,
+                "refreshes": self.refreshes,
+                "checked": self.checked,
+                "capped": self.capped
+            }
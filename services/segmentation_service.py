@@ -0,0 +1,200 @@
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+from services.base_service import BaseService
+from services.dao.order_dao import OrderDAO
+from models.user_portrait import user_portrait
+import logging
+import os
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+orderDAO = OrderDAO()
+
+# 用户价值分群，下标为 R高*4 + F高*2 + M高（高/低以商家全体用户的均值为界）
+USER_VALUE_LABELS = np.array([
+    "一般挽留用户",  # R低 F低 M低
+    "重要挽留用户",  # R低 F低 M高
+    "一般保持用户",  # R低 F高 M低
+    "重要保持用户",  # R低 F高 M高
+    "一般发展用户",  # R高 F低 M低
+    "重要发展用户",  # R高 F低 M高
+    "一般价值用户",  # R高 F高 M低
+    "重要价值用户"   # R高 F高 M高
+], dtype=object)
+
+# 用户状态按最近一次下单距今天数划分：活跃 / 沉默 / 预流失 / 流失
+SEGMENT_ACTIVE_DAYS = int(os.getenv("SEGMENT_ACTIVE_DAYS", "30"))
+SEGMENT_SILENT_DAYS = int(os.getenv("SEGMENT_SILENT_DAYS", "90"))
+SEGMENT_CHURN_DAYS = int(os.getenv("SEGMENT_CHURN_DAYS", "180"))
+USER_STATUS_LABELS = ["活跃", "沉默", "预流失"]
+USER_STATUS_DEFAULT = "流失"
+
+# R/F/M 评分档数（1 分最差，SCORE_BINS 分最好）
+SCORE_BINS = 5
+# 从数据库分批读取的行数
+SEGMENT_BATCH_ROWS = int(os.getenv("SEGMENT_BATCH_ROWS", "50000"))
+
+def _top_codes(user_codes: np.ndarray, value_codes: np.ndarray, user_count: int) -> np.ndarray:
+    """
+    每个用户出现次数最多的取值编码（次数相同时取先出现的），没有取值的用户为 -1
+
+    用户和取值都先编码为整数，(用户, 取值) 组合成一个 int64 键后计数、排序，不对字符串排序。
+    """
+    valid = value_codes >= 0
+    value_count = int(value_codes.max()) + 1 if valid.any() else 1
+    pair_keys, counts = np.unique(user_codes[valid].astype("int64") * value_count + value_codes[valid],
+                                  return_counts=True)
+    pair_users = pair_keys // value_count
+    # 按 (用户升序, 次数降序) 排序后每个用户取第一条
+    order = np.lexsort((-counts, pair_users))
+    first = order[np.r_[True, pair_users[order][1:] != pair_users[order][:-1]]] if len(order) else order
+    top = np.full(user_count, -1, dtype="int64")
+    top[pair_users[first]] = pair_keys[first] % value_count
+    return top
+
+def aggregate_orders(orders: pd.DataFrame) -> pd.DataFrame:
+    """
+    把订单明细聚合为每个用户一行
+
+    orders 需要包含 user_id, create_time, amount，可选 product_type, industry；
+    返回 user_id 为索引，列为 last_order_time, frequency, monetary, product_type, industry。
+    """
+    user_codes, user_ids = pd.factorize(orders["user_id"])
+    amount = pd.to_numeric(orders["amount"], errors="coerce").fillna(0.0).to_numpy(dtype="float64")
+    user_count = len(user_ids)
+    users = pd.DataFrame(
+        {
+            "last_order_time": pd.Series(pd.to_datetime(orders["create_time"]).to_numpy()).groupby(user_codes).max().to_numpy(),
+            "frequency": np.bincount(user_codes, minlength=user_count),
+            "monetary": np.bincount(user_codes, weights=amount, minlength=user_count)
+        },
+        index=pd.Index(user_ids, name="user_id")
+    )
+    for column in ("product_type", "industry"):
+        if column in orders.columns:
+            value_codes, values = pd.factorize(orders[column])
+            top = _top_codes(user_codes, value_codes, user_count)
+            # 末尾补一个 None，编码 -1 正好取到它
+            labels = np.append(np.asarray(values, dtype=object), None)
+            users[column] = labels[top]
+        else:
+            users[column] = None
+    return users
+
+def score_rfm(users: pd.DataFrame, as_of: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    计算 R/F/M 评分、用户价值和用户状态（全部为列运算，不逐行循环）
+
+    users 为 aggregate_orders 的结果（或从用户汇总表读取的同结构数据）。
+    评分按排名分位数划分为 1~SCORE_BINS 分；用户价值按 R/F/M 是否高于均值组合为 8 类，
+    用户状态按最近一次下单距今天数划分。
+    """
+    as_of = pd.Timestamp(as_of or datetime.now())
+    result = users.copy()
+    recency = (as_of - pd.to_datetime(result["last_order_time"])).dt.days.clip(lower=0)
+    frequency = result["frequency"].astype("float64")
+    monetary = pd.to_numeric(result["monetary"], errors="coerce").fillna(0.0).astype("float64")
+    result["recency_days"] = recency
+
+    # 排名百分位映射到 1~SCORE_BINS 分，R 越近越好，取负后排名
+    for column, values in (("r_score", -recency), ("f_score", frequency), ("m_score", monetary)):
+        percentile = values.rank(method="average", pct=True).to_numpy()
+        result[column] = np.clip(np.ceil(percentile * SCORE_BINS), 1, SCORE_BINS).astype("int8")
+
+    code = ((recency < recency.mean()).to_numpy().astype("int8") * 4
+            + (frequency > frequency.mean()).to_numpy().astype("int8") * 2
+            + (monetary > monetary.mean()).to_numpy().astype("int8"))
+    result["user_value"] = USER_VALUE_LABELS[code]
+    result["user_status"] = np.select(
+        [recency <= SEGMENT_ACTIVE_DAYS, recency <= SEGMENT_SILENT_DAYS, recency <= SEGMENT_CHURN_DAYS],
+        USER_STATUS_LABELS,
+        default=USER_STATUS_DEFAULT
+    )
+    return result
+
+def build_portraits(scored: pd.DataFrame, merchant_id: Any = None) -> List[user_portrait]:
+    """按 (user_value, user_status, product_type, industry) 去重得到用户画像分段，附带用户数和平均评分"""
+    keys = list(user_portrait._KEYS)
+    frame = scored.reset_index()
+    for key in ("product_type", "industry"):
+        frame[key] = frame[key].astype(object).where(frame[key].notna(), None)
+    summary = frame.groupby(keys, sort=True, dropna=False).agg(
+        user_count=("user_id", "size"),
+        avg_recency_days=("recency_days", "mean"),
+        avg_frequency=("frequency", "mean"),
+        avg_monetary=("monetary", "mean")
+    ).reset_index()
+
+    portraits = []
+    for record in summary.to_dict("records"):
+        portrait = user_portrait({key: (None if pd.isna(record[key]) else record[key]) for key in keys})
+        portrait["merchant_id"] = merchant_id
+        portrait["user_count"] = int(record["user_count"])
+        portrait["avg_recency_days"] = round(float(record["avg_recency_days"]), 1)
+        portrait["avg_frequency"] = round(float(record["avg_frequency"]), 2)
+        portrait["avg_monetary"] = round(float(record["avg_monetary"]), 2)
+        portraits.append(portrait)
+    return portraits
+
+def segment_orders(orders: pd.DataFrame, as_of: Optional[datetime] = None, merchant_id: Any = None) -> Dict[str, Any]:
+    """
+    订单明细 -> 用户分群
+
+    Returns:
+        {"portraits": 去重后的用户画像分段, "assignments": 每个用户的评分和所属分段（DataFrame，user_id 为索引）}
+    """
+    if orders.empty:
+        return {"portraits": [], "assignments": pd.DataFrame()}
+    scored = score_rfm(aggregate_orders(orders), as_of)
+    return {"portraits": build_portraits(scored, merchant_id), "assignments": scored}
+
+class SegmentationService(BaseService):
+    """商家用户 RFM 分群"""
+
+    def segment_merchant(self, merchant_id: int, as_of: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        计算商家全部用户的分群
+
+        最近下单时间、订单数、消费总额读用户汇总表 t_user_summary（每个用户一行），
+        常购商品类型和行业按 (用户, 商品类型, 行业) 在数据库中聚合后取次数最多的一组，不把订单明细读入内存。
+        """
+        users = self._load_user_summaries(merchant_id)
+        if users.empty:
+            return {"portraits": [], "assignments": pd.DataFrame()}
+        preferences = self._load_preferences(merchant_id)
+        users = users.join(preferences, how="left")
+        scored = score_rfm(users, as_of)
+        return {"portraits": build_portraits(scored, merchant_id), "assignments": scored}
+
+    def _load_user_summaries(self, merchant_id: int) -> pd.DataFrame:
+        sql = """
+        SELECT user_id, last_order_time, total_orders AS frequency, total_amount AS monetary
+        FROM t_user_summary
+        WHERE merchant_id = %s
+        """
+        return self._load_frame(sql, (merchant_id,), ["user_id", "last_order_time", "frequency", "monetary"]).set_index("user_id")
+
+    def _load_preferences(self, merchant_id: int) -> pd.DataFrame:
+        sql = """
+        SELECT user_id, product_type, industry, COUNT(*) AS n
+        FROM t_order
+        WHERE merchant_id = %s
+        GROUP BY user_id, product_type, industry
+        """
+        pairs = self._load_frame(sql, (merchant_id,), ["user_id", "product_type", "industry", "n"])
+        top = (pairs.sort_values(["user_id", "n"], ascending=[True, False], kind="mergesort")
+                    .drop_duplicates("user_id")
+                    .set_index("user_id"))
+        return top[["product_type", "industry"]]
+
+    @staticmethod
+    def _load_frame(sql: str, params: tuple, columns: List[str]) -> pd.DataFrame:
+        """流式读取查询结果，每批转为 DataFrame 后拼接，避免先生成整份 dict 列表"""
+        frames = [
+            pd.DataFrame.from_records(batch, columns=columns)
+            for batch in orderDAO.stream_query(sql, params, batch_size=SEGMENT_BATCH_ROWS)
+        ]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
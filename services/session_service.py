@@ -0,0 +1,166 @@
+from typing import Any, Dict, Optional
+from abc import ABC, abstractmethod
+from datetime import datetime
+from services.base_service import BaseService
+from services.dao.session_dao import SessionDAO
+from utils.cache.ttl_cache import TTLCache
+import hashlib
+import json
+import logging
+import os
+import secrets
+import time
+
+logger = logging.getLogger(__name__)
+
+# 登录会话有效天数
+SESSION_TTL_DAYS = float(os.getenv("SESSION_TTL_DAYS", "7"))
+# 进程内会话缓存（LRU + TTL）的容量
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+# 共享存储：memory（仅进程内，重启或换进程需重新登录）或 mysql（t_merchant_session，多进程/多机共享）
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+# 使用共享存储时进程内缓存的最长秒数，决定注销/踢下线在其他进程生效的延迟
+SESSION_LOCAL_TTL = float(os.getenv("SESSION_LOCAL_TTL", "60"))
+
+# 不放入会话的商家字段
+MERCHANT_SECRET_FIELDS = ("password", "sms", "wechat_api")
+
+def public_merchant(merchant: Dict[str, Any]) -> Dict[str, Any]:
+    """去掉密码等敏感字段的商家记录"""
+    return {key: value for key, value in merchant.items() if key not in MERCHANT_SECRET_FIELDS}
+
+class SessionBackend(ABC):
+    """会话共享存储接口，会话以令牌摘要为键，值为可 JSON 序列化的字典"""
+
+    @abstractmethod
+    async def get(self, token_hash: str) -> Optional[Dict[str, Any]]:
+        """返回会话（含 expires_at 时间戳），不存在时返回 None"""
+
+    @abstractmethod
+    async def set(self, token_hash: str, session: Dict[str, Any], expires_at: float) -> None:
+        """保存会话，expires_at 为过期时间戳"""
+
+    @abstractmethod
+    async def delete(self, token_hash: str) -> None:
+        """删除一个会话"""
+
+    @abstractmethod
+    async def delete_merchant(self, merchant_id: Any) -> None:
+        """删除商家的全部会话"""
+
+    @abstractmethod
+    def delete_merchant_sync(self, merchant_id: Any) -> None:
+        """删除商家的全部会话（同步，供同步调用方和脚本使用）"""
+
+class MySQLSessionBackend(SessionBackend):
+    """会话保存在 t_merchant_session 表"""
+
+    def __init__(self, session_dao: Optional[SessionDAO] = None) -> None:
+        self.session_dao = session_dao or SessionDAO()
+
+    async def get(self, token_hash: str) -> Optional[Dict[str, Any]]:
+        row = await self.session_dao.get_session_async(token_hash)
+        if row is None:
+            return None
+        session = json.loads(row["data"])
+        session["expires_at"] = row["expire_time"].timestamp()
+        return session
+
+    async def set(self, token_hash: str, session: Dict[str, Any], expires_at: float) -> None:
+        data = json.dumps(session, ensure_ascii=False, default=str)
+        await self.session_dao.save_session_async(
+            token_hash, session["merchant_id"], data, datetime.fromtimestamp(expires_at)
+        )
+
+    async def delete(self, token_hash: str) -> None:
+        await self.session_dao.delete_session_async(token_hash)
+
+    async def delete_merchant(self, merchant_id: Any) -> None:
+        await self.session_dao.delete_merchant_sessions_async(merchant_id)
+
+    def delete_merchant_sync(self, merchant_id: Any) -> None:
+        self.session_dao.delete_merchant_sessions(merchant_id)
+
+SESSION_BACKENDS = {
+    "memory": None,
+    "mysql": MySQLSessionBackend
+}
+
+class SessionService(BaseService):
+    """
+    商家登录会话
+
+    登录时签发随机令牌，会话（含去掉密码等敏感字段的商家记录）先查进程内缓存，命中时校验只是一次字典查找，
+    不访问数据库；配置共享存储时缓存未命中再查共享存储，进程内最多缓存 SESSION_LOCAL_TTL 秒。
+    缓存和共享存储都以令牌的 SHA-256 摘要为键。
+    """
+
+    def __init__(self, backend: Optional[SessionBackend] = None) -> None:
+        super().__init__()
+        if SESSION_BACKEND not in SESSION_BACKENDS:
+            raise ValueError(f"不支持的会话存储: {SESSION_BACKEND}")
+        if backend is None and SESSION_BACKENDS[SESSION_BACKEND] is not None:
+            backend = SESSION_BACKENDS[SESSION_BACKEND]()
+        self.backend = backend
+        self.ttl = SESSION_TTL_DAYS * 86400
+        self.local_ttl = SESSION_LOCAL_TTL if backend is not None else self.ttl
+        self.cache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=self.local_ttl)
+
+    @staticmethod
+    def _hash(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    async def create_session(self, merchant: Dict[str, Any]) -> Dict[str, Any]:
+        """为登录成功的商家创建会话，返回 {"token", "expires_at"}"""
+        token = secrets.token_urlsafe(32)
+        expires_at = time.time() + self.ttl
+        session = {
+            "merchant_id": merchant.get("id"),
+            "merchant": public_merchant(merchant)
+        }
+        token_hash = self._hash(token)
+        if self.backend is not None:
+            await self.backend.set(token_hash, session, expires_at)
+        self.cache.set(token_hash, {**session, "expires_at": expires_at}, ttl=min(self.local_ttl, self.ttl))
+        return {"token": token, "expires_at": datetime.fromtimestamp(expires_at)}
+
+    async def get_session(self, token: str) -> Optional[Dict[str, Any]]:
+        """校验令牌，返回会话（merchant_id、merchant、expires_at），无效或已过期返回 None"""
+        if not token:
+            return None
+        token_hash = self._hash(token)
+        session = self.cache.get(token_hash)
+        if session is None and self.backend is not None:
+            session = await self.backend.get(token_hash)
+            if session is not None:
+                remaining = session["expires_at"] - time.time()
+                if remaining > 0:
+                    self.cache.set(token_hash, session, ttl=min(self.local_ttl, remaining))
+        if session is None or session["expires_at"] <= time.time():
+            return None
+        return session
+
+    async def revoke_session(self, token: str) -> None:
+        """注销：删除会话（使用共享存储时其他进程的缓存最多 SESSION_LOCAL_TTL 秒后失效）"""
+        if not token:
+            return
+        token_hash = self._hash(token)
+        self.cache.pop(token_hash)
+        if self.backend is not None:
+            await self.backend.delete(token_hash)
+
+    async def revoke_merchant_sessions(self, merchant_id: Any) -> None:
+        """删除商家的全部会话，修改密码、停用商家后调用"""
+        self.cache.remove_where(lambda session: session.get("merchant_id") == merchant_id)
+        if self.backend is not None:
+            await self.backend.delete_merchant(merchant_id)
+
+    def revoke_merchant_sessions_sync(self, merchant_id: Any) -> None:
+        """同 revoke_merchant_sessions（同步），同步更新商家时使用"""
+        self.cache.remove_where(lambda session: session.get("merchant_id") == merchant_id)
+        if self.backend is not None:
+            self.backend.delete_merchant_sync(merchant_id)
+
+    def stats(self) -> Dict[str, Any]:
+        backend = type(self.backend).__name__ if self.backend is not None else "memory"
+        return {"backend": backend, **self.cache.stats()}
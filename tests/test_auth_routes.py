@@ -0,0 +1,88 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def logged_in(client):
+    main.app.dependency_overrides[main.current_merchant] = lambda: {"id": 7, "username": "shop"}
+    yield client
+    main.app.dependency_overrides.clear()
+
+
+@pytest.mark.parametrize("method, path", [
+    ("get", "/orders/export"),
+    ("get", "/recalls/export"),
+    ("post", "/orders/create"),
+    ("post", "/recalls/create"),
+    ("get", "/recalls/jobs/job"),
+    ("get", "/metrics"),
+])
+def test_routes_require_login(client, method, path):
+    assert getattr(client, method)(f"{path}?merchant_id=1").status_code == 401
+
+
+def test_export_uses_session_merchant(logged_in, monkeypatch):
+    calls = []
+
+    def export_orders(merchant_id, start_date, end_date, **kwargs):
+        calls.append(merchant_id)
+        return iter([b"id\n"]), "text/csv", "orders.csv"
+
+    monkeypatch.setattr(main.exportService, "export_orders", export_orders)
+    response = logged_in.get("/orders/export?merchant_id=1&start_date=2024-01-01")
+
+    assert response.status_code == 200
+    # 查询参数中的 merchant_id 被忽略
+    assert calls == [7]
+
+
+def test_create_recalls_passes_only_recipient_fields(logged_in, monkeypatch):
+    received = []
+
+    async def create_recalls_async(recalls, cap_days=None):
+        received.extend(recalls)
+        return {"status": "success", "job_id": "job", "total": len(recalls), "capped": 0}
+
+    monkeypatch.setattr(main.recallService, "create_recalls_async", create_recalls_async)
+    response = logged_in.post("/recalls/create", json={"recall_users": [
+        {"merchant_id": 1, "user_name": "张三", "contact": "13800138000", "contact_type": "mobile",
+         "token": "forged", "token_expired": "2099-01-01"}
+    ]})
+
+    assert response.json()["job_id"] == "job"
+    assert received == [{"merchant_id": 7, "user_name": "张三", "product": None, "product_type": None,
+                         "contact": "13800138000", "contact_type": "mobile"}]
+
+
+def test_create_orders_uses_session_merchant(logged_in, monkeypatch):
+    received = []
+
+    async def create_orders_async(orders, mode="insert", update_columns=None, merchant_id=None):
+        received.append(merchant_id)
+        return {"status": "success"}
+
+    monkeypatch.setattr(main.orderService, "create_orders_async", create_orders_async)
+    logged_in.post("/orders/create", json={"orders": [{"merchant_id": 1, "order_id": "A1"}]})
+
+    assert received == [7]
+
+
+def test_recall_job_scoped_to_session_merchant(logged_in, monkeypatch):
+    received = []
+
+    async def get_delivery_job_async(job_id, merchant_id=None):
+        received.append((job_id, merchant_id))
+        return None
+
+    monkeypatch.setattr(main.recallService, "get_delivery_job_async", get_delivery_job_async)
+    response = logged_in.get("/recalls/jobs/job1")
+
+    assert response.json()["message"] == "任务不存在"
+    assert received == [("job1", 7)]
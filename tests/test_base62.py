@@ -0,0 +1,31 @@
+import pytest
+
+from utils.token import base62
+
+
+@pytest.mark.parametrize("number", [0, 1, 61, 62, 3843, 3844, 10 ** 6, 2 ** 64 - 1])
+def test_round_trip(number):
+    assert base62.decode(base62.encode(number)) == number
+
+
+def test_encode_known_values():
+    assert base62.encode(0) == "0"
+    assert base62.encode(61) == "z"
+    assert base62.encode(62) == "10"
+    assert base62.encode(5, width=4) == "0005"
+    # width 只补位，不截断
+    assert base62.encode(62 ** 4, width=2) == "10000"
+
+
+def test_order_preserved_at_fixed_width():
+    codes = [base62.encode(number, width=4) for number in (0, 9, 10, 35, 36, 61, 62, 3843)]
+    assert codes == sorted(codes)
+
+
+def test_invalid_input():
+    with pytest.raises(ValueError):
+        base62.encode(-1)
+    with pytest.raises(ValueError):
+        base62.decode("")
+    with pytest.raises(ValueError):
+        base62.decode("ab-c")
@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from services.click_buffer import ClickBuffer
+
+
+class FakeRecallDAO:
+    def __init__(self, fail_on_call=None):
+        self.calls = []
+        self.fail_on_call = fail_on_call
+
+    async def mark_recalls_clicked_batch_async(self, tokens, click_time):
+        self.calls.append((list(tokens), click_time))
+        if len(self.calls) == self.fail_on_call:
+            raise RuntimeError("db down")
+        return len(tokens)
+
+
+def test_add_coalesces_duplicate_tokens():
+    buffer = ClickBuffer(FakeRecallDAO(), max_events=10)
+    first = datetime(2024, 6, 1, 8, 0, 0)
+    assert buffer.add("a", first)
+    assert not buffer.add("a", datetime(2024, 6, 1, 8, 0, 1))
+    assert buffer.pending_click_time("a") == first
+    assert buffer.pending_click_time("b") is None
+    assert buffer.stats()["coalesced"] == 1
+
+
+def test_flush_writes_batches_and_counts_them():
+    dao = FakeRecallDAO()
+    buffer = ClickBuffer(dao, max_events=2)
+    for i, token in enumerate("abcde"):
+        buffer.add(token, datetime(2024, 6, 1, 8, 0, i))
+
+    assert asyncio.run(buffer.flush()) == 5
+
+    assert [tokens for tokens, _ in dao.calls] == [["a", "b"], ["c", "d"], ["e"]]
+    # 批次的点击时间取批次内最早的点击
+    assert dao.calls[1][1] == datetime(2024, 6, 1, 8, 0, 2)
+    stats = buffer.stats()
+    assert (stats["pending"], stats["flushed_batches"], stats["flushed_tokens"]) == (0, 3, 5)
+
+
+def test_failed_batch_is_requeued():
+    dao = FakeRecallDAO(fail_on_call=2)
+    buffer = ClickBuffer(dao, max_events=2)
+    for token in "abcd":
+        buffer.add(token)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(buffer.flush())
+
+    # 第一批已落库，失败的一批放回缓冲区
+    assert buffer.pending_click_time("a") is None
+    assert buffer.pending_click_time("c") is not None
+    assert buffer.stats()["flushed_batches"] == 1
+
+    dao.fail_on_call = None
+    assert asyncio.run(buffer.flush()) == 2
+    assert dao.calls[-1][0] == ["c", "d"]
+    assert buffer.stats()["pending"] == 0
+
+
+def test_requeue_keeps_newer_click_for_same_token():
+    dao = FakeRecallDAO(fail_on_call=1)
+    buffer = ClickBuffer(dao, max_events=10)
+    original = datetime(2024, 6, 1, 8, 0, 0)
+    buffer.add("a", original)
+    with pytest.raises(RuntimeError):
+        asyncio.run(buffer.flush())
+    assert buffer.pending_click_time("a") == original
@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+import pytest
+
+from utils.stream.json_stream import iter_json_records
+
+
+async def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def _collect(data: bytes, size: int = 7):
+    async def run():
+        return [item async for item in iter_json_records(_chunks(data, size))]
+    return asyncio.run(run())
+
+
+def test_ndjson_records_split_across_chunks():
+    records = [{"order_id": i, "user_name": f"user{i}"} for i in range(20)]
+    data = "\n".join(json.dumps(record) for record in records).encode()
+    assert [record for record, _ in _collect(data)] == records
+
+
+def test_json_array_records():
+    records = [{"order_id": i, "amount": i * 1.5} for i in range(10)]
+    data = json.dumps(records).encode()
+    assert [record for record, _ in _collect(data, size=5)] == records
+
+
+def test_size_is_utf8_bytes():
+    line = json.dumps({"user_name": "张三", "address": "北京市朝阳区"}, ensure_ascii=False)
+    for data in (line.encode(), f"[{line}]".encode()):
+        (record, size), = _collect(data, size=4)
+        assert record["user_name"] == "张三"
+        assert size == len(line.encode("utf-8"))
+        assert size > len(line)
+
+
+def test_malformed_ndjson_line_does_not_stop_stream():
+    data = b'{"order_id": 1}\n{"order_id": \n{"order_id": 3}\n'
+    records = [record for record, _ in _collect(data)]
+    assert records == [{"order_id": 1}, None, {"order_id": 3}]
+
+
+def test_malformed_last_ndjson_line():
+    records = [record for record, _ in _collect(b'{"order_id": 1}\n{oops')]
+    assert records == [{"order_id": 1}, None]
+
+
+def test_unterminated_array_raises():
+    with pytest.raises(ValueError):
+        _collect(b'[{"order_id": 1}, {"order_id": 2}')
@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+import services.order_service as order_service
+from services.order_service import OrderService
+
+
+async def _chunks(data: bytes):
+    yield data
+
+
+def test_stream_rejects_bad_line_and_bounds_chunks_by_bytes(monkeypatch):
+    written = []
+
+    async def insert_chunk(rows):
+        written.append(list(rows))
+        return len(rows)
+
+    monkeypatch.setattr(order_service.orderDAO, "insert_orders_chunk_async", insert_chunk)
+    line = json.dumps({"order_id": "1", "name": "张" * 100}, ensure_ascii=False)
+    data = "\n".join([line, "{broken", line, line]).encode()
+    line_bytes = len(line.encode("utf-8"))
+
+    result = asyncio.run(OrderService().create_orders_stream(_chunks(data), max_chunk_bytes=line_bytes * 2))
+
+    assert result["status"] == "success"
+    assert result["rejected_rows"] == 1
+    assert result["total_rows"] == 3
+    assert [len(rows) for rows in written] == [2, 1]
+    assert all(chunk["bytes"] <= line_bytes * 2 for chunk in result["chunks"])
+
+
+def test_stream_rejects_unknown_columns(monkeypatch):
+    written = []
+
+    async def insert_chunk(rows):
+        written.append(list(rows))
+        return len(rows)
+
+    monkeypatch.setattr(order_service.orderDAO, "insert_orders_chunk_async", insert_chunk)
+    lines = [
+        {"order_id": "1", "amount": 10},
+        {"order_id": "2", "amount = 0, merchant_id = (SELECT 1) -- ": 1},
+        {"order_id": "3", "no_such_column": 1},
+        {"order_id": "4", "amount": 20},
+    ]
+    data = "\n".join(json.dumps(line) for line in lines).encode()
+
+    result = asyncio.run(OrderService().create_orders_stream(_chunks(data), merchant_id=7))
+
+    assert result["rejected_rows"] == 2
+    assert written == [[{"order_id": "1", "amount": 10, "merchant_id": 7},
+                        {"order_id": "4", "amount": 20, "merchant_id": 7}]]
+
+
+def test_insert_rejects_unknown_columns(monkeypatch):
+    async def batch_create(orders):
+        raise AssertionError("不应写入")
+
+    monkeypatch.setattr(order_service.orderDAO, "batch_create_orders_async", batch_create)
+    result = asyncio.run(OrderService().create_orders_async([{"order_id": "1", "evil`": 1}], merchant_id=7))
+
+    assert result["status"] == "error"
+    assert "evil`" in result["message"]
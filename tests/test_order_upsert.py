@@ -0,0 +1,156 @@
+from datetime import datetime
+
+import pytest
+
+from services.dao.order_daily_dao import OrderDailyDAO
+from services.dao.order_dao import OrderDAO
+from services.dao.query_builder import QueryBuilder
+
+
+def test_build_upsert_query_on_duplicate_key_update():
+    rows = [{"merchant_id": 1, "order_id": "A1", "amount": 10}, {"merchant_id": 1, "order_id": "A2"}]
+    sql, params_list = QueryBuilder.build_upsert_query("t_order", rows, ["amount"])
+    assert sql == ("INSERT INTO t_order (merchant_id, order_id, amount) VALUES (%s, %s, %s) "
+                   "ON DUPLICATE KEY UPDATE amount = VALUES(amount)")
+    assert params_list == [(1, "A1", 10), (1, "A2", None)]
+
+
+def test_build_upsert_query_ignore():
+    sql, _ = QueryBuilder.build_upsert_query("t_order", [{"merchant_id": 1, "order_id": "A1"}], ignore=True)
+    assert sql.startswith("INSERT IGNORE INTO t_order (merchant_id, order_id)")
+
+
+def test_build_upsert_query_requires_update_columns():
+    with pytest.raises(ValueError):
+        QueryBuilder.build_upsert_query("t_order", [{"merchant_id": 1, "order_id": "A1"}])
+
+
+def test_upsert_rejects_unknown_columns():
+    with pytest.raises(ValueError):
+        OrderDAO()._check_upsert_columns([{"merchant_id": 1, "order_id": "A1", "password": "x"}], None)
+
+
+def test_upsert_counts():
+    # 3 行：1 行新增（影响 1），1 行更新（影响 2），1 行值未变化（影响 0）
+    assert OrderDAO._upsert_counts(3, 2, 3, 0, ignore=False) == {"inserted": 1, "updated": 1, "skipped": 1}
+    assert OrderDAO._upsert_counts(3, 2, 1, 1, ignore=True) == {"inserted": 1, "updated": 0, "skipped": 3}
+
+
+def test_upsert_defers_refresh_of_updated_orders():
+    dao = OrderDAO()
+    rows = [
+        {"merchant_id": 1, "order_id": "A1", "user_id": "u1", "amount": 10, "create_time": "2024-06-02 10:00:00"},
+        {"merchant_id": 1, "order_id": "A2", "user_id": "u2", "amount": 20, "create_time": "2024-06-02 11:00:00"},
+    ]
+    existing = {("1", "A1"): {"merchant_id": 1, "order_id": "A1", "user_id": "u0",
+                              "create_time": "2024-06-01 09:00:00"}}
+    refresh = dao.new_summary_refresh()
+
+    queries, rollup_orders = dao._build_summary_queries(rows, existing, False, refresh)
+
+    # 写入事务中只累加新订单
+    assert rollup_orders == [rows[1]]
+    assert len(queries) == 1 and "total_orders = total_orders + VALUES(total_orders)" in queries[0][0]
+    # 被更新的订单：新旧用户、新旧日期提交后重算
+    assert refresh["users"] == {(1, "u0"), (1, "u1")}
+    assert refresh["days"] == {(1, "2024-06-01"), (1, "2024-06-02")}
+    user_queries, day_queries = dao._build_refresh_batches(refresh)
+    assert len(user_queries) == 1
+    assert [queries[0][1] for queries in day_queries] == [["2024-06-01", 1], ["2024-06-02", 1]]
+
+
+def test_ignore_mode_never_refreshes():
+    dao = OrderDAO()
+    rows = [{"merchant_id": 1, "order_id": "A1", "user_id": "u1"}]
+    refresh = dao.new_summary_refresh()
+    assert dao._build_summary_queries(rows, {("1", "A1"): {}}, True, refresh) == ([], [])
+    assert refresh == {"users": set(), "days": set()}
+
+
+def test_upsert_stamps_create_time_without_updating_it():
+    dao = OrderDAO()
+    rows = [{"merchant_id": 1, "order_id": "A1", "user_id": "u1", "amount": 10}]
+    update_columns = dao._check_upsert_columns(rows, None)
+    sql, params_list, rows = dao._build_upsert(rows, {}, update_columns, False)
+
+    # 写入时间只用于新订单，已有订单的下单时间不被覆盖
+    assert update_columns == ["user_id", "amount"]
+    assert "create_time = VALUES(create_time)" not in sql
+    assert rows[0]["create_time"].microsecond == 0
+    assert params_list[0][-1] == rows[0]["create_time"]
+
+    existing = {("1", "A1"): {"merchant_id": 1, "order_id": "A1", "user_id": "u1",
+                              "create_time": "2024-06-01 09:00:00"}}
+    refresh = dao.new_summary_refresh()
+    dao._build_summary_queries(rows, existing, False, refresh, update_columns)
+    assert refresh["days"] == {(1, "2024-06-01")}
+
+
+def test_rollup_day_comes_from_row_create_time():
+    dao = OrderDailyDAO()
+    rows = OrderDAO._with_create_time([
+        {"merchant_id": 1, "user_id": "u1", "amount": 10, "create_time": "2024-06-01 23:59:59"},
+        {"merchant_id": 1, "user_id": "u2", "amount": 5},
+    ])
+    groups = dao._group_orders(rows)
+
+    assert (1, "2024-06-01") in groups
+    assert (1, str(rows[1]["create_time"])[:10]) in groups
+
+
+def test_create_order_updates_summaries(monkeypatch):
+    dao = OrderDAO()
+    writes = []
+    monkeypatch.setattr(dao, "_write_with_summary",
+                        lambda sql, params, summary_queries, rollup_orders: writes.append(
+                            (sql, summary_queries, rollup_orders)) or 1)
+
+    assert dao.create_order({"merchant_id": 1, "order_id": "A1", "user_id": "u1", "amount": 10}) == 1
+
+    sql, summary_queries, rollup_orders = writes[0]
+    assert "create_time" in sql
+    assert len(summary_queries) == 1 and "t_user_summary" in summary_queries[0][0]
+    assert rollup_orders[0]["create_time"]
+
+
+def test_update_order_refreshes_affected_summaries(monkeypatch):
+    dao = OrderDAO()
+    refreshed = []
+    monkeypatch.setattr(dao, "execute_query", lambda sql, params: [
+        {"merchant_id": 1, "user_id": "u1", "create_time": "2024-06-01 09:00:00"}])
+    monkeypatch.setattr(dao, "execute_update", lambda sql, params: 1)
+    monkeypatch.setattr(dao, "refresh_summaries", refreshed.append)
+
+    assert dao.update_order(5, {"user_id": "u2", "amount": 30}) == 1
+    assert refreshed == [{"users": {(1, "u1"), (1, "u2")}, "days": {(1, "2024-06-01")}}]
+
+    # 不影响汇总的字段只更新订单
+    monkeypatch.setattr(dao, "execute_query", lambda sql, params: pytest.fail("不应查询旧订单"))
+    assert dao.update_order(5, {"name": "张三"}) == 1
+    assert len(refreshed) == 1
+
+
+@pytest.mark.parametrize("ignore", [False, True])
+def test_repushed_order_keeps_stored_create_time(monkeypatch, ignore):
+    dao = OrderDAO()
+    stored = datetime(2024, 6, 1, 9, 0, 0)
+    writes = []
+    monkeypatch.setattr(dao, "execute_query", lambda sql, params: [
+        {"merchant_id": 1, "order_id": "A1", "user_id": "u1", "create_time": stored}])
+    monkeypatch.setattr(dao, "_write_with_summary", lambda sql, params, summary_queries, rollup_orders, many: (
+        writes.append((sql, params, rollup_orders)) or (1 if ignore else 3)))
+    monkeypatch.setattr(dao, "refresh_summaries", lambda refresh: None)
+
+    # 重复推送的订单没有 create_time，另一个同时推送的新订单填入写入时间
+    counts = dao.upsert_orders([{"merchant_id": 1, "order_id": "A1", "user_id": "u1", "amount": 30},
+                                {"merchant_id": 1, "order_id": "A2", "user_id": "u1", "amount": 5}],
+                               ignore=ignore, pending_refresh=dao.new_summary_refresh())
+
+    sql, params, rollup_orders = writes[0]
+    columns = sql[sql.index("(") + 1:sql.index(")")].split(", ")
+    create_times = [row[columns.index("create_time")] for row in params]
+    assert create_times[0] == stored
+    assert create_times[1] != stored
+    # 已有订单不计入新增
+    assert [row["order_id"] for row in rollup_orders] == ["A2"]
+    assert counts["inserted"] == 1
@@ -0,0 +1,105 @@
+from services.dao.outbox_dao import OUTBOX_FAILED, OUTBOX_PENDING, outbox_channel
+from services.dao.recall_dao import RecallDAO
+from services.delivery_service import DeliveryPipeline
+from utils.qywechat.qywechat import WeChatOutboxSender
+
+
+def test_outbox_channel_by_contact_type():
+    assert outbox_channel("mobile") == "sms"
+    assert outbox_channel(None) == "sms"
+    assert outbox_channel("qywechat") == "qywechat"
+    assert outbox_channel("email") is None
+
+
+def test_outbox_rows_routed_per_recall():
+    recalls = [
+        {"merchant_id": 1, "token": "a", "contact_type": "mobile"},
+        {"merchant_id": 1, "token": "b", "contact_type": "qywechat"},
+        {"merchant_id": 1, "token": "c", "contact_type": "email"},
+    ]
+    sql, params = RecallDAO._build_outbox_insert(recalls, "job")
+
+    assert "t_recall_outbox" in sql
+    columns = sql[sql.index("(") + 1:sql.index(")")].replace("`", "").split(", ")
+    rows = [dict(zip(columns, values)) for values in params]
+    assert [(row["recall_token"], row["channel"], row["status"]) for row in rows] == [
+        ("a", "sms", OUTBOX_PENDING),
+        ("b", "qywechat", OUTBOX_PENDING),
+        ("c", "email", OUTBOX_FAILED),
+    ]
+    assert rows[0]["error"] is None
+    assert "email" in rows[2]["error"]
+
+
+def test_parse_wechat_results():
+    flags, error, retryable = DeliveryPipeline._parse_result(
+        {"sent": 1, "failed": 1, "results": [True, False]}, 2)
+    assert flags == [True, False]
+    assert error
+    assert retryable
+
+    flags, error, _ = DeliveryPipeline._parse_result({"sent": 2, "failed": 0, "results": [True, True]}, 2)
+    assert flags == [True, True]
+    assert error is None
+
+
+def test_parse_config_error_not_retried():
+    flags, error, retryable = DeliveryPipeline._parse_result({"status": "error", "message": "未配置"}, 2)
+    assert flags == [False, False]
+    assert error == "未配置"
+    assert not retryable
+
+
+def test_wechat_sender_requires_config(monkeypatch):
+    monkeypatch.delenv("WECHAT_CORP_ID", raising=False)
+    monkeypatch.delenv("WECHAT_SECRET", raising=False)
+    result = WeChatOutboxSender(sender_userid="zhangsan").send_recall_messages([{"contact": "wm1"}])
+    assert result["status"] == "error"
+
+
+def test_wechat_sender_builds_strategies(monkeypatch):
+    monkeypatch.setenv("WECHAT_CORP_ID", "corp")
+    monkeypatch.setenv("WECHAT_SECRET", "secret")
+    sent = []
+
+    class Sender:
+        def send_recall_messages(self, strategies):
+            sent.extend(strategies)
+            return {"sent": len(strategies), "failed": 0, "results": [True] * len(strategies)}
+
+    sender = WeChatOutboxSender(sender_userid="zhangsan", text_template="{user_name}:{product}:{url}")
+    sender._sender = Sender()
+    sender.send_recall_messages([{"contact": "wm1", "user_name": "张三", "product": "游戏", "url": "http://x/r/1"}])
+
+    assert sent == [{
+        "sender_userid": "zhangsan",
+        "external_userid": "wm1",
+        "personalized_copy": {"body": "张三:游戏:http://x/r/1"},
+    }]
+
+
+class _YunpianResult:
+    def __init__(self, data):
+        self._data = data
+
+    def is_succ(self):
+        return True
+
+    def data(self):
+        return self._data
+
+
+def test_parse_sms_results():
+    flags, error, retryable = DeliveryPipeline._parse_result(
+        _YunpianResult({"data": [{"code": 0}, {"code": 2, "msg": "手机号格式错误"}]}), 2)
+    assert flags == [True, False]
+    assert error == "手机号格式错误"
+    assert not retryable
+
+
+def test_sms_results_missing_not_marked_sent():
+    for data in (None, {}, {"data": [{"code": 0}]}):
+        flags, error, retryable = DeliveryPipeline._parse_result(_YunpianResult(data), 2)
+        assert flags == [False, False]
+        assert error
+        assert not retryable
@@ -0,0 +1,61 @@
+import pymysql
+import pytest
+
+from services.dao.merchant_dao import MerchantDAO
+from services.dao.order_dao import OrderDAO
+from services.dao.recall_dao import RecallDAO
+
+
+class FakeCursor:
+    def __init__(self, results):
+        self.results = results
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+    def fetchone(self):
+        return self.results.pop(0)[0]
+
+
+class FakeConnection:
+    """与 pymysql.Connection.cursor(cursor=None) 签名一致"""
+
+    def __init__(self, results):
+        self.cursors = []
+        self.results = results
+        self.closed = False
+
+    def cursor(self, cursor=None):
+        assert cursor is pymysql.cursors.DictCursor
+        self.cursors.append(FakeCursor(self.results))
+        return self.cursors[-1]
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("dao, method", [
+    (OrderDAO(), "query_orders_paginated"),
+    (RecallDAO(), "query_recalls_paginated"),
+    (MerchantDAO(), "query_merchants_paginated"),
+])
+def test_paginated_query_uses_dict_cursor(monkeypatch, dao, method):
+    conn = FakeConnection([[{"id": 1}, {"id": 2}], [{"total": 3}]])
+    monkeypatch.setattr(dao, "_get_connection", lambda: conn)
+
+    result = getattr(dao, method)(conditions={"merchant_id": 1}, page=1, page_size=2)
+
+    assert result["data"] == [{"id": 1}, {"id": 2}]
+    assert result["pagination"]["total"] == 3
+    assert result["pagination"]["total_pages"] == 2
+    assert conn.closed
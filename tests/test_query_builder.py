@@ -0,0 +1,155 @@
+import threading
+from collections import OrderedDict
+
+import pytest
+
+from services.dao import query_builder
+from services.dao.query_builder import QueryBuilder
+
+
+@pytest.fixture
+def shape_cache(monkeypatch):
+    monkeypatch.setattr(query_builder, "_shape_cache", OrderedDict())
+    monkeypatch.setattr(query_builder, "_shape_stats", {"hits": 0, "misses": 0, "evictions": 0})
+    return query_builder
+
+
+def test_same_shape_reuses_template(shape_cache):
+    sql1, params1 = QueryBuilder.build_select_query("t_order", conditions={"merchant_id": 1, "status": "paid"}, limit=10)
+    sql2, params2 = QueryBuilder.build_select_query("t_order", conditions={"merchant_id": 2, "status": "new"}, limit=20)
+
+    assert sql1 is sql2
+    assert sql1 == "SELECT * FROM t_order WHERE merchant_id = %s AND status = %s LIMIT %s"
+    assert params1 == [1, "paid", 10]
+    assert params2 == [2, "new", 20]
+    info = QueryBuilder.shape_cache_info()
+    assert (info["size"], info["hits"], info["misses"]) == (1, 1, 1)
+
+
+def test_none_conditions_skipped(shape_cache):
+    sql, params = QueryBuilder.build_select_query("t_order", conditions={"merchant_id": 1, "status": None})
+    assert sql == "SELECT * FROM t_order WHERE merchant_id = %s"
+    assert params == [1]
+
+
+def test_in_list_padded_to_power_of_two(shape_cache):
+    sql3, params3 = QueryBuilder.build_select_query("t_order", conditions={"id": [1, 2, 3]})
+    sql4, _ = QueryBuilder.build_select_query("t_order", conditions={"id": {"$in": [4, 5, 6, 7]}})
+    sql5, _ = QueryBuilder.build_select_query("t_order", conditions={"id": [1, 2, 3, 4, 5]})
+
+    assert sql3 is sql4
+    assert sql3.endswith("id IN (%s, %s, %s, %s)")
+    # 不足的位置用最后一个值补齐，结果不变
+    assert params3 == [1, 2, 3, 3]
+    assert sql5.count("%s") == 8
+
+
+def test_operators_render_in_order(shape_cache):
+    sql, params = QueryBuilder.build_select_query("t_order", conditions={
+        "create_time": {"$gte": "2024-01-01", "$lt": "2024-02-01"},
+        "amount": {"$between": [1, 9]},
+        "user_name": {"$like": "张"},
+        "paid": True,
+    })
+
+    assert sql == ("SELECT * FROM t_order WHERE create_time >= %s AND create_time < %s "
+                   "AND amount BETWEEN %s AND %s AND user_name LIKE %s AND paid = %s")
+    assert params == ["2024-01-01", "2024-02-01", 1, 9, "%张%", 1]
+
+
+def test_update_and_where_share_cache(shape_cache):
+    sql, params = QueryBuilder.build_update_query("t_recall", {"click": 1, "click_time": None}, {"token": "a"})
+    assert sql == "UPDATE t_recall SET click = %s WHERE token = %s"
+    assert params == [1, "a"]
+    assert QueryBuilder._build_where_clause({"token": "b"}) == ("WHERE token = %s", ["b"])
+    # 三种语句的结构互不冲突
+    assert QueryBuilder.shape_cache_info()["size"] == 2
+
+    with pytest.raises(ValueError):
+        QueryBuilder.build_update_query("t_recall", {"click": None}, {"token": "a"})
+
+
+def test_least_recently_used_shape_evicted(shape_cache, monkeypatch):
+    monkeypatch.setattr(shape_cache, "QUERY_SHAPE_CACHE_SIZE", 2)
+    for column in ("a", "b", "a", "c"):
+        QueryBuilder.build_select_query("t", conditions={column: 1})
+
+    info = QueryBuilder.shape_cache_info()
+    assert (info["size"], info["evictions"]) == (2, 1)
+    # 最近用过的 a 保留，b 被淘汰
+    QueryBuilder.build_select_query("t", conditions={"a": 1})
+    assert QueryBuilder.shape_cache_info()["hits"] == 2
+    QueryBuilder.build_select_query("t", conditions={"b": 1})
+    assert QueryBuilder.shape_cache_info()["misses"] == 4
+
+
+def test_counters_consistent_across_threads(shape_cache, monkeypatch):
+    monkeypatch.setattr(shape_cache, "QUERY_SHAPE_CACHE_SIZE", 4)
+
+    def build(worker):
+        for i in range(500):
+            QueryBuilder.build_select_query("t", conditions={f"c{(worker + i) % 6}": i})
+
+    threads = [threading.Thread(target=build, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    info = QueryBuilder.shape_cache_info()
+    assert info["hits"] + info["misses"] == 8 * 500
+    assert info["size"] <= 4
+
+
+def test_cache_disabled(shape_cache, monkeypatch):
+    monkeypatch.setattr(shape_cache, "QUERY_SHAPE_CACHE_SIZE", 0)
+    sql, _ = QueryBuilder.build_select_query("t", conditions={"a": 1})
+    assert sql == "SELECT * FROM t WHERE a = %s"
+    assert QueryBuilder.shape_cache_info()["size"] == 0
+
+
+def test_keyset_first_page():
+    sql, params = QueryBuilder.build_keyset_query("t_order", fields=["order_id"], conditions={"merchant_id": 1},
+                                                  order_column="create_time", page_size=20)
+
+    assert sql == ("SELECT order_id, create_time, id FROM t_order WHERE merchant_id = %s "
+                   "ORDER BY create_time DESC, id DESC LIMIT %s")
+    assert params == [1, 21]
+
+
+def test_keyset_continues_from_cursor():
+    cursor = QueryBuilder.encode_cursor("2024-01-02 03:04:05", 99, "create_time", False)
+    sql, params = QueryBuilder.build_keyset_query("t_order", order_column="create_time",
+                                                  descending=False, cursor=cursor, page_size=10)
+
+    assert sql == ("SELECT * FROM t_order WHERE (create_time > %s OR (create_time = %s AND id > %s)) "
+                   "ORDER BY create_time ASC, id ASC LIMIT %s")
+    assert params == ["2024-01-02 03:04:05", "2024-01-02 03:04:05", 99, 11]
+
+
+def test_next_cursor_round_trip():
+    rows = [{"id": 5, "amount": 30}, {"id": 4, "amount": 20}, {"id": 3, "amount": 10}]
+
+    page, cursor = QueryBuilder.build_next_cursor(rows, 2, order_column="amount")
+    assert page == rows[:2]
+    assert "=" not in cursor
+    assert QueryBuilder.decode_cursor(cursor, "amount", True) == (20, 4)
+
+    page, cursor = QueryBuilder.build_next_cursor(rows[2:], 2, order_column="amount")
+    assert page == rows[2:]
+    assert cursor is None
+
+
+@pytest.mark.parametrize("cursor, order_column, descending", [
+    ("not-a-cursor", "id", True),
+    (QueryBuilder.encode_cursor(1, 1, "id", True), "create_time", True),
+    (QueryBuilder.encode_cursor(1, 1, "id", True), "id", False),
+])
+def test_invalid_cursor_rejected(cursor, order_column, descending):
+    with pytest.raises(ValueError):
+        QueryBuilder.decode_cursor(cursor, order_column, descending)
+
+
+def test_keyset_rejects_unsafe_order_column():
+    with pytest.raises(ValueError):
+        QueryBuilder.build_keyset_query("t_order", order_column="id; DROP TABLE t_order")
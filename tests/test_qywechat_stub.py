@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pytest
+from wechatpy.session.memorystorage import MemoryStorage
+
+from utils.qywechat import qywechat
+from utils.qywechat.qywechat import WeChatRecallSender
+
+
+class StubState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.token_fetches = 0
+        self.templates = []
+        # 按发送员工指定前几次调用返回 45009
+        self.limited = {}
+        self.fail_list = []
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    state = StubState()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if urlparse(self.path).path.endswith("/gettoken"):
+                with state.lock:
+                    state.token_fetches += 1
+                # 放大并发线程同时发现 token 缺失的窗口
+                time.sleep(0.05)
+                self._reply({"errcode": 0, "access_token": "stub-token", "expires_in": 7200})
+            else:
+                self._reply({"errcode": 404})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with state.lock:
+                if state.limited.get(body["sender"], 0) > 0:
+                    state.limited[body["sender"]] -= 1
+                    self._reply({"errcode": 45009, "errmsg": "api freq out of limit"})
+                    return
+                state.templates.append((time.monotonic(), body))
+            self._reply({"errcode": 0, "msgid": f"msg{len(state.templates)}", "fail_list": state.fail_list})
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setenv("WECHAT_CORP_ID", "corp")
+    monkeypatch.setenv("WECHAT_SECRET", "stub-secret")
+    monkeypatch.setattr(qywechat, "_token_storage", MemoryStorage())
+    monkeypatch.setattr(qywechat, "_token_expires_at", {})
+    monkeypatch.setattr(qywechat, "WECHAT_RETRY_BACKOFF", 0.01)
+    state.base_url = f"http://127.0.0.1:{server.server_address[1]}/cgi-bin/"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def _strategy(sender, external_userid, body="回来看看"):
+    return {"sender_userid": sender, "external_userid": external_userid, "personalized_copy": {"body": body}}
+
+
+def test_one_token_fetch_across_threads(stub):
+    sender = WeChatRecallSender(api_base_url=stub.base_url, max_workers=8, rate_limit=0)
+    result = sender.send_recall_messages([_strategy(f"staff{i}", f"wm{i}") for i in range(16)])
+
+    assert result["sent"] == 16
+    assert len(stub.templates) == 16
+    assert stub.token_fetches == 1
+
+    # 另一个客户端直接复用共享的 token 和过期时间
+    other = WeChatRecallSender(api_base_url=stub.base_url)
+    assert other.client.expires_at == sender.client.expires_at
+    other.send_recall_message(_strategy("staff0", "wm0"))
+    assert stub.token_fetches == 1
+
+
+def test_groups_customers_per_sender(stub, monkeypatch):
+    monkeypatch.setattr(qywechat, "MSG_TEMPLATE_MAX_CUSTOMERS", 3)
+    stub.fail_list = ["wm4"]
+    sender = WeChatRecallSender(api_base_url=stub.base_url, rate_limit=0)
+    strategies = [_strategy("a", f"wm{i}") for i in range(5)] + [_strategy("b", "wm9"), {"sender_userid": "b"}]
+    result = sender.send_recall_messages(strategies)
+
+    bodies = sorted((body["sender"], tuple(body["external_userid"])) for _, body in stub.templates)
+    assert bodies == [("a", ("wm0", "wm1", "wm2")), ("a", ("wm3", "wm4")), ("b", ("wm9",))]
+    assert result["results"] == [True, True, True, True, False, True, False]
+    assert result["sent"] == 5
+    assert result["error"]
+
+
+def test_rate_limit_honoured(stub):
+    rate, workers, count = 40, 4, 16
+    sender = WeChatRecallSender(api_base_url=stub.base_url, max_workers=workers, rate_limit=rate)
+    started = time.monotonic()
+    sender.send_recall_messages([_strategy(f"staff{i}", f"wm{i}") for i in range(count)])
+
+    times = sorted(sent_at for sent_at, _ in stub.templates)
+    assert len(times) == count
+    # 令牌桶允许 workers 次突发，其余调用按 rate 次/秒放行
+    assert times[-1] - started >= (count - workers) / rate
+
+
+def test_retries_on_45009(stub):
+    stub.limited = {"staff": 2}
+    sender = WeChatRecallSender(api_base_url=stub.base_url, rate_limit=0)
+    result = sender.send_recall_messages([_strategy("staff", "wm1")])
+
+    assert result["results"] == [True]
+    assert stub.limited["staff"] == 0
+    assert len(stub.templates) == 1
+
+
+def test_gives_up_after_max_retries(stub):
+    stub.limited = {"staff": qywechat.WECHAT_MAX_RETRIES + 1}
+    sender = WeChatRecallSender(api_base_url=stub.base_url, rate_limit=0)
+    result = sender.send_recall_messages([_strategy("staff", "wm1")])
+
+    assert result["results"] == [False]
+    assert result["error"]
+    assert stub.templates == []
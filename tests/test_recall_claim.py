@@ -0,0 +1,122 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from services.dao.recall_dao import (
+    RecallDAO, CLAIM_SUCCESS, CLAIM_USER_MISMATCH, CLAIM_ALREADY_CLAIMED, CLAIM_NOT_FOUND
+)
+from utils.token.recall_token import RecallTokenSigner
+
+
+class FakeCursor:
+    """lock_row 为 SELECT ... FOR UPDATE 读到的领取前状态，claimed 为领取 UPDATE 的影响行数"""
+
+    def __init__(self, lock_row, claimed):
+        self.lock_row = lock_row
+        self.claimed = claimed
+        self.executed = []
+        self.rowcount = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, sql, params=None):
+        self.executed.append((" ".join(sql.split()), params))
+        self.rowcount = self.claimed if sql.lstrip().startswith("UPDATE t_recall\n") else 1
+
+    async def fetchone(self):
+        return self.lock_row
+
+
+@pytest.fixture
+def dao(monkeypatch):
+    dao = RecallDAO()
+    monkeypatch.setattr(dao.token_signer, "accept_legacy", True)
+    return dao
+
+
+def _recall(**changes):
+    return {"merchant_id": 1, "recall_date": date(2024, 6, 1), "click": 0, "claim": 0,
+            "user_name": "alice", "valid": 1, **changes}
+
+
+def _run_claim(dao, monkeypatch, lock_row, claimed, token="legacytoken000001", **kwargs):
+    cursor = FakeCursor(lock_row, claimed)
+
+    class Connection:
+        def cursor(self):
+            return cursor
+
+    @asynccontextmanager
+    async def transaction():
+        yield Connection()
+
+    monkeypatch.setattr(dao, "_transaction_async", transaction)
+    return cursor, asyncio.run(dao.claim_recall_async(token, "alice", **kwargs))
+
+
+def test_claim_records_click_still_buffered_on_another_worker(dao, monkeypatch):
+    claim_time = datetime(2024, 6, 1, 8, 0, 5)
+    dao.token_cache.set("legacytoken000001", {"click": 0, "claim": 0})
+    cursor, result = _run_claim(dao, monkeypatch, _recall(), 1, claim_time=claim_time)
+
+    assert result == CLAIM_SUCCESS
+    lock, claim, rollup = cursor.executed
+    assert lock[0].endswith("FOR UPDATE")
+    # 一条 UPDATE 完成领取和补记点击，不要求 click = 1；click_time 在 click 之前赋值
+    assert claim[0].count("UPDATE") == 1
+    assert "click = 1" not in claim[0].split("WHERE")[1]
+    assert claim[0].index("click_time = IF(click = 0") < claim[0].index("click = 1")
+    # 领取数和点击数在一条语句中累加
+    assert "claimed_count = claimed_count + 1, clicked_count = clicked_count + %s" in rollup[0]
+    assert rollup[1] == (1, 1, date(2024, 6, 1))
+    assert dao.token_cache.get("legacytoken000001") == {
+        "click": 1, "click_time": claim_time, "claim": 1, "claim_time": claim_time
+    }
+
+
+def test_claim_uses_pending_click_time_and_skips_click_count_when_already_clicked(dao, monkeypatch):
+    click_time = datetime(2024, 6, 1, 8, 0, 0)
+    dao.token_cache.set("legacytoken000001", {"click": 1, "claim": 0})
+    cursor, result = _run_claim(dao, monkeypatch, _recall(click=1), 1, click_time=click_time)
+
+    assert result == CLAIM_SUCCESS
+    assert cursor.executed[1][1][1] == click_time
+    assert cursor.executed[2][1][0] == 0
+    assert "click_time" not in dao.token_cache.get("legacytoken000001")
+
+
+@pytest.mark.parametrize("lock_row, expected", [
+    (_recall(user_name="bob"), CLAIM_USER_MISMATCH),
+    (_recall(claim=1), CLAIM_ALREADY_CLAIMED),
+])
+def test_claim_failure_reason_from_locked_row(dao, monkeypatch, lock_row, expected):
+    cursor, result = _run_claim(dao, monkeypatch, lock_row, 0)
+    assert result == expected
+    # 失败时不累加汇总，也不再单独查询原因
+    assert len(cursor.executed) == 2
+
+
+def test_claim_missing_recall(dao, monkeypatch):
+    cursor, result = _run_claim(dao, monkeypatch, None, 0)
+    assert result == CLAIM_NOT_FOUND
+    assert len(cursor.executed) == 1
+
+
+def test_claim_signed_token_keyed_by_id_and_merchant(dao, monkeypatch):
+    dao.token_signer = RecallTokenSigner(secret="s1", previous_secrets="", accept_legacy=False)
+    token = dao.token_signer.issue(42, 1, datetime.now() + timedelta(days=1))
+    claim_time = datetime(2024, 6, 1, 8, 0, 5)
+    cursor, result = _run_claim(dao, monkeypatch, _recall(), 1, token=token, claim_time=claim_time)
+
+    assert result == CLAIM_SUCCESS
+    (lock_sql, lock_params), (claim_sql, claim_params), _ = cursor.executed
+    assert "WHERE id = %s AND merchant_id = %s FOR UPDATE" in lock_sql
+    assert lock_params == (42, 1)
+    assert "WHERE id = %s AND merchant_id = %s AND claim = 0 AND user_name = %s" in claim_sql
+    assert claim_params == (claim_time, claim_time, 42, 1, "alice")
@@ -0,0 +1,103 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+
+from services.dao.recall_dao import RecallDAO
+from utils.token.recall_token import RecallTokenSigner
+
+NEW = "legacytoken00new"
+OLD = "legacytoken00old"
+
+
+class FakeCursor:
+    def __init__(self, locked_rows):
+        self.locked_rows = locked_rows
+        self.executed = []
+        self.rowcount = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, sql, params=None):
+        self.executed.append((" ".join(sql.split()), params))
+        self.rowcount = len(self.locked_rows) if sql.lstrip().startswith("UPDATE t_recall") else 1
+
+    async def fetchall(self):
+        return self.locked_rows
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+def _run_batch(dao, monkeypatch, locked_rows, tokens, click_time):
+    cursor = FakeCursor(locked_rows)
+
+    @asynccontextmanager
+    async def transaction():
+        yield FakeConnection(cursor)
+
+    monkeypatch.setattr(dao, "_transaction_async", transaction)
+    return cursor, asyncio.run(dao.mark_recalls_clicked_batch_async(tokens, click_time))
+
+
+def test_batch_click_updates_cache_only_for_changed_tokens(monkeypatch):
+    dao = RecallDAO()
+    dao.token_signer = RecallTokenSigner(secret="s1", previous_secrets="", accept_legacy=True)
+    original = datetime(2024, 6, 1, 8, 0, 0)
+    dao.token_cache.set(NEW, {"token": NEW, "click": 1, "click_time": datetime(2024, 6, 2, 9, 0, 0)})
+    dao.token_cache.set(OLD, {"token": OLD, "click": 1, "click_time": original})
+    click_time = datetime(2024, 6, 2, 9, 0, 0)
+    cursor, affected = _run_batch(
+        dao, monkeypatch, [{"id": 7, "token": NEW, "merchant_id": 1, "recall_date": date(2024, 6, 2)}],
+        [NEW, OLD], click_time
+    )
+
+    assert affected == 1
+    assert dao.token_cache.get(NEW)["click_time"] == click_time
+    # 此前已点击的记录不使用本批次的点击时间，缓存失效后按数据库重新读取
+    assert dao.token_cache.get(OLD) is None
+    # 按锁定记录的主键更新
+    update_sql, update_params = cursor.executed[1]
+    assert "WHERE id IN (%s) AND click = %s" in update_sql
+    assert update_params[-2:] == (7, 0)
+    counter_sql, counter_params = cursor.executed[-1]
+    assert "clicked_count = clicked_count + %s" in counter_sql
+    assert counter_params == (1, 1, date(2024, 6, 2))
+
+
+def test_batch_click_locks_signed_tokens_by_id_and_merchant(monkeypatch):
+    dao = RecallDAO()
+    dao.token_signer = RecallTokenSigner(secret="s1", previous_secrets="", accept_legacy=True)
+    signed = dao.token_signer.issue(42, 3, datetime.now() + timedelta(days=1))
+    cursor, affected = _run_batch(dao, monkeypatch, [], [signed, OLD, "bad"], datetime(2024, 6, 2, 9, 0, 0))
+
+    assert affected == 0
+    lock_sql, lock_params = cursor.executed[0]
+    assert "WHERE ((id = %s AND merchant_id = %s) OR token IN (%s)) AND click = 0 FOR UPDATE" in lock_sql
+    assert lock_params == (42, 3, OLD)
+    # 没有需要变更的记录时不执行 UPDATE
+    assert len(cursor.executed) == 1
+
+
+def test_batch_click_skips_invalid_tokens(monkeypatch):
+    dao = RecallDAO()
+    cursor, affected = _run_batch(dao, monkeypatch, [], ["bad"], datetime(2024, 6, 2, 9, 0, 0))
+    assert affected == 0
+    assert cursor.executed == []
+
+
+def test_transition_rollup_keyed_by_id_and_merchant():
+    dao = RecallDAO()
+    sql, params = dao.recall_daily_dao.build_transition_query({"id": 42, "merchant_id": 3}, "claim")
+    assert "WHERE r.id = %s AND r.merchant_id = %s" in " ".join(sql.split())
+    assert params == (42, 3)
+    sql, params = dao.recall_daily_dao.build_transition_query({"token": OLD}, "claim")
+    assert "WHERE r.token = %s" in " ".join(sql.split())
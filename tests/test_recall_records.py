@@ -0,0 +1,18 @@
+from services.dao.recall_daily_dao import RecallDailyDAO
+from services.recall_service import RecallService
+
+
+def test_recall_records_carry_create_time():
+    records = RecallService()._build_recall_records([
+        {"merchant_id": 1, "user_name": "张三", "contact": "13800138000", "contact_type": "mobile"},
+        {"merchant_id": 2, "user_name": "李四", "contact": "13800138001", "contact_type": "mobile"},
+    ])
+
+    create_time = records[0]["create_time"]
+    assert create_time.microsecond == 0
+    assert records[1]["create_time"] == create_time
+
+    # 每日汇总的日期与写入 t_recall 的 create_time 一致
+    sql, params = RecallDailyDAO().build_increment_query(records)
+    assert params[:3] == [1, str(create_time)[:10], 1]
+    assert params[7:10] == [2, str(create_time)[:10], 1]
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from utils.token.recall_token import (
+    RecallTokenSigner, SIGNED_TOKEN_LENGTH,
+    TOKEN_VALID, TOKEN_LEGACY, TOKEN_INVALID, TOKEN_EXPIRED
+)
+
+
+def _expires(days=7):
+    return datetime.now(timezone.utc) + timedelta(days=days)
+
+
+def test_issue_and_verify():
+    signer = RecallTokenSigner(secret="s1", previous_secrets="", accept_legacy=False)
+    expires_at = _expires()
+    token = signer.issue(123, 45, expires_at)
+
+    assert len(token) == SIGNED_TOKEN_LENGTH
+    status, claims = signer.verify(token)
+    assert status == TOKEN_VALID
+    assert claims == (123, 45, int(expires_at.timestamp()))
+
+
+def test_expired_token_keeps_claims():
+    signer = RecallTokenSigner(secret="s1", previous_secrets="", accept_legacy=False)
+    expires_at = _expires()
+    token = signer.issue(1, 2, expires_at)
+
+    status, claims = signer.verify(token, now=expires_at.timestamp() + 1)
+    assert status == TOKEN_EXPIRED
+    assert claims.recall_id == 1
+
+
+@pytest.mark.parametrize("mutate", [
+    lambda token: token[:-1] + ("A" if token[-1] != "A" else "B"),
+    lambda token: token[:-2],
+    lambda token: token + "A",
+    lambda token: "!" * len(token),
+])
+def test_tampered_token_rejected(mutate):
+    signer = RecallTokenSigner(secret="s1", previous_secrets="", accept_legacy=False)
+    assert signer.verify(mutate(signer.issue(1, 2, _expires())))[0] == TOKEN_INVALID
+
+
+def test_other_secret_rejected():
+    token = RecallTokenSigner(secret="other", previous_secrets="").issue(1, 2, _expires())
+    signer = RecallTokenSigner(secret="s1", previous_secrets="", accept_legacy=False)
+    assert signer.verify(token)[0] == TOKEN_INVALID
+
+
+def test_rotation_accepts_previous_secret():
+    old_token = RecallTokenSigner(secret="old", previous_secrets="").issue(9, 2, _expires())
+    signer = RecallTokenSigner(secret="new", previous_secrets="older,old", accept_legacy=False)
+
+    assert signer.verify(old_token)[0] == TOKEN_VALID
+    # 新令牌用当前密钥签发，旧密钥无法校验
+    new_token = signer.issue(10, 2, _expires())
+    assert RecallTokenSigner(secret="old", previous_secrets="").verify(new_token)[0] == TOKEN_INVALID
+
+
+def test_legacy_tokens():
+    legacy = "9f1c0e6d2b7a4c4e8d3f5a1b2c3d4e5f"
+    assert RecallTokenSigner(secret="s1", previous_secrets="", accept_legacy=True).verify(legacy)[0] == TOKEN_LEGACY
+    assert RecallTokenSigner(secret="s1", previous_secrets="", accept_legacy=False).verify(legacy)[0] == TOKEN_INVALID
+    assert RecallTokenSigner(secret="s1", previous_secrets="", accept_legacy=True).verify("")[0] == TOKEN_INVALID
+
+
+def test_disabled_signer_cannot_issue():
+    signer = RecallTokenSigner(secret="", previous_secrets="")
+    assert not signer.enabled
+    with pytest.raises(ValueError):
+        signer.issue(1, 2, _expires())
+
+
+def test_short_code_round_trip():
+    signer = RecallTokenSigner(secret="s1", previous_secrets="")
+    code = signer.issue_short_code(1000000)
+
+    assert code.isalnum()
+    assert len(code) == 10
+    assert signer.verify_short_code(code) == 1000000
+
+
+@pytest.mark.parametrize("code", ["", "abc", "0" * 30, "!!!!!!1234"])
+def test_malformed_short_code_rejected(code):
+    assert RecallTokenSigner(secret="s1", previous_secrets="").verify_short_code(code) is None
+
+
+def test_short_code_cannot_be_enumerated():
+    signer = RecallTokenSigner(secret="s1", previous_secrets="")
+    code = signer.issue_short_code(42)
+    # 换成相邻的召回ID，签名不匹配
+    forged = code[:6] + signer.issue_short_code(43)[6:]
+    assert signer.verify_short_code(forged) is None
+    assert RecallTokenSigner(secret="other", previous_secrets="").verify_short_code(code) is None
+
+
+def test_short_code_rotation():
+    code = RecallTokenSigner(secret="old", previous_secrets="").issue_short_code(7)
+    assert RecallTokenSigner(secret="new", previous_secrets="old").verify_short_code(code) == 7
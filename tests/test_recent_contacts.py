@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.dao.recall_dao import RecallDAO
+from services.recent_contacts import RecentContactIndex
+
+
+class FakeRecallDAO:
+    """按 create_time 返回召回记录，可以模拟晚提交（create_time 较早但之后才可见）的记录"""
+
+    def __init__(self):
+        self.rows = []
+        self.since_calls = []
+
+    def add(self, contact, create_time, merchant_id=1, contact_type="mobile"):
+        self.rows.append({"merchant_id": merchant_id, "contact_type": contact_type,
+                          "contact": contact, "create_time": create_time})
+
+    def _since(self, merchant_id, since):
+        return [dict(row) for row in self.rows if row["merchant_id"] == merchant_id and row["create_time"] >= since]
+
+    def get_recent_contacts(self, merchant_id, since):
+        return self._since(merchant_id, since)
+
+    def get_contacts_since(self, merchant_id, since):
+        self.since_calls.append(since)
+        return self._since(merchant_id, since)
+
+    async def get_recent_contacts_async(self, merchant_id, since):
+        return self.get_recent_contacts(merchant_id, since)
+
+    async def get_contacts_since_async(self, merchant_id, since):
+        return self.get_contacts_since(merchant_id, since)
+
+
+def _recall(contact, merchant_id=1):
+    return {"merchant_id": merchant_id, "contact": contact, "contact_type": "mobile"}
+
+
+def _contacts(recalls):
+    return [recall["contact"] for recall in recalls]
+
+
+def test_caps_recent_and_duplicate_contacts():
+    dao = FakeRecallDAO()
+    dao.add("a", datetime.now() - timedelta(days=1))
+    dao.add("old", datetime.now() - timedelta(days=30))
+    index = RecentContactIndex(dao, cap_days=7)
+
+    kept, capped = index.filter([_recall("a"), _recall("b"), _recall("b"), _recall("old"), _recall("a", merchant_id=2)])
+
+    assert _contacts(kept) == ["b", "old", "a"]
+    assert capped == 2
+    assert index.stats()["full_loads"] == 2
+
+
+def test_refresh_reads_from_watermark_minus_overlap():
+    dao = FakeRecallDAO()
+    index = RecentContactIndex(dao, cap_days=7, overlap_seconds=60)
+    index.filter([_recall("a")])
+
+    created = datetime.now()
+    dao.add("a", created)
+    kept, capped = index.filter([_recall("a")])
+
+    assert kept == [] and capped == 1
+    assert index.stats()["refreshes"] == 1
+    # 读到新记录后水位推进到它的 create_time
+    index.filter([_recall("b")])
+    assert dao.since_calls[-1] == created - timedelta(seconds=60)
+
+
+def test_late_commit_inside_overlap_is_seen():
+    dao = FakeRecallDAO()
+    index = RecentContactIndex(dao, cap_days=7, overlap_seconds=300)
+    index.filter([_recall("x")])
+    dao.add("new", datetime.now())
+    index.filter([_recall("x")])
+
+    # 另一个进程较早填充 create_time、较晚提交的记录，主键和时间都早于已读到的记录
+    dao.add("late", datetime.now() - timedelta(seconds=120))
+    kept, capped = index.filter([_recall("late")])
+
+    assert kept == [] and capped == 1
+
+
+def test_async_filter_matches_sync():
+    dao = FakeRecallDAO()
+    dao.add("a", datetime.now())
+    index = RecentContactIndex(dao, cap_days=7)
+
+    kept, capped = asyncio.run(index.filter_async([_recall("a"), _recall("b")]))
+    assert _contacts(kept) == ["b"] and capped == 1
+
+    dao.add("b", datetime.now())
+    kept, capped = asyncio.run(index.filter_async([_recall("b")]))
+    assert kept == [] and capped == 1
+
+
+def test_disabled_cap_skips_lookup():
+    dao = FakeRecallDAO()
+    dao.add("a", datetime.now())
+    index = RecentContactIndex(dao, cap_days=7)
+
+    kept, capped = index.filter([_recall("a"), _recall("a")], days=0)
+
+    assert len(kept) == 2 and capped == 0
+    assert index.stats()["full_loads"] == 0
+
+
+def test_create_lock_names_sorted_and_unique():
+    assert RecallDAO._create_lock_names([3, 1, 3, 2]) == [
+        "t_recall:create:1", "t_recall:create:2", "t_recall:create:3"
+    ]
+
+
+def test_create_lock_requires_unit_of_work():
+    dao = RecallDAO()
+    with pytest.raises(RuntimeError):
+        with dao.merchant_create_lock([1]):
+            pass
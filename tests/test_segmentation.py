@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pandas as pd
+
+from services.segmentation_service import aggregate_orders, segment_orders
+
+AS_OF = datetime(2024, 7, 1)
+
+
+def _orders():
+    return pd.DataFrame([
+        # u1：近期、多次、高消费
+        {"user_id": "u1", "create_time": "2024-06-25", "amount": 300, "product_type": "游戏", "industry": "娱乐"},
+        {"user_id": "u1", "create_time": "2024-06-20", "amount": 200, "product_type": "游戏", "industry": "娱乐"},
+        {"user_id": "u1", "create_time": "2024-06-10", "amount": 100, "product_type": "会员", "industry": "娱乐"},
+        # u2：很久没下单、低消费
+        {"user_id": "u2", "create_time": "2023-10-01", "amount": 10, "product_type": "会员", "industry": None},
+        # u3：沉默用户，商品类型次数相同时取在订单中先出现的（游戏）
+        {"user_id": "u3", "create_time": "2024-04-15", "amount": 50, "product_type": "会员", "industry": "教育"},
+        {"user_id": "u3", "create_time": "2024-04-10", "amount": "bad", "product_type": "游戏", "industry": "教育"},
+    ])
+
+
+def test_aggregate_orders_per_user():
+    users = aggregate_orders(_orders())
+
+    assert list(users.index) == ["u1", "u2", "u3"]
+    assert users.loc["u1", "frequency"] == 3
+    assert users.loc["u1", "monetary"] == 600
+    # 无法解析的金额按 0 计
+    assert users.loc["u3", "monetary"] == 50
+    assert users.loc["u1", "last_order_time"] == pd.Timestamp("2024-06-25")
+    assert users.loc["u1", "product_type"] == "游戏"
+    assert users.loc["u3", "product_type"] == "游戏"
+    assert pd.isna(users.loc["u2", "industry"])
+
+
+def test_aggregate_without_optional_columns():
+    users = aggregate_orders(_orders()[["user_id", "create_time", "amount"]])
+    assert users["product_type"].isna().all()
+    assert users["industry"].isna().all()
+
+
+def test_segment_orders_scores_and_status():
+    assignments = segment_orders(_orders(), as_of=AS_OF)["assignments"]
+
+    assert assignments.loc["u1", "recency_days"] == 6
+    assert assignments.loc["u1", "user_value"] == "重要价值用户"
+    assert assignments.loc["u2", "user_value"] == "一般挽留用户"
+    assert list(assignments["user_status"]) == ["活跃", "流失", "沉默"]
+    assert assignments.loc["u1", ["r_score", "f_score", "m_score"]].tolist() == [5, 5, 5]
+    assert assignments[["r_score", "f_score", "m_score"]].isin(range(1, 6)).all().all()
+
+
+def test_segment_orders_portraits():
+    portraits = segment_orders(_orders(), as_of=AS_OF, merchant_id=7)["portraits"]
+
+    assert len(portraits) == 3
+    assert sum(portrait["user_count"] for portrait in portraits) == 3
+    assert all(portrait["merchant_id"] == 7 for portrait in portraits)
+    u1 = next(portrait for portrait in portraits if portrait["user_value"] == "重要价值用户")
+    assert (u1["user_status"], u1["product_type"], u1["industry"]) == ("活跃", "游戏", "娱乐")
+    assert u1["avg_monetary"] == 600.0
+    # 缺失的行业为 None，不是 NaN
+    assert any(portrait["industry"] is None for portrait in portraits)
+
+
+def test_segment_empty_orders():
+    result = segment_orders(pd.DataFrame(columns=["user_id", "create_time", "amount"]))
+    assert result["portraits"] == []
+    assert result["assignments"].empty
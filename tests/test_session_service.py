@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from services import merchant_service
+from services.merchant_service import MerchantService
+from services.session_service import SessionBackend, SessionService
+
+
+class MemoryBackend(SessionBackend):
+    def __init__(self):
+        self.sessions = {}
+
+    async def get(self, token_hash):
+        return self.sessions.get(token_hash)
+
+    async def set(self, token_hash, session, expires_at):
+        self.sessions[token_hash] = {**session, "expires_at": expires_at}
+
+    async def delete(self, token_hash):
+        self.sessions.pop(token_hash, None)
+
+    async def delete_merchant(self, merchant_id):
+        self.delete_merchant_sync(merchant_id)
+
+    def delete_merchant_sync(self, merchant_id):
+        self.sessions = {key: value for key, value in self.sessions.items() if value["merchant_id"] != merchant_id}
+
+
+def test_backend_must_implement_all_methods():
+    class Incomplete(SessionBackend):
+        async def get(self, token_hash):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_password_change_revokes_sessions(monkeypatch):
+    sessions = SessionService(backend=MemoryBackend())
+    service = MerchantService(sessions)
+    updates = []
+
+    async def update_merchant_async(merchant_id, update_data):
+        updates.append((merchant_id, dict(update_data)))
+        return 1
+
+    monkeypatch.setattr(merchant_service.merchantDao, "update_merchant_async", update_merchant_async)
+
+    async def scenario():
+        kept = await sessions.create_session({"id": 2, "username": "other"})
+        token = (await sessions.create_session({"id": 1, "username": "shop", "password": "x"}))["token"]
+        await service.update_merchant_async(1, {"name": "新名字"})
+        assert await sessions.get_session(token) is not None
+        await service.update_merchant_async("1", {"password": "new"})
+        return token, kept["token"]
+
+    token, kept = asyncio.run(scenario())
+    assert asyncio.run(sessions.get_session(token)) is None
+    assert sessions.backend.sessions and asyncio.run(sessions.get_session(kept)) is not None
+    assert [merchant_id for merchant_id, _ in updates] == [1, "1"]
+
+
+def test_sync_password_change_revokes_sessions(monkeypatch):
+    sessions = SessionService(backend=MemoryBackend())
+    service = MerchantService(sessions)
+    monkeypatch.setattr(merchant_service.merchantDao, "update_merchant", lambda merchant_id, update_data: 1)
+    token = asyncio.run(sessions.create_session({"id": 1, "username": "shop"}))["token"]
+    kept = asyncio.run(sessions.create_session({"id": 2, "username": "other"}))["token"]
+
+    assert service.update_merchant("1", {"password": "new"}) == 1
+    assert asyncio.run(sessions.get_session(token)) is None
+    assert asyncio.run(sessions.get_session(kept)) is not None
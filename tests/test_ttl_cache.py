@@ -0,0 +1,78 @@
+import pytest
+
+import utils.cache.ttl_cache as ttl_cache
+from utils.cache.ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(ttl_cache.time, "monotonic", fake)
+    return fake
+
+
+def test_get_set_and_expiry(clock):
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set("a", {"id": 1})
+    assert cache.get("a") == {"id": 1}
+    clock.now += 5
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_per_entry_ttl(clock):
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("short", 1, ttl=1)
+    cache.set("long", 2)
+    clock.now += 2
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+
+
+def test_lru_eviction(clock):
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_update_keeps_expiry_and_ignores_missing(clock):
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set("a", {"click": 0})
+    clock.now += 3
+    assert cache.update("a", {"click": 1})
+    assert not cache.update("missing", {"click": 1})
+    assert cache.get("a") == {"click": 1}
+    clock.now += 2
+    assert cache.get("a") is None
+
+
+def test_pop_remove_where_and_stats(clock):
+    cache = TTLCache(maxsize=10, ttl=60)
+    for i in range(4):
+        cache.set(i, {"merchant_id": i % 2})
+    assert cache.pop(0) == {"merchant_id": 0}
+    assert cache.pop(0) is None
+    assert cache.remove_where(lambda value: value["merchant_id"] == 1) == 2
+    assert len(cache) == 1
+    cache.get(2)
+    cache.get(3)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_maxsize_must_be_positive():
+    with pytest.raises(ValueError):
+        TTLCache(maxsize=0)
@@ -0,0 +1,96 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+import threading
+import time
+
+
+class TTLCache:
+    """
+    线程安全的进程内缓存，条目超过 ttl 秒过期，超过 maxsize 时淘汰最久未使用的条目。
+    同步脚本和异步路由可以共用同一个实例。
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0) -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize 必须大于0")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """获取缓存值，未命中或已过期返回 None"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """写入缓存，ttl 为空时使用默认过期时间"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, key: Hashable, changes: Dict[str, Any]) -> bool:
+        """就地更新已缓存的字典值（不刷新过期时间），key 不存在时返回 False"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False
+            value, expires_at = item
+            self._data[key] = ({**value, **changes}, expires_at)
+            return True
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """移除并返回缓存值"""
+        with self._lock:
+            item = self._data.pop(key, None)
+            return item[0] if item else None
+
+    def remove_where(self, predicate: Callable[[Any], bool]) -> int:
+        """移除所有满足条件的条目，返回移除数量（O(n)，仅用于低频操作）"""
+        with self._lock:
+            keys = [key for key, (value, _) in self._data.items() if predicate(value)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中等统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
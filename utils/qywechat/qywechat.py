@@ -1,15 +1,87 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from wechatpy.enterprise import WeChatClient
+from wechatpy.exceptions import APILimitedException
+from wechatpy.session.memorystorage import MemoryStorage
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from utils.rate_limiter import RateLimiter
+import logging
 import os
+import threading
+import time
 # 加载 .env（只在应用启动时调用一次）
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# 企业微信接口地址，测试时可指向本地桩服务
+WECHAT_API_BASE_URL = os.getenv("WECHAT_API_BASE_URL", "https://qyapi.weixin.qq.com/cgi-bin/")
+# 并发调用企业微信接口的线程数
+WECHAT_MAX_WORKERS = int(os.getenv("WECHAT_MAX_WORKERS", "8"))
+# 每秒调用企业微信接口的次数上限（所有线程共享）
+WECHAT_RATE_LIMIT = float(os.getenv("WECHAT_RATE_LIMIT", "20"))
+# 触发频率限制时的最大重试次数和首次重试间隔（秒），之后按指数退避
+WECHAT_MAX_RETRIES = int(os.getenv("WECHAT_MAX_RETRIES", "3"))
+WECHAT_RETRY_BACKOFF = float(os.getenv("WECHAT_RETRY_BACKOFF", "1"))
+# 客户列表分页大小（企业微信限制每次最多100条）
+EXTERNAL_CONTACT_PAGE_SIZE = 100
+# 创建企业群发时单次最多指定的客户数
+MSG_TEMPLATE_MAX_CUSTOMERS = 10000
+# 发件箱召回消息的发送员工（企业微信 userid），以及消息文案模板，可用 {user_name} {product} {url}
+WECHAT_SENDER_USERID = os.getenv("WECHAT_SENDER_USERID", "")
+WECHAT_RECALL_TEXT = os.getenv("WECHAT_RECALL_TEXT", "{user_name}您好，{product}专属优惠已为您准备好，点击领取：{url}")
+
+# access_token 在进程内所有客户端、所有线程之间共享
+_token_storage = MemoryStorage()
+_token_expires_at: Dict[str, int] = {}
+_token_lock = threading.Lock()
+
+class SharedTokenWeChatClient(WeChatClient):
+    """共享 access_token 的企业微信客户端，并发线程同时发现 token 过期时只刷新一次"""
+
+    def __init__(self, corp_id, secret, api_base_url: str = WECHAT_API_BASE_URL, timeout=None):
+        self.API_BASE_URL = api_base_url
+        super().__init__(corp_id, secret, session=_token_storage, timeout=timeout)
+
+    @property
+    def expires_at(self):
+        # 过期时间与 token 一样在所有客户端之间共享，其他客户端刷新后这里立即可见
+        return _token_expires_at.get(self.access_token_key)
+
+    @expires_at.setter
+    def expires_at(self, value):
+        # wechatpy 初始化时会置为 None，忽略；刷新 token 后写入共享的过期时间
+        if value is not None:
+            _token_expires_at[self.access_token_key] = value
+
+    def fetch_access_token(self):
+        key = self.access_token_key
+        stale_token = self.session.get(key)
+        with _token_lock:
+            # 等锁期间其他线程已经刷新过（例如多个请求同时发现 token 失效），直接复用
+            current_token = self.session.get(key)
+            expires_at = _token_expires_at.get(key)
+            if current_token and current_token != stale_token and expires_at and expires_at - time.time() > 60:
+                return {"access_token": current_token}
+            return self._fetch_access_token(
+                url=f"{self.API_BASE_URL}gettoken",
+                params={"corpid": self.corp_id, "corpsecret": self.secret}
+            )
+
 class WeChatRecallSender:
-    def __init__(self):
+    def __init__(self, api_base_url: str = WECHAT_API_BASE_URL,
+                 max_workers: int = WECHAT_MAX_WORKERS,
+                 rate_limit: float = WECHAT_RATE_LIMIT):
         corp_id = os.getenv("WECHAT_CORP_ID")
         secret = os.getenv("WECHAT_SECRET")
-        self.client = WeChatClient(corp_id, secret)
+        self.client = SharedTokenWeChatClient(corp_id, secret, api_base_url)
+        # 连接池大小与并发线程数一致，避免线程等待 HTTP 连接
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.client._http.mount("http://", adapter)
+        self.client._http.mount("https://", adapter)
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(rate_limit, burst=max_workers)
     
     # 获取部门下的成员列表
     def get_users(self, department_id : int) -> List[Dict]:
@@ -31,46 +103,147 @@ class WeChatRecallSender:
         #     }]
 
     # 获取某个员工添加的所有客户列表,批量获取（企业微信限制每次最多100条）
-    def get_external_users(self, staff_userid : str):
+    def get_external_users(self, staff_userid : str) -> List[str]:
         external_contacts = []
         cursor = ''  # 用于分页
         while True:
-            result = self.client.external_contact.list(
-                userid=staff_userid,
-                limit=100,
-                cursor=cursor
+            result = self._call(
+                "externalcontact/batch/get_by_user",
+                {"userid_list": [staff_userid], "cursor": cursor, "limit": EXTERNAL_CONTACT_PAGE_SIZE}
             )
-            for ext_id in result['external_userid']:
-                print(f"客户ID: {ext_id}")
-                external_contacts.append(ext_id)
+            for contact in result.get('external_contact_list', []):
+                external_contacts.append(contact['external_contact']['external_userid'])
             
             if not result.get('next_cursor'):
                 break
             cursor = result['next_cursor']
+        logger.debug(f"员工 {staff_userid} 共有客户 {len(external_contacts)} 个")
         return external_contacts
 
-    def send_recall_message(self, strategy_data):
-        """发送召回消息"""
+    # 并发获取多个员工的客户列表，每个员工各自按游标分页
+    def get_external_users_concurrent(self, staff_userids: List[str]) -> Dict[str, List[str]]:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(self._get_external_users_safe, staff_userids)
+            return dict(zip(staff_userids, results))
+
+    def _get_external_users_safe(self, staff_userid: str) -> List[str]:
         try:
-            # 从策略数据中提取参数
-            userid = strategy_data['sender_userid']  # 发送员工ID
-            external_userid = strategy_data['external_userid']  # 客户ID
-            message_content = strategy_data['personalized_copy']['body']
-            
-            # 发送文本消息
-            result = self.client.external_contact.message.send(
-                sender=userid,
-                external_user_id=[external_userid],
-                msgtype='text',
-                text={'content': message_content}
+            return self.get_external_users(staff_userid)
+        except Exception as e:
+            logger.error(f"获取员工 {staff_userid} 的客户列表失败: {str(e)}")
+            return []
+
+    def _call(self, endpoint: str, data: Dict) -> Dict:
+        """限流调用企业微信接口，触发频率限制时退避重试"""
+        for attempt in range(WECHAT_MAX_RETRIES + 1):
+            self.limiter.acquire()
+            try:
+                return self.client.post(endpoint, data=data)
+            except APILimitedException:
+                if attempt >= WECHAT_MAX_RETRIES:
+                    raise
+                time.sleep(WECHAT_RETRY_BACKOFF * 2 ** attempt)
+
+    def send_recall_message(self, strategy_data) -> bool:
+        """发送一条召回消息"""
+        return self.send_recall_messages([strategy_data])["results"][0]
+
+    def send_recall_messages(self, strategies: List[Dict], max_workers: Optional[int] = None) -> Dict:
+        """
+        批量发送召回消息，返回成功/失败数量、每条结果（与输入顺序一致）及首个错误
+
+        一个企业群发任务只能有一段文案，因此按 (发送员工, 文案) 分组，每组每 MSG_TEMPLATE_MAX_CUSTOMERS 个客户
+        创建一个群发任务（单聊，由员工确认后发送），各任务并发创建；接口返回的 fail_list 中的客户记为失败。
+        """
+        if not strategies:
+            return {"sent": 0, "failed": 0, "results": [], "error": None}
+
+        results = [False] * len(strategies)
+        groups: Dict[tuple, List[int]] = {}
+        for index, strategy in enumerate(strategies):
+            try:
+                key = (strategy['sender_userid'], strategy['personalized_copy']['body'])
+                if not strategy['external_userid']:
+                    raise KeyError('external_userid')
+            except (KeyError, TypeError) as e:
+                logger.error(f"召回消息缺少字段: {str(e)}")
+                continue
+            groups.setdefault(key, []).append(index)
+
+        tasks = [
+            (sender, content, [(index, strategies[index]['external_userid']) for index in indexes[start:start + MSG_TEMPLATE_MAX_CUSTOMERS]])
+            for (sender, content), indexes in groups.items()
+            for start in range(0, len(indexes), MSG_TEMPLATE_MAX_CUSTOMERS)
+        ]
+        errors = []
+        if tasks:
+            with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+                for task, (failed_userids, error) in zip(tasks, executor.map(self._send_msg_template, tasks)):
+                    for index, external_userid in task[2]:
+                        results[index] = failed_userids is not None and external_userid not in failed_userids
+                    if error:
+                        errors.append(error)
+
+        sent = sum(1 for result in results if result)
+        if not errors and sent < len(results):
+            errors.append("部分客户发送失败")
+        return {"sent": sent, "failed": len(results) - sent, "results": results, "error": errors[0] if errors else None}
+
+    def _send_msg_template(self, task: tuple) -> tuple:
+        """创建一个企业群发任务，返回 (发送失败的客户集合, 错误信息)，整个任务失败时客户集合为 None"""
+        sender, content, customers = task
+        try:
+            result = self._call(
+                "externalcontact/add_msg_template",
+                {
+                    "chat_type": "single",
+                    "sender": sender,
+                    "external_userid": [external_userid for _, external_userid in customers],
+                    "text": {"content": content}
+                }
             )
-            
-            print(f"消息发送成功: {result}")
-            return True
-            
+            logger.info(f"群发任务创建成功: {result.get('msgid')}，客户 {len(customers)} 个")
+            return set(result.get('fail_list') or []), None
         except Exception as e:
-            print(f"发送失败: {str(e)}")
-            return False
+            logger.error(f"创建群发任务失败: {str(e)}")
+            return None, str(e)
+
+class WeChatOutboxSender:
+    """
+    发件箱企业微信渠道的发送器，接口与短信发送器一致：send_recall_messages(发件箱行)
+
+    发件箱行的 contact 为客户的 external_userid，由 WECHAT_SENDER_USERID 对应的员工发送。
+    企业微信客户端在首次发送时才创建，未配置企业微信时返回配置错误，不影响短信渠道。
+    """
+
+    def __init__(self, sender_userid: str = WECHAT_SENDER_USERID, text_template: str = WECHAT_RECALL_TEXT):
+        self.sender_userid = sender_userid
+        self.text_template = text_template
+        self._sender: Optional[WeChatRecallSender] = None
+
+    def send_recall_messages(self, recalls: List[Dict]) -> Dict:
+        if not os.getenv("WECHAT_CORP_ID") or not os.getenv("WECHAT_SECRET"):
+            return {"status": "error", "message": "企业微信未配置：缺少 WECHAT_CORP_ID 或 WECHAT_SECRET"}
+        if not self.sender_userid:
+            return {"status": "error", "message": "企业微信发送员工未配置：缺少 WECHAT_SENDER_USERID"}
+        if not recalls:
+            return {"status": "error", "message": "没有数据可发送"}
+
+        if self._sender is None:
+            self._sender = WeChatRecallSender()
+        strategies = [
+            {
+                "sender_userid": self.sender_userid,
+                "external_userid": recall.get("contact"),
+                "personalized_copy": {"body": self.text_template.format(
+                    user_name=recall.get("user_name") or "",
+                    product=recall.get("product") or "",
+                    url=recall.get("url", "")
+                )}
+            }
+            for recall in recalls
+        ]
+        return self._sender.send_recall_messages(strategies)
 
 # 使用示例
 if __name__ == '__main__':
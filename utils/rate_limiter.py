@@ -0,0 +1,47 @@
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    令牌桶限流器，用于控制调用第三方接口（短信、企业微信）的频率。
+    线程和协程都可以使用：线程调用 acquire()，协程调用 acquire_async()。
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        """
+        Args:
+            rate: 每秒允许的调用次数，<= 0 表示不限流
+            burst: 允许的突发调用次数
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """预占一个令牌，返回需要等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        """阻塞直到获得调用许可"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        """等待直到获得调用许可（不阻塞事件循环）"""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
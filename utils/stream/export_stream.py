@@ -0,0 +1,64 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List
+
+# 支持的导出格式 -> Content-Type
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson"
+}
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, bytes):
+        return value.hex()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+async def encode_rows(batches: AsyncIterator[List[Dict[str, Any]]],
+                      fmt: str,
+                      columns: List[str]) -> AsyncIterator[bytes]:
+    """
+    把按批读取的行编码为 CSV 或 NDJSON，每批输出一个数据块，内存占用只与批大小有关
+
+    CSV 带表头，并以 UTF-8 BOM 开头，Excel 打开中文不乱码；NDJSON 每行一个 JSON 对象。
+    """
+    if fmt not in EXPORT_MEDIA_TYPES:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        buffer.write("\ufeff")
+        writer.writerow(columns)
+        async for rows in batches:
+            for row in rows:
+                writer.writerow(["" if row.get(column) is None else row.get(column) for column in columns])
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        # 没有数据时也输出表头
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+        return
+
+    async for rows in batches:
+        yield "".join(
+            json.dumps({column: row.get(column) for column in columns}, ensure_ascii=False, default=_json_default) + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+async def gzip_chunks(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """流式 gzip 压缩（wbits=31 输出 gzip 格式），不缓存完整内容"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,120 @@
+import codecs
+import json
+from typing import Any, AsyncIterator, Tuple
+
+# 单条记录允许的最大字符数，超过仍无法解析则认为数据有误
+MAX_RECORD_CHARS = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+async def iter_json_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[Any, int]]:
+    """
+    增量解析请求体中的 JSON 记录，不把整个请求体读入内存。
+
+    支持两种格式（根据第一个非空白字符自动识别）：
+        - JSON 数组：[{...}, {...}, ...]
+        - NDJSON：每行一个 JSON 对象
+
+    NDJSON 中无法解析的行返回 (None, 字节数)，由调用方计为拒绝，不影响后续行；
+    JSON 数组中的元素无法确定边界，格式错误时抛出 ValueError。
+
+    Yields:
+        (记录, 记录的原始 UTF-8 字节数)
+    """
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    mode = None          # "array" / "ndjson"
+    array_closed = False
+
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        buffer = buffer[pos:] + utf8.decode(chunk)
+        pos = 0
+
+        if mode is None:
+            stripped = buffer.lstrip(_WHITESPACE)
+            if not stripped:
+                continue
+            if stripped[0] == "[":
+                mode = "array"
+                pos = len(buffer) - len(stripped) + 1
+            else:
+                mode = "ndjson"
+
+        if mode == "ndjson":
+            while True:
+                newline = buffer.find("\n", pos)
+                if newline < 0:
+                    break
+                line = buffer[pos:newline].strip()
+                pos = newline + 1
+                if line:
+                    yield _parse_line(line)
+            if len(buffer) - pos > MAX_RECORD_CHARS:
+                raise ValueError("单条记录过大或缺少换行符")
+        else:
+            while not array_closed:
+                pos = _skip_separators(buffer, pos)
+                if pos >= len(buffer):
+                    break
+                if buffer[pos] == "]":
+                    array_closed = True
+                    pos += 1
+                    break
+                try:
+                    record, end = _decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # 记录尚未接收完整，等待下一个数据块
+                    if len(buffer) - pos > MAX_RECORD_CHARS:
+                        raise ValueError("单条记录过大或 JSON 格式错误")
+                    break
+                if end >= len(buffer) and not isinstance(record, (dict, list, str)):
+                    # 数字等标量可能被截断，等待更多数据确认边界
+                    break
+                yield record, _byte_size(buffer, pos, end)
+                pos = end
+
+    buffer = buffer[pos:] + utf8.decode(b"", final=True)
+    pos = 0
+    if mode == "ndjson":
+        line = buffer.strip()
+        if line:
+            yield _parse_line(line)
+    elif mode == "array":
+        while not array_closed:
+            pos = _skip_separators(buffer, pos)
+            if pos >= len(buffer):
+                raise ValueError("JSON 数组未正确结束")
+            if buffer[pos] == "]":
+                array_closed = True
+                break
+            record, end = _decoder.raw_decode(buffer, pos)
+            yield record, _byte_size(buffer, pos, end)
+            pos = end
+
+
+def _parse_line(line: str) -> Tuple[Any, int]:
+    """解析 NDJSON 的一行，格式错误时返回 None"""
+    size = len(line.encode("utf-8"))
+    try:
+        return json.loads(line), size
+    except json.JSONDecodeError:
+        return None, size
+
+
+def _byte_size(buffer: str, start: int, end: int) -> int:
+    """buffer[start:end] 的 UTF-8 字节数，中文字符占 3 个字节"""
+    text = buffer[start:end]
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+def _skip_separators(buffer: str, pos: int) -> int:
+    """跳过数组元素之间的空白和逗号"""
+    length = len(buffer)
+    while pos < length and (buffer[pos] in _WHITESPACE or buffer[pos] == ","):
+        pos += 1
+    return pos
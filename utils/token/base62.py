@@ -0,0 +1,27 @@
+"""base62 编解码（0-9A-Za-z），用于短链接等只能包含字母数字的场景"""
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE = len(ALPHABET)
+_INDEX = {char: index for index, char in enumerate(ALPHABET)}
+
+def encode(number: int, width: int = 0) -> str:
+    """非负整数编码为 base62 字符串，不足 width 位时左侧补 0"""
+    if number < 0:
+        raise ValueError("只能编码非负整数")
+    chars = []
+    while number:
+        number, remainder = divmod(number, BASE)
+        chars.append(ALPHABET[remainder])
+    return "".join(reversed(chars)).rjust(max(width, 1), ALPHABET[0])
+
+def decode(text: str) -> int:
+    """base62 字符串解码为整数，包含非法字符时抛出 ValueError"""
+    if not text:
+        raise ValueError("base62 字符串不能为空")
+    number = 0
+    for char in text:
+        index = _INDEX.get(char)
+        if index is None:
+            raise ValueError(f"非法的 base62 字符: {char!r}")
+        number = number * BASE + index
+    return number
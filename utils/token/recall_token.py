@@ -0,0 +1,134 @@
+from typing import NamedTuple, Optional, Tuple
+from datetime import datetime
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import re
+import struct
+import time
+from dotenv import load_dotenv
+from utils.token import base62
+
+# 加载 .env（只在应用启动时调用一次）
+load_dotenv()
+
+# 令牌格式：版本(1) + 召回ID(8) + 商家ID(4) + 过期时间戳(4)，后接 HMAC-SHA256 的前 16 字节，整体 base64url 编码（无填充）
+TOKEN_VERSION = 1
+_PAYLOAD = struct.Struct(">BQII")
+MAC_SIZE = 16
+SIGNED_TOKEN_LENGTH = len(base64.urlsafe_b64encode(b"\0" * (_PAYLOAD.size + MAC_SIZE)).rstrip(b"="))
+# 改造前的随机令牌（uuid 等），只做字符集和长度检查
+_LEGACY_TOKEN = re.compile(r"^[0-9A-Za-z\-]{16,64}$")
+# 短链接码：定长的签名（base62）+ 召回ID（base62）
+SHORT_CODE_MAC_WIDTH = 6
+SHORT_CODE_MAX_LENGTH = SHORT_CODE_MAC_WIDTH + len(base62.encode(2 ** 64 - 1))
+
+# 校验结果
+TOKEN_VALID = "valid"
+TOKEN_LEGACY = "legacy"
+TOKEN_INVALID = "invalid"
+TOKEN_EXPIRED = "expired"
+
+class RecallTokenClaims(NamedTuple):
+    recall_id: int
+    merchant_id: int
+    expires_at: int
+
+class RecallTokenSigner:
+    """
+    召回链接令牌签发和校验
+
+    令牌自带召回ID、商家ID和过期时间，并用 RECALL_TOKEN_SECRET 做 HMAC 签名：
+    伪造、篡改、截断和已过期的令牌在内存中即可拒绝，不查询数据库；有效令牌按主键查询召回记录。
+    轮换密钥时把旧密钥放入 RECALL_TOKEN_PREVIOUS_SECRETS（逗号分隔），旧令牌过期前仍可校验通过。
+    未配置 RECALL_TOKEN_SECRET 时不签发签名令牌，继续使用随机令牌。
+    """
+
+    def __init__(self,
+                 secret: Optional[str] = None,
+                 previous_secrets: Optional[str] = None,
+                 accept_legacy: Optional[bool] = None) -> None:
+        secret = os.getenv("RECALL_TOKEN_SECRET", "") if secret is None else secret
+        if previous_secrets is None:
+            previous_secrets = os.getenv("RECALL_TOKEN_PREVIOUS_SECRETS", "")
+        if accept_legacy is None:
+            accept_legacy = os.getenv("RECALL_TOKEN_ACCEPT_LEGACY", "1") == "1"
+        self._signing_key = secret.encode() if secret else None
+        self._verify_keys = [key.encode() for key in [secret, *previous_secrets.split(",")] if key]
+        # 改造前签发的随机令牌是否仍然有效（全部过期后可关闭，所有非签名令牌都不再查库）
+        self.accept_legacy = accept_legacy
+
+    @property
+    def enabled(self) -> bool:
+        return self._signing_key is not None
+
+    def issue(self, recall_id: int, merchant_id: int, expires_at: datetime) -> str:
+        """签发令牌，expires_at 为带时区的时间或本地时间"""
+        if not self.enabled:
+            raise ValueError("未配置 RECALL_TOKEN_SECRET，无法签发召回令牌")
+        payload = _PAYLOAD.pack(TOKEN_VERSION, recall_id, merchant_id, int(expires_at.timestamp()))
+        mac = hmac.new(self._signing_key, payload, hashlib.sha256).digest()[:MAC_SIZE]
+        return base64.urlsafe_b64encode(payload + mac).rstrip(b"=").decode()
+
+    def issue_short_code(self, recall_id: int) -> str:
+        """
+        签发短链接码，如召回ID 1000000 对应 10 个字符
+
+        短链接码只包含签名和召回ID，不含过期时间，解析为召回记录后再按令牌校验是否过期；
+        签名约 35 位，无法通过遍历召回ID猜出有效的短链接码
+        """
+        if not self.enabled:
+            raise ValueError("未配置 RECALL_TOKEN_SECRET，无法签发短链接码")
+        return self._short_code_mac(self._signing_key, recall_id) + base62.encode(recall_id)
+
+    def verify_short_code(self, code: str) -> Optional[int]:
+        """校验短链接码，返回召回ID，无效时返回 None"""
+        if not code or len(code) <= SHORT_CODE_MAC_WIDTH or len(code) > SHORT_CODE_MAX_LENGTH:
+            return None
+        try:
+            recall_id = base62.decode(code[SHORT_CODE_MAC_WIDTH:])
+        except ValueError:
+            return None
+        if recall_id >= 2 ** 64:
+            return None
+        mac = code[:SHORT_CODE_MAC_WIDTH]
+        if any(hmac.compare_digest(mac, self._short_code_mac(key, recall_id)) for key in self._verify_keys):
+            return recall_id
+        return None
+
+    @staticmethod
+    def _short_code_mac(key: bytes, recall_id: int) -> str:
+        digest = hmac.new(key, b"short:" + recall_id.to_bytes(8, "big"), hashlib.sha256).digest()
+        return base62.encode(int.from_bytes(digest[:8], "big") % base62.BASE ** SHORT_CODE_MAC_WIDTH, SHORT_CODE_MAC_WIDTH)
+
+    def verify(self, token: str, now: Optional[float] = None) -> Tuple[str, Optional[RecallTokenClaims]]:
+        """
+        校验令牌，返回 (结果, 令牌内容)
+
+        结果为 TOKEN_VALID（附令牌内容）、TOKEN_LEGACY（旧格式，需按 token 查库）、TOKEN_INVALID 或 TOKEN_EXPIRED
+        """
+        if not token or len(token) != SIGNED_TOKEN_LENGTH:
+            if token and self.accept_legacy and _LEGACY_TOKEN.match(token):
+                return TOKEN_LEGACY, None
+            return TOKEN_INVALID, None
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (binascii.Error, ValueError):
+            return TOKEN_INVALID, None
+        if len(raw) != _PAYLOAD.size + MAC_SIZE:
+            return TOKEN_INVALID, None
+        payload, mac = raw[:_PAYLOAD.size], raw[_PAYLOAD.size:]
+        if not any(
+            hmac.compare_digest(mac, hmac.new(key, payload, hashlib.sha256).digest()[:MAC_SIZE])
+            for key in self._verify_keys
+        ):
+            return TOKEN_INVALID, None
+        version, recall_id, merchant_id, expires_at = _PAYLOAD.unpack(payload)
+        if version != TOKEN_VERSION:
+            return TOKEN_INVALID, None
+        claims = RecallTokenClaims(recall_id, merchant_id, expires_at)
+        if expires_at <= (time.time() if now is None else now):
+            return TOKEN_EXPIRED, claims
+        return TOKEN_VALID, claims